@@ -0,0 +1,320 @@
+import argparse
+import copy
+import csv
+import itertools
+import json
+import logging
+import os
+import random
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from dataclasses import dataclass, field
+from typing import Dict, List, Any
+
+import hjson
+
+from hawkbot.exceptions import InvalidConfigurationException
+
+logger = logging.getLogger(__name__)
+
+# The sweep.csv metric columns with the names of the overview keys they are taken from, in order of preference. The
+# overview is written by the backtest reporter, so the keys are matched on their (lowercase) name at any nesting level
+OVERVIEW_METRICS: Dict[str, List[str]] = {
+    'pnl': ['total_pnl', 'pnl', 'profit'],
+    'max_drawdown': ['max_drawdown', 'drawdown'],
+    'max_exposure': ['max_wallet_exposure', 'max_exposure', 'exposure'],
+    'nr_fills': ['nr_fills', 'fills', 'nr_filled_orders', 'filled'],
+}
+
+
+@dataclass
+class SweepRun:
+    variant_id: int
+    parameters: Dict[str, Any]
+    config: Dict
+    config_file: str
+    log_file: str
+    return_code: int = None
+    started_at: float = None
+    duration_s: float = None
+    error: str = None
+    overview_file: str = None
+    metrics: Dict[str, Any] = field(default_factory=dict)
+
+    @property
+    def succeeded(self) -> bool:
+        return self.return_code == 0
+
+
+def expand_grid(parameter_grid: Dict[str, List[Any]]) -> List[Dict[str, Any]]:
+    """
+    Returns every combination of the values in the grid, for example {"a": [1, 2], "b": [3]} results in
+    [{"a": 1, "b": 3}, {"a": 2, "b": 3}]
+    """
+    keys = list(parameter_grid.keys())
+    return [dict(zip(keys, values)) for values in itertools.product(*[parameter_grid[key] for key in keys])]
+
+
+def sample_search_space(search_space: Dict[str, Any], nr_samples: int, seed: int = None) -> List[Dict[str, Any]]:
+    """
+    Draws `nr_samples` random parameter sets from the search space. A list is sampled as a choice from its values, a
+    dict with a `min` and `max` as a uniform value in that range (an integer if both bounds are integers).
+    """
+    rng = random.Random(seed)
+    samples = []
+    for _ in range(nr_samples):
+        sample = {}
+        for key, values in search_space.items():
+            if isinstance(values, list):
+                sample[key] = rng.choice(values)
+            elif isinstance(values['min'], int) and isinstance(values['max'], int):
+                sample[key] = rng.randint(values['min'], values['max'])
+            else:
+                sample[key] = rng.uniform(values['min'], values['max'])
+        samples.append(sample)
+    return samples
+
+
+def apply_parameters(config: Dict, parameters: Dict[str, Any]) -> Dict:
+    """
+    Returns a copy of the config with the parameters applied. The parameter keys are paths separated by dots, where a
+    numeric element indexes a list, for example `symbol_configs.0.long.strategy_config.dca.ratio_power`. Every element
+    but the last one has to exist in the config, so a misspelled path raises a KeyError instead of adding a new branch
+    to the config. The last element can be a key that is not in the config yet, so optional parameters can be swept.
+    """
+    config = copy.deepcopy(config)
+    for path, value in parameters.items():
+        elements = path.split('.')
+        node = config
+        try:
+            for element in elements[:-1]:
+                node = node[int(element)] if isinstance(node, list) else node[element]
+            if isinstance(node, list):
+                node[int(elements[-1])] = value
+            elif isinstance(node, dict):
+                node[elements[-1]] = value
+            else:
+                raise KeyError(path)
+        except (KeyError, IndexError, ValueError, TypeError):
+            raise KeyError(f'The parameter path {path} does not exist in the config')
+    return config
+
+
+def overview_metrics(overview: Dict) -> Dict[str, Any]:
+    """
+    Returns the value of every metric in OVERVIEW_METRICS that is found in the overview. A metric is taken from the
+    first scalar value of which the key contains one of the names of the metric, trying the names in order.
+    """
+    values = []
+
+    def flatten(node):
+        if isinstance(node, dict):
+            for key, value in node.items():
+                if isinstance(value, (dict, list)):
+                    flatten(value)
+                else:
+                    values.append((str(key).lower(), value))
+        elif isinstance(node, list):
+            for value in node:
+                flatten(value)
+
+    flatten(overview)
+    metrics = {}
+    for metric, names in OVERVIEW_METRICS.items():
+        for name in names:
+            match = next((value for key, value in values if name in key), None)
+            if match is not None:
+                metrics[metric] = match
+                break
+    return metrics
+
+
+def find_overview_file(backtests_path: str,
+                       config: Dict,
+                       modified_after: float,
+                       skip_path: str = None,
+                       only_backtest: bool = False) -> str:
+    """
+    Returns the overview json that a backtest with the given config wrote to the backtests folder after
+    `modified_after`, or None if there is none. The backtest writes its overview next to a copy of the config it ran
+    with, which is used to tell apart the overviews of backtests that ran at the same time. When `only_backtest` is
+    set no other backtest ran in the meantime, so a single new overview is returned even if its config differs.
+    """
+    skip_path = os.path.abspath(skip_path) if skip_path is not None else None
+    new_overview_files = []
+    for folder, subfolders, files in os.walk(backtests_path):
+        # skip the downloaded market data and the sweep output itself
+        subfolders[:] = [subfolder for subfolder in subfolders
+                         if subfolder != 'data' and os.path.abspath(os.path.join(folder, subfolder)) != skip_path]
+        json_files = [file for file in files if file.endswith('.json')]
+        overview_files = [file for file in json_files if 'overview' in file.lower()
+                          and os.path.getmtime(os.path.join(folder, file)) >= modified_after]
+        if len(overview_files) == 0:
+            continue
+        new_overview_files.extend(os.path.join(folder, file) for file in overview_files)
+        for file in json_files:
+            if file in overview_files:
+                continue
+            try:
+                with open(os.path.join(folder, file)) as f:
+                    if hjson.load(f) != config:
+                        continue
+            except (OSError, ValueError):
+                continue
+            return os.path.join(folder, overview_files[0])
+    if only_backtest and len(new_overview_files) == 1:
+        return new_overview_files[0]
+    return None
+
+
+class ParameterSweep:
+    """
+    Runs a backtest for every parameter set on the same date range & balance, each in its own process with at most
+    `nr_processes` running at the same time. Per variant the config & backtest log are written to
+    `<sweep_path>/variant_<id>`, and a row is appended to `<sweep_path>/sweep.csv` as soon as the variant finishes.
+    The `status` column of a row is FAILED when the backtest exited with a non-zero return code or could not be
+    started, in which case the backtest log of the variant contains the reason. The overview json the backtest wrote
+    to `backtests_path` is copied to the variant folder, and its metrics (see OVERVIEW_METRICS) are added to the row;
+    they are left empty when the overview could not be found.
+    """
+
+    def __init__(self,
+                 base_config_file: str,
+                 balance: float,
+                 daterange: str,
+                 sweep_path: str,
+                 backtest_script: str,
+                 nr_processes: int = None,
+                 extra_arguments: List[str] = None,
+                 backtests_path: str = 'backtests'):
+        if not os.path.isfile(backtest_script):
+            raise InvalidConfigurationException(f'The backtest script {backtest_script} does not exist')
+        with open(base_config_file) as f:
+            self.base_config = hjson.load(f)
+        self.balance = balance
+        self.daterange = daterange
+        self.sweep_path = sweep_path
+        self.nr_processes = nr_processes if nr_processes is not None else os.cpu_count()
+        self.backtest_script = backtest_script
+        self.extra_arguments = extra_arguments if extra_arguments is not None else []
+        self.backtests_path = backtests_path
+
+    def run(self, parameter_sets: List[Dict[str, Any]]) -> List[SweepRun]:
+        os.makedirs(self.sweep_path, exist_ok=True)
+        runs = [self._prepare_run(variant_id=i, parameters=parameters) for i, parameters in enumerate(parameter_sets)]
+        logger.info(f'Starting sweep of {len(runs)} variants with {self.nr_processes} processes')
+
+        with open(os.path.join(self.sweep_path, 'sweep.csv'), 'w', newline='') as sweep_file:
+            writer = csv.writer(sweep_file)
+            writer.writerow(['variant_id', 'status', 'return_code', 'duration_s'] + list(OVERVIEW_METRICS.keys()) +
+                            ['config_file', 'log_file', 'overview_file', 'parameters'])
+            with ThreadPoolExecutor(max_workers=self.nr_processes) as executor:
+                futures = [executor.submit(self._execute_run, run) for run in runs]
+                for future in as_completed(futures):
+                    run = future.result()
+                    writer.writerow([run.variant_id, 'SUCCEEDED' if run.succeeded else 'FAILED', run.return_code,
+                                     f'{run.duration_s:.1f}'] +
+                                    [run.metrics.get(metric) for metric in OVERVIEW_METRICS] +
+                                    [run.config_file, run.log_file, run.overview_file, json.dumps(run.parameters)])
+                    sweep_file.flush()
+                    if run.succeeded:
+                        logger.info(f'Variant {run.variant_id} finished in {run.duration_s:.1f}s: {run.parameters}')
+                    else:
+                        logger.error(f'Variant {run.variant_id} FAILED with return code {run.return_code} in '
+                                     f'{run.duration_s:.1f}s, see {run.log_file}: {run.parameters}')
+
+        nr_failed = len([run for run in runs if not run.succeeded])
+        if nr_failed > 0:
+            logger.error(f'{nr_failed} of {len(runs)} variants failed')
+        return runs
+
+    def _prepare_run(self, variant_id: int, parameters: Dict[str, Any]) -> SweepRun:
+        variant_path = os.path.join(self.sweep_path, f'variant_{variant_id}')
+        os.makedirs(variant_path, exist_ok=True)
+        config_file = os.path.join(variant_path, 'config.json')
+        config = apply_parameters(self.base_config, parameters)
+        with open(config_file, 'w') as f:
+            json.dump(config, f, indent=2)
+        return SweepRun(variant_id=variant_id,
+                        parameters=parameters,
+                        config=config,
+                        config_file=config_file,
+                        log_file=os.path.join(variant_path, 'backtest.log'))
+
+    def _execute_run(self, run: SweepRun) -> SweepRun:
+        command = [sys.executable, self.backtest_script,
+                   '-c', run.config_file,
+                   '-b', str(self.balance),
+                   '-d', self.daterange,
+                   '--no_chart'] + self.extra_arguments
+        run.started_at = time.time()
+        start = time.monotonic()
+        with open(run.log_file, 'w') as log:
+            try:
+                run.return_code = subprocess.run(command, stdout=log, stderr=subprocess.STDOUT).returncode
+            except OSError as e:
+                run.error = str(e)
+                log.write(f'Failed to start the backtest: {e}\n')
+        run.duration_s = time.monotonic() - start
+        if run.succeeded:
+            self._read_overview(run)
+        return run
+
+    def _read_overview(self, run: SweepRun):
+        overview_file = find_overview_file(backtests_path=self.backtests_path,
+                                           config=run.config,
+                                           modified_after=run.started_at,
+                                           skip_path=self.sweep_path,
+                                           only_backtest=self.nr_processes == 1)
+        if overview_file is None:
+            logger.warning(f'No overview found in {self.backtests_path} for variant {run.variant_id}')
+            return
+        with open(overview_file) as f:
+            overview = hjson.load(f)
+        run.overview_file = os.path.join(os.path.dirname(run.config_file), 'overview.json')
+        with open(run.overview_file, 'w') as f:
+            json.dump(overview, f, indent=2)
+        run.metrics = overview_metrics(overview)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a backtest for every parameter set of a sweep definition')
+    parser.add_argument('-s', '--sweep', required=True,
+                        help='the sweep definition file, containing either a "grid" of values per config key, or a '
+                             '"random" search space per config key together with the number of "samples"')
+    parser.add_argument('-c', '--config', default='user_data/config.json', help='the base config file')
+    parser.add_argument('-b', '--balance', type=float, required=True, help='the balance to run the backtests with')
+    parser.add_argument('-d', '--daterange', required=True, help='the date range of the backtests')
+    parser.add_argument('-o', '--output', default='backtests/sweep', help='the folder to write the sweep results to')
+    parser.add_argument('--backtests', default='backtests',
+                        help='the folder the backtest script writes its results to')
+    parser.add_argument('-p', '--processes', type=int, default=None, help='the number of parallel backtests')
+    parser.add_argument('--backtest_script', required=True, help='the script to run a single backtest with')
+    args, extra_arguments = parser.parse_known_args()
+
+    with open(args.sweep) as f:
+        sweep_definition = hjson.load(f)
+    if 'grid' in sweep_definition:
+        parameter_sets = expand_grid(sweep_definition['grid'])
+    else:
+        parameter_sets = sample_search_space(search_space=sweep_definition['random'],
+                                             nr_samples=sweep_definition['samples'],
+                                             seed=sweep_definition.get('seed'))
+
+    runs = ParameterSweep(base_config_file=args.config,
+                          balance=args.balance,
+                          daterange=args.daterange,
+                          sweep_path=args.output,
+                          backtest_script=args.backtest_script,
+                          nr_processes=args.processes,
+                          extra_arguments=extra_arguments,
+                          backtests_path=args.backtests).run(parameter_sets)
+    if any(not run.succeeded for run in runs):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    main()
@@ -0,0 +1,135 @@
+import threading
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+from hawkbot.utils import parse_histogram
+
+
+class OrderbookHistogram:
+    """
+    Quantity histogram of (the first `depth` levels of) one side of the orderbook, as calculated by parse_histogram.
+    Bins are ordered on quantity, strongest first.
+    """
+
+    def __init__(self, prices: np.ndarray, quantities: np.ndarray):
+        self.prices = prices
+        self.quantities = quantities
+
+    def __len__(self) -> int:
+        return len(self.prices)
+
+    @property
+    def strongest_price(self) -> float:
+        return float(self.prices[0]) if len(self.prices) > 0 else None
+
+    @property
+    def strongest_quantity(self) -> float:
+        return float(self.quantities[0]) if len(self.quantities) > 0 else None
+
+    def levels(self) -> List[Tuple[float, float]]:
+        return list(zip(self.prices.tolist(), self.quantities.tolist()))
+
+
+class OrderbookSide:
+    """
+    One side of the orderbook of a symbol. An update only keeps a reference to the levels received from the orderbook,
+    as the orderbook is updated far more often than the histograms are requested. Histograms are calculated by
+    parse_histogram and cached per depth & number of bins together with the first `depth` levels they were calculated
+    from, so a cached histogram is reused for as long as those levels are unchanged. The quantity within a distance of
+    the best price is calculated on demand with a vectorized mask over the levels.
+    """
+
+    def __init__(self, is_bid: bool):
+        self.is_bid = is_bid
+        self.levels = []
+        # (depth, nr_bins) -> (first depth levels, histogram)
+        self.histograms: Dict[Tuple[int, int], Tuple[List[Tuple[float, float]], OrderbookHistogram]] = {}
+        self.lock = threading.RLock()
+
+    def __len__(self) -> int:
+        return len(self.levels)
+
+    def update(self, levels):
+        """
+        Replaces the levels of this side by the given [price, quantity] levels
+        """
+        with self.lock:
+            self.levels = levels
+
+    def histogram(self, depth: int, nr_bins: int) -> OrderbookHistogram:
+        key = (depth, nr_bins)
+        with self.lock:
+            levels = self.levels[:depth]
+            # compared on a copy, as the orderbook may update its levels in place
+            levels_copy = list(map(tuple, levels))
+            cached = self.histograms.get(key)
+            if cached is not None and cached[0] == levels_copy:
+                return cached[1]
+            histogram = self._calculate_histogram(levels=levels, nr_bins=nr_bins)
+            self.histograms[key] = (levels_copy, histogram)
+            return histogram
+
+    def cumulative_quantity(self, distance: float) -> float:
+        """
+        Returns the total quantity of the levels within `distance` (as a fraction) of the best price
+        """
+        with self.lock:
+            levels = self.levels
+        if len(levels) == 0:
+            return 0.0
+        levels = np.asarray(levels, dtype=float).reshape(-1, 2)
+        prices = levels[:, 0]
+        if self.is_bid:
+            within = prices >= prices.max() * (1 - distance)
+        else:
+            within = prices <= prices.min() * (1 + distance)
+        return float(levels[within, 1].sum())
+
+    @staticmethod
+    def _calculate_histogram(levels, nr_bins: int) -> OrderbookHistogram:
+        if len(levels) == 0:
+            return OrderbookHistogram(prices=np.empty(0, dtype=float), quantities=np.empty(0, dtype=float))
+
+        bins = parse_histogram(levels, nr_bins=nr_bins)
+        bins.sort(key=lambda x: x[1], reverse=True)
+        return OrderbookHistogram(prices=np.array([price for price, _ in bins], dtype=float),
+                                  quantities=np.array([quantity for _, quantity in bins], dtype=float))
+
+
+class OrderbookHistograms:
+    """
+    Keeps the bid & ask side per symbol for the histogram & depth queries of the orderbook based plugins. The plugins
+    share a single instance through `get_orderbook_histograms`, so a histogram requested by one plugin is reused by
+    the others.
+    """
+
+    def __init__(self):
+        self.bids: Dict[str, OrderbookSide] = {}
+        self.asks: Dict[str, OrderbookSide] = {}
+        self.lock = threading.Lock()
+
+    def bid_side(self, symbol: str, bids) -> OrderbookSide:
+        with self.lock:
+            side = self.bids.get(symbol)
+            if side is None:
+                side = OrderbookSide(is_bid=True)
+                self.bids[symbol] = side
+        side.update(bids)
+        return side
+
+    def ask_side(self, symbol: str, asks) -> OrderbookSide:
+        with self.lock:
+            side = self.asks.get(symbol)
+            if side is None:
+                side = OrderbookSide(is_bid=False)
+                self.asks[symbol] = side
+        side.update(asks)
+        return side
+
+
+_orderbook_histograms: OrderbookHistograms = OrderbookHistograms()
+
+
+def get_orderbook_histograms() -> OrderbookHistograms:
+    return _orderbook_histograms
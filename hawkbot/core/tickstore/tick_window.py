@@ -0,0 +1,185 @@
+import threading
+from collections import deque
+from typing import Deque, Tuple, Set, Hashable, Dict, List
+
+from hawkbot.core.data_classes import Tick
+from hawkbot.core.tickstore.tickstore import Tickstore
+
+
+class TickWindow:
+    """
+    Rolling window over the ticks of a single symbol, covering the last `window_ms` milliseconds. Ticks are kept in
+    arrival order in a ring buffer, next to a monotonic deque for the lowest and for the highest price in the window
+    and running sums for the volume weighted average price. Adding a tick and expiring old ticks is O(1) amortized,
+    and every statistic of the window is available in O(1).
+
+    The window is filled by `update`, which queries the tick store for the ticks since the previous update. Ticks
+    with a tick id that was already added are skipped, and ticks that are older than the newest tick in the window are
+    ignored by `add`. Ticks that are stored in the tick store up to `late_tick_ms` after newer ticks were added to the
+    window are picked up by `update`, which rebuilds the window when such a late tick is found.
+    """
+
+    def __init__(self, window_ms: int, late_tick_ms: int = 1000):
+        self.window_ms: int = window_ms
+        self.late_tick_ms: int = late_tick_ms
+        self.lock = threading.RLock()
+        # (sequence, timestamp, price, quantity)
+        self.ticks: Deque[Tuple[int, int, float, float]] = deque()
+        # (sequence, price), prices ascending from left to right
+        self.lows: Deque[Tuple[int, float]] = deque()
+        # (sequence, price), prices descending from left to right
+        self.highs: Deque[Tuple[int, float]] = deque()
+        self.next_sequence: int = 0
+        self.quote_volume: float = 0.0
+        self.volume: float = 0.0
+        self.newest_timestamp: int = None
+        # price of the first tick received with the newest timestamp
+        self.newest_price: float = None
+        # (timestamp, tick id) of the ticks added in the last late_tick_ms before the newest timestamp, to skip these
+        # when they are received again
+        self.recent_ticks: Deque[Tuple[int, Hashable]] = deque()
+        self.recent_tick_ids: Set[Hashable] = set()
+
+    def add(self, timestamp: int, price: float, quantity: float, tick_id: Hashable = None):
+        with self.lock:
+            if tick_id is not None and tick_id in self.recent_tick_ids:
+                return
+            if self.newest_timestamp is not None and timestamp < self.newest_timestamp:
+                return
+            if timestamp != self.newest_timestamp:
+                self.newest_timestamp = timestamp
+                self.newest_price = price
+                while len(self.recent_ticks) > 0 and self.recent_ticks[0][0] < timestamp - self.late_tick_ms:
+                    self.recent_tick_ids.discard(self.recent_ticks.popleft()[1])
+            if tick_id is not None:
+                self.recent_ticks.append((timestamp, tick_id))
+                self.recent_tick_ids.add(tick_id)
+
+            sequence = self.next_sequence
+            self.next_sequence += 1
+            self.ticks.append((sequence, timestamp, price, quantity))
+            self.quote_volume += price * quantity
+            self.volume += quantity
+
+            while len(self.lows) > 0 and self.lows[-1][1] >= price:
+                self.lows.pop()
+            self.lows.append((sequence, price))
+            while len(self.highs) > 0 and self.highs[-1][1] <= price:
+                self.highs.pop()
+            self.highs.append((sequence, price))
+
+    def update(self, tick_store: Tickstore, symbol: str, now: int):
+        """
+        Adds the ticks of the symbol that are not in the window yet from the tick store, and expires the ticks that
+        fell out of the window. The ticks of the last `late_tick_ms` before the newest timestamp in the window are
+        requested again, as more ticks can have been stored for that period since the previous update. When one of
+        these is older than the newest tick in the window and was not added before, the window is rebuilt from all
+        ticks in the window period.
+        """
+        with self.lock:
+            window_start = now - self.window_ms
+            if self.newest_timestamp is None:
+                self._add_ticks(tick_store=tick_store, symbol=symbol, start_timestamp=window_start, end_timestamp=now)
+            else:
+                start_timestamp = max(window_start, self.newest_timestamp - self.late_tick_ms)
+                if start_timestamp <= now:
+                    ticks = self._identified_ticks(tick_store=tick_store,
+                                                   symbol=symbol,
+                                                   start_timestamp=start_timestamp,
+                                                   end_timestamp=now)
+                    if any(tick.timestamp < self.newest_timestamp and tick_id not in self.recent_tick_ids
+                           for tick_id, tick in ticks):
+                        self.clear()
+                        self._add_ticks(tick_store=tick_store, symbol=symbol, start_timestamp=window_start, end_timestamp=now)
+                    else:
+                        for tick_id, tick in ticks:
+                            self.add(timestamp=tick.timestamp, price=tick.price, quantity=tick.qty, tick_id=tick_id)
+            self.expire(now)
+
+    def _add_ticks(self, tick_store: Tickstore, symbol: str, start_timestamp: int, end_timestamp: int):
+        for tick_id, tick in self._identified_ticks(tick_store=tick_store,
+                                                    symbol=symbol,
+                                                    start_timestamp=start_timestamp,
+                                                    end_timestamp=end_timestamp):
+            self.add(timestamp=tick.timestamp, price=tick.price, quantity=tick.qty, tick_id=tick_id)
+
+    @staticmethod
+    def _identified_ticks(tick_store: Tickstore, symbol: str, start_timestamp: int, end_timestamp: int) -> List[Tuple[Hashable, Tick]]:
+        """
+        Returns the ticks of the symbol between the timestamps in timestamp order, together with a tick id that is
+        unique for the tick. This is the trade id, or when the exchange doesn't provide one, the timestamp, price &
+        quantity together with the number of identical ticks before it. As every request starts at a timestamp
+        boundary, a tick gets the same tick id in every request that includes it.
+        """
+        ticks = sorted(tick_store.get_ticks(symbol=symbol, start_timestamp=start_timestamp, end_timestamp=end_timestamp),
+                       key=lambda t: t.timestamp)
+        occurrences: Dict[Tuple[int, float, float], int] = {}
+        identified_ticks = []
+        for tick in ticks:
+            if tick.last_trade_id is not None:
+                tick_id = tick.last_trade_id
+            else:
+                key = (tick.timestamp, tick.price, tick.qty)
+                occurrence = occurrences.get(key, 0)
+                occurrences[key] = occurrence + 1
+                tick_id = (tick.timestamp, tick.price, tick.qty, occurrence)
+            identified_ticks.append((tick_id, tick))
+        return identified_ticks
+
+    def clear(self):
+        with self.lock:
+            self.ticks.clear()
+            self.lows.clear()
+            self.highs.clear()
+            self.quote_volume = 0.0
+            self.volume = 0.0
+            self.newest_timestamp = None
+            self.newest_price = None
+            self.recent_ticks.clear()
+            self.recent_tick_ids.clear()
+
+    def expire(self, now: int):
+        """
+        Removes all ticks with a timestamp before `now - window_ms`
+        """
+        start_timestamp = now - self.window_ms
+        with self.lock:
+            while len(self.ticks) > 0 and self.ticks[0][1] < start_timestamp:
+                sequence, _, price, quantity = self.ticks.popleft()
+                self.quote_volume -= price * quantity
+                self.volume -= quantity
+                if self.lows[0][0] == sequence:
+                    self.lows.popleft()
+                if self.highs[0][0] == sequence:
+                    self.highs.popleft()
+            if len(self.ticks) == 0:
+                self.quote_volume = 0.0
+                self.volume = 0.0
+
+    def __len__(self) -> int:
+        return len(self.ticks)
+
+    @property
+    def oldest_timestamp(self) -> int:
+        with self.lock:
+            return self.ticks[0][1] if len(self.ticks) > 0 else None
+
+    @property
+    def oldest_price(self) -> float:
+        with self.lock:
+            return self.ticks[0][2] if len(self.ticks) > 0 else None
+
+    @property
+    def low(self) -> float:
+        with self.lock:
+            return self.lows[0][1] if len(self.lows) > 0 else None
+
+    @property
+    def high(self) -> float:
+        with self.lock:
+            return self.highs[0][1] if len(self.highs) > 0 else None
+
+    @property
+    def vwap(self) -> float:
+        with self.lock:
+            return self.quote_volume / self.volume if self.volume > 0 else None
@@ -1,19 +1,39 @@
 import concurrent
 import logging
-from concurrent.futures import wait
+from concurrent.futures import wait, ProcessPoolExecutor
 from typing import List, Dict
 
+from setproctitle import setproctitle
+
 from hawkbot.core.data_classes import SymbolPositionSide, Timeframe, FilterResult
 from hawkbot.core.model import PositionSide
-from hawkbot.exceptions import InvalidConfigurationException
+from hawkbot.exceptions import InvalidConfigurationException, NoLevelFoundException
 from hawkbot.core.filters.filter import Filter
-from hawkbot.plugins.clustering_sr.clustering_sr_plugin import ClusteringSupportResistancePlugin
-from hawkbot.plugins.clustering_sr.data_classes import SupportResistance
-from hawkbot.utils import get_percentage_difference
+from hawkbot.logging.logging_globals import get_logging_queue
+from hawkbot.plugins.clustering_sr.algo_type import AlgoType
+from hawkbot.plugins.clustering_sr.algos.algo import Algo
+from hawkbot.plugins.clustering_sr.clustering_sr_plugin import ClusteringSupportResistancePlugin, calculate_support_resistance
+from hawkbot.plugins.clustering_sr.data_classes import SupportResistance, SupportResistanceRequest
+from hawkbot.utils import get_percentage_difference, init_logging
 
 logger = logging.getLogger(__name__)
 
 
+# the algo instance of a level worker process, created once by init_level_worker
+_worker_algo: Algo = None
+
+
+def init_level_worker(logging_queue, algo_type_name: str, algo_config: Dict):
+    global _worker_algo
+    setproctitle('HB_LevelFilter_Worker')
+    init_logging(logging_queue)
+    _worker_algo = AlgoType[algo_type_name].value[1](algo_config)
+
+
+def calculate_levels_in_worker(sr_request: SupportResistanceRequest) -> SupportResistance:
+    return calculate_support_resistance(algo=_worker_algo, sr_request=sr_request)
+
+
 class LevelFilter(Filter):
     @classmethod
     def filter_name(cls):
@@ -49,6 +69,14 @@ class LevelFilter(Filter):
         self.minimum_number_of_available_dcas: int = 3
         self.overlap: float = 0.001
         self.grid_span: float = 1.0
+        self.algo_type: AlgoType = AlgoType.KMEANS
+        self.algo_config: Dict = None
+        self.outer_price_algo_type: AlgoType = AlgoType.KMEANS
+        self.algo: Algo = None
+        self.outer_price_algo: Algo = None
+        self.parallel_processes: int = None
+        self.parallel_chunksize: int = 1
+        self.executor: ProcessPoolExecutor = None
 
         self.init_config(self.filter_config)
 
@@ -124,6 +152,28 @@ class LevelFilter(Filter):
         if 'overlap' in filter_config:
             self.overlap = filter_config['overlap']
 
+        if 'algo' in filter_config:
+            self.algo_type = AlgoType[filter_config['algo']]
+
+        if 'algo_config' in filter_config:
+            self.algo_config = filter_config['algo_config']
+
+        if 'outer_price_algo' in filter_config:
+            self.outer_price_algo_type = AlgoType[filter_config['outer_price_algo']]
+
+        self.algo = self.algo_type.value[1](self.algo_config)
+        self.outer_price_algo = self.outer_price_algo_type.value[1]()
+
+        if 'parallel_processes' in filter_config:
+            self.parallel_processes = filter_config['parallel_processes']
+
+        if 'parallel_chunksize' in filter_config:
+            self.parallel_chunksize = filter_config['parallel_chunksize']
+
+        if self.parallel_chunksize <= 0:
+            raise InvalidConfigurationException(f"LevelFilter: The parameter 'parallel_chunksize' needs to be a "
+                                                f"positive value (current value = '{self.parallel_chunksize}')")
+
         if self.minimum_distance_to_outer_price is not None \
                 and self.minimum_distance_to_outer_price <= 0:
             raise InvalidConfigurationException(f"LevelFilter: The parameter "
@@ -158,32 +208,27 @@ class LevelFilter(Filter):
 
         self.preload_candles(position_side, starting_list)
 
+        candidates = []
         for symbol_positionside in starting_list:
             symbol = symbol_positionside.symbol
             logger.debug(f'Checking if volatile symbol {symbol} is close enough to the entry level')
             if self.bot.config.position_side_enabled(symbol=symbol, position_side=position_side):
                 continue
+            candidates.append(symbol_positionside)
 
-            current_price = current_prices[symbol].price
-            price_step = self.exchange_state.get_symbol_information(symbol).price_step
-            support_resistance = self.clustering_sr_plugin \
-                .get_support_resistance_levels_expanded(symbol=symbol,
-                                                        position_side=position_side,
-                                                        period=self.period,
-                                                        nr_clusters=self.nr_clusters,
-                                                        period_timeframe=self.period_timeframe,
-                                                        period_start_date=self.period_start_date,
-                                                        even_price=current_price,
-                                                        price_step=price_step,
-                                                        outer_price=self.outer_price,
-                                                        outer_price_timeframe=self.outer_price_timeframe,
-                                                        outer_price_period=self.outer_price_period,
-                                                        outer_price_period_start_date=self.outer_price_period_start_date,
-                                                        outer_price_level_nr=self.outer_price_level_nr,
-                                                        outer_price_nr_clusters=self.outer_price_nr_clusters,
-                                                        minimum_distance_to_outer_price=self.minimum_distance_to_outer_price,
-                                                        maximum_distance_from_outer_price=self.maximum_distance_from_outer_price)
+        if self.parallel_processes is not None and self.parallel_processes > 1:
+            support_resistances = self.calculate_levels_parallel(candidates=candidates,
+                                                                 position_side=position_side,
+                                                                 current_prices=current_prices)
+        else:
+            support_resistances = {symbol_positionside: self.calculate_levels(symbol=symbol_positionside.symbol,
+                                                                              position_side=position_side,
+                                                                              current_price=current_prices[symbol_positionside.symbol].price)
+                                   for symbol_positionside in candidates}
 
+        for symbol_positionside in candidates:
+            symbol = symbol_positionside.symbol
+            support_resistance = support_resistances[symbol_positionside]
             accept_entry = self.is_price_close_to_level(symbol=symbol,
                                                         position_side=position_side,
                                                         current_price=current_prices[symbol].price,
@@ -198,6 +243,146 @@ class LevelFilter(Filter):
 
         return filtered_symbols
 
+    def calculate_levels(self, symbol: str, position_side: PositionSide, current_price: float) -> SupportResistance:
+        price_step = self.exchange_state.get_symbol_information(symbol).price_step
+        return self.clustering_sr_plugin \
+            .get_support_resistance_levels_expanded(symbol=symbol,
+                                                    position_side=position_side,
+                                                    first_level_period=None,
+                                                    first_level_period_timeframe=None,
+                                                    first_level_algo=None,
+                                                    first_level_nr_clusters=None,
+                                                    period=self.period,
+                                                    period_start_date=self.period_start_date,
+                                                    algo=self.algo,
+                                                    nr_clusters=self.nr_clusters,
+                                                    period_timeframe=self.period_timeframe,
+                                                    even_price=current_price,
+                                                    price_step=price_step,
+                                                    outer_price=self.outer_price,
+                                                    outer_price_distance=None,
+                                                    outer_price_distance_from_opposite_position=None,
+                                                    outer_price_timeframe=self.outer_price_timeframe,
+                                                    outer_price_period=self.outer_price_period,
+                                                    outer_price_period_start_date=self.outer_price_period_start_date,
+                                                    outer_price_level_nr=self.outer_price_level_nr,
+                                                    outer_price_nr_clusters=self.outer_price_nr_clusters,
+                                                    outer_price_algo=self.outer_price_algo,
+                                                    minimum_distance_to_outer_price=self.minimum_distance_to_outer_price,
+                                                    maximum_distance_from_outer_price=self.maximum_distance_from_outer_price)
+
+    def calculate_levels_parallel(self,
+                                  candidates: List[SymbolPositionSide],
+                                  position_side: PositionSide,
+                                  current_prices: Dict) -> Dict[SymbolPositionSide, SupportResistance]:
+        """
+        Fetches the candles for each candidate on the calling thread, after which the actual level calculation is
+        distributed over a pool of worker processes. For price independent algos, symbols with levels in the sr cache
+        of the clustering plugin are not sent to the workers, and calculated levels are stored in that cache. Only the
+        candles & symbol information are sent to the workers, and only the calculated levels are returned; every worker
+        creates its own algo instance once, so algo state (like the kmeans knee cache) stays in the worker between calls.
+        """
+        support_resistances = {}
+        pending_requests = []
+        for symbol_positionside in candidates:
+            symbol = symbol_positionside.symbol
+            current_price = current_prices[symbol].price
+            price_step = self.exchange_state.get_symbol_information(symbol).price_step
+            try:
+                outer_grid_price = self.clustering_sr_plugin.determine_outer_price(symbol=symbol,
+                                                                                   position_side=position_side,
+                                                                                   even_price=current_price,
+                                                                                   outer_price=self.outer_price,
+                                                                                   outer_price_distance=None,
+                                                                                   outer_price_distance_from_opposite_position=None,
+                                                                                   outer_price_timeframe=self.outer_price_timeframe,
+                                                                                   outer_price_period=self.outer_price_period,
+                                                                                   outer_price_period_start_date=self.outer_price_period_start_date,
+                                                                                   nr_clusters=self.outer_price_nr_clusters,
+                                                                                   outer_price_level_nr=self.outer_price_level_nr,
+                                                                                   outer_price_algo=self.outer_price_algo,
+                                                                                   minimum_distance_to_outer_price=self.minimum_distance_to_outer_price,
+                                                                                   maximum_distance_from_outer_price=self.maximum_distance_from_outer_price)
+            except NoLevelFoundException:
+                support_resistances[symbol_positionside] = SupportResistance()
+                continue
+
+            original_start_date = self.clustering_sr_plugin.register_period(symbol=symbol,
+                                                                            period=self.period,
+                                                                            period_start_date=self.period_start_date,
+                                                                            period_timeframe=self.period_timeframe)
+            if self.algo.price_independent:
+                cache_key = self.clustering_sr_plugin.sr_cache_key(symbol=symbol,
+                                                                   position_side=position_side,
+                                                                   period=self.period,
+                                                                   period_start_date=self.period_start_date,
+                                                                   nr_clusters=self.nr_clusters,
+                                                                   period_timeframe=self.period_timeframe,
+                                                                   algo=self.algo)
+                cache_entry = self.clustering_sr_plugin.get_from_sr_cache(cache_key)
+                if cache_entry is not None:
+                    support_resistance = self.clustering_sr_plugin.levels_within_price_range(cache_entry=cache_entry,
+                                                                                             position_side=position_side,
+                                                                                             outer_grid_price=outer_grid_price,
+                                                                                             current_price=current_price)
+                    support_resistances[symbol_positionside] = self.clustering_sr_plugin.levels_around_price(support_resistance=support_resistance,
+                                                                                                            even_price=current_price,
+                                                                                                            price_step=price_step)
+                    continue
+                # calculated over all candles of the period and limited to the current & outer grid price afterwards
+                request_outer_grid_price = None
+                request_current_price = None
+            else:
+                cache_key = None
+                request_outer_grid_price = outer_grid_price
+                request_current_price = current_price
+
+            sr_request = self.clustering_sr_plugin.create_sr_request(symbol=symbol,
+                                                                     position_side=position_side,
+                                                                     original_start_date=original_start_date,
+                                                                     nr_clusters=self.nr_clusters,
+                                                                     outer_grid_price=request_outer_grid_price,
+                                                                     period_timeframe=self.period_timeframe,
+                                                                     current_price=request_current_price,
+                                                                     algo=self.algo)
+            if sr_request is None:
+                support_resistances[symbol_positionside] = SupportResistance()
+                continue
+            pending_requests.append((symbol_positionside, price_step, cache_key, outer_grid_price, current_price, sr_request))
+
+        if len(pending_requests) == 0:
+            return support_resistances
+
+        logger.info(f'Calculating levels for {len(pending_requests)} symbols using {self.parallel_processes} processes')
+        results = self.get_executor().map(calculate_levels_in_worker,
+                                          [sr_request for _, _, _, _, _, sr_request in pending_requests],
+                                          chunksize=self.parallel_chunksize)
+        for (symbol_positionside, price_step, cache_key, outer_grid_price, current_price, sr_request), support_resistance in zip(pending_requests, results):
+            if cache_key is not None:
+                cache_entry = self.clustering_sr_plugin.store_in_sr_cache(cache_key=cache_key,
+                                                                          support_resistance=support_resistance,
+                                                                          candles=sr_request.candles)
+                support_resistance = self.clustering_sr_plugin.levels_within_price_range(cache_entry=cache_entry,
+                                                                                         position_side=position_side,
+                                                                                         outer_grid_price=outer_grid_price,
+                                                                                         current_price=current_price)
+            support_resistances[symbol_positionside] = self.clustering_sr_plugin.levels_around_price(support_resistance=support_resistance,
+                                                                                                    even_price=current_price,
+                                                                                                    price_step=price_step)
+        return support_resistances
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(max_workers=self.parallel_processes,
+                                                initializer=init_level_worker,
+                                                initargs=(get_logging_queue(), self.algo_type.name, self.algo_config))
+        return self.executor
+
+    def stop(self):
+        if self.executor is not None:
+            self.executor.shutdown(wait=True, cancel_futures=True)
+            self.executor = None
+
     def minimum_nr_dcas_available(self,
                                   symbol: str,
                                   position_side: PositionSide,
@@ -8,6 +8,7 @@ from hawkbot.core.time_provider import now_timestamp
 from hawkbot.exceptions import InvalidConfigurationException
 from hawkbot.core.filters.filter import Filter
 from hawkbot.plugins.cryptofeed_plugin.cryptofeed import Cryptofeed
+from hawkbot.plugins.cryptofeed_plugin.tick_counter import TickCounter
 from hawkbot.utils import period_as_ms, readable
 
 logger = logging.getLogger(__name__)
@@ -21,6 +22,7 @@ class TickcountFilter(Filter):
     def __init__(self, bot, name: str, filter_config, redis_host: str, redis_port: int):
         super().__init__(bot=bot, name=name, filter_config=filter_config, redis_host=redis_host, redis_port=redis_port)
         self.redis = Redis(host=self.redis_host, port=self.redis_port, decode_responses=True)
+        self.tick_counter = TickCounter(redis=self.redis)
         self.lookback_period = period_as_ms(filter_config['lookback_period'])
         self.minimum_age: int = None
         self._minimum_age_ms: int = None
@@ -44,7 +46,7 @@ class TickcountFilter(Filter):
                        first_filter: bool,
                        previous_filter_results: List[FilterResult]) -> Dict[str, Dict]:
         self._subscribe_to_symbols(symbols=[symbol for symbol in starting_list])
-        symbols_by_tickcount = self.symbols_by_tickcount()
+        symbols_by_tickcount = self.symbols_by_tickcount(symbols=starting_list)
         sort_descending = self.sort is None or self.sort == 'desc'
         sorted_symbols = sorted(symbols_by_tickcount.items(), key=lambda x: x[1], reverse=sort_descending)
         if self.top is not None:
@@ -65,18 +67,17 @@ class TickcountFilter(Filter):
             logger.debug(f"{symbol}: Sending subscription message to cryptofeed")
             self.redis.publish(channel=Cryptofeed.LISTENTO_SYMBOL, message=symbol)
 
-    def symbols_by_tickcount(self) -> Dict[int, str]:
+    def symbols_by_tickcount(self, symbols: List[str]) -> Dict[str, int]:
         result = {}
-        trade_key_names = [i for i in self.redis.scan(match=f'{Cryptofeed.TRADEPRICE_SYMBOL}*', count=1000000)[1]]
         now = now_timestamp()
-        for key_name in trade_key_names:
-            symbol = key_name.replace(Cryptofeed.TRADEPRICE_SYMBOL, "")
+        tick_counts = self.tick_counter.count_ticks(symbols=symbols, lookback_period_ms=self.lookback_period, now=now)
+        for symbol, tick_count in tick_counts.items():
             if self._minimum_age_ms is not None:
-                earliest_timestamp = int(self.redis.zrange(name=key_name, start=0, end=0, withscores=True)[0][1])
+                earliest_timestamp = tick_count.earliest_timestamp
                 threshold = now - self._minimum_age_ms
                 if earliest_timestamp > threshold:
                     logger.debug(f'{symbol}: Ignoring symbol because the earliest tick is at {readable(earliest_timestamp)}, which is not older than the specified minimum age of '
                                 f'{self.minimum_age}, meaning the earliest tick needs to be before {readable(threshold)}')
                     continue
-            result[symbol] = self.redis.zcount(name=key_name, min=now - self.lookback_period, max=now)
+            result[symbol] = tick_count.count
         return result
@@ -10,6 +10,11 @@ logger = logging.getLogger(__name__)
 
 
 class Algo:
+    # Whether the levels only depend on the candles. The levels of these algos are calculated from all candles of the
+    # period without a current or outer price, cached per candle close, and only limited to the price range between
+    # the current and outer price after the lookup
+    price_independent: bool = False
+
     def __init__(self, algo_config: Dict = None):
         self.algo_config = algo_config
 
@@ -14,6 +14,8 @@ logger = logging.getLogger(__name__)
 
 
 class BMeansAlgo(Algo):
+    price_independent = True
+
     def calculate_levels(self,
                          symbol: str,
                          position_side: PositionSide,
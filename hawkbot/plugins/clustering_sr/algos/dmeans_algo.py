@@ -1,13 +1,14 @@
 import logging
-from typing import List
+from dataclasses import dataclass
+from typing import List, Dict, Tuple
 
 import numpy as np
-from scipy.signal import find_peaks
+from scipy.signal import find_peaks, fftconvolve
 from sklearn.model_selection import GridSearchCV
 from sklearn.neighbors import KernelDensity
 
 from hawkbot.core.data_classes import Candle
-from hawkbot.core.model import PositionSide, SymbolInformation
+from hawkbot.core.model import PositionSide, SymbolInformation, Timeframe
 from hawkbot.plugins.clustering_sr.algos.algo import Algo
 from hawkbot.plugins.clustering_sr.data_classes import SupportResistance
 from hawkbot.utils import readable
@@ -15,7 +16,45 @@ from hawkbot.utils import readable
 logger = logging.getLogger(__name__)
 
 
+@dataclass
+class BandwidthCache:
+    kernel: str
+    bandwidth: float
+    mean: float
+    std: float
+
+
 class DMeansAlgo(Algo):
+    """
+    Calculates levels at the maxima of the kernel density of the open & close prices. The kernel & bandwidth are
+    selected once per symbol & timeframe, and are only selected again when the mean or standard deviation of the
+    prices drifts more than `bandwidth_drift` (relative to the standard deviation at the time of selection). The
+    density itself is evaluated on a binned grid using an FFT convolution.
+
+    Attributes:
+        bandwidth_method (str = 'search'): 'search' selects the kernel & bandwidth with a coarse-to-fine cross-validated
+                                           search, 'silverman' uses a gaussian kernel with Silverman's rule of thumb
+        bandwidth_drift (float = 0.1): the relative drift of the price distribution after which the bandwidth is
+                                       selected again
+    """
+    price_independent = True
+
+    min_bandwidth_log = -2
+    max_bandwidth_log = 1
+    coarse_bandwidth_steps = 16
+    fine_bandwidth_steps = 16
+    cv_folds = 3
+    kernels = ["gaussian", "exponential"]
+    grid_size = 1000
+    min_prominence = 0.01
+
+    def __init__(self, algo_config: Dict = None):
+        super().__init__(algo_config=algo_config)
+        algo_config = algo_config or {}
+        self.bandwidth_method: str = algo_config.get('bandwidth_method', 'search')
+        self.bandwidth_drift: float = algo_config.get('bandwidth_drift', 0.1)
+        self.bandwidth_cache: Dict[str, Dict[Timeframe, BandwidthCache]] = {}
+
     def calculate_levels(
             self,
             symbol: str,
@@ -38,41 +77,90 @@ class DMeansAlgo(Algo):
             )
             return SupportResistance()
 
-        # ideally we want to pass the params to this instead of hardcoded
-        min_bandwidth_log = -2
-        max_bandwidth_log = 1
-        n_bandwidths = 1000
-        min_prominence = 0.01
-
         candles.sort(key=lambda x: x.close_date)
 
         opens = [float(candle.open) for candle in candles]
         closes = [float(candle.close) for candle in candles]
         # volumes = [float(candle.volume) for candle in candles] # we can add volumes in the mix, maybe later
-        prices = np.vstack((opens, closes)).reshape(-1, 1)
+        prices = np.concatenate((opens, closes))
 
-        # Define values of bandwidths to try (hyperparameter space)
-        bandwidths = 10 ** np.linspace(min_bandwidth_log, max_bandwidth_log, n_bandwidths)
-
-        # Grid search
-        grid = GridSearchCV(KernelDensity(), {"kernel": ["gaussian", "exponential"], "bandwidth": bandwidths})
-        grid.fit(prices)
-        best_estimator = grid.best_estimator_
+        a, b = prices.min(), prices.max()
+        if a == b:
+            return SupportResistance()
 
-        # Fit best estimator to data
-        kde = best_estimator.fit(prices)
+        kernel, bandwidth = self.get_kernel_bandwidth(symbol=symbol, timeframe=candles[0].timeframe, prices=prices)
+        logger.debug(f'{symbol} {position_side.name}: Using {kernel} kernel with bandwidth {bandwidth}')
 
         # Construct pdf
-        a, b = min(prices), max(prices)
-        xx = np.linspace(a, b, 1000).reshape(-1, 1)
-        pdf = np.exp(kde.score_samples(xx))
+        xx = np.linspace(a, b, self.grid_size)
+        pdf = self.binned_density(prices=prices, grid=xx, kernel=kernel, bandwidth=bandwidth)
 
         # Find maxima
         # Get the supports and resistances
-        peaks, _ = find_peaks(pdf, prominence=min_prominence)
+        peaks, _ = find_peaks(pdf, prominence=self.min_prominence)
         support_resistances = xx[peaks]  # price values
         strengths = pdf[
             peaks
         ]  # density (related to strength of resistance/support == more clustered candles in the area and inherently more volume)
 
         return SupportResistance(support_resistances.reshape(-1, ), strengths.reshape(-1, ))
+
+    def get_kernel_bandwidth(self, symbol: str, timeframe: Timeframe, prices: np.ndarray) -> Tuple[str, float]:
+        mean = float(prices.mean())
+        std = float(prices.std())
+        cached = self.bandwidth_cache.get(symbol, {}).get(timeframe)
+        if cached is not None and cached.std > 0 \
+                and abs(mean - cached.mean) <= self.bandwidth_drift * cached.std \
+                and abs(std - cached.std) <= self.bandwidth_drift * cached.std:
+            return cached.kernel, cached.bandwidth
+
+        if self.bandwidth_method == 'silverman':
+            kernel, bandwidth = 'gaussian', self.silverman_bandwidth(prices)
+        else:
+            kernel, bandwidth = self.search_bandwidth(prices)
+
+        self.bandwidth_cache.setdefault(symbol, {})[timeframe] = BandwidthCache(kernel=kernel,
+                                                                                 bandwidth=bandwidth,
+                                                                                 mean=mean,
+                                                                                 std=std)
+        return kernel, bandwidth
+
+    def search_bandwidth(self, prices: np.ndarray) -> Tuple[str, float]:
+        samples = prices.reshape(-1, 1)
+        coarse_logs = np.linspace(self.min_bandwidth_log, self.max_bandwidth_log, self.coarse_bandwidth_steps)
+        grid = GridSearchCV(KernelDensity(), {"kernel": self.kernels, "bandwidth": 10 ** coarse_logs}, cv=self.cv_folds)
+        grid.fit(samples)
+        kernel = grid.best_params_['kernel']
+        best_log = np.log10(grid.best_params_['bandwidth'])
+
+        coarse_step = coarse_logs[1] - coarse_logs[0]
+        fine_logs = np.linspace(max(best_log - coarse_step, self.min_bandwidth_log),
+                                min(best_log + coarse_step, self.max_bandwidth_log),
+                                self.fine_bandwidth_steps)
+        grid = GridSearchCV(KernelDensity(kernel=kernel), {"bandwidth": 10 ** fine_logs}, cv=self.cv_folds)
+        grid.fit(samples)
+        return kernel, float(grid.best_params_['bandwidth'])
+
+    def silverman_bandwidth(self, prices: np.ndarray) -> float:
+        q75, q25 = np.percentile(prices, [75, 25])
+        spread = min(prices.std(), (q75 - q25) / 1.34)
+        if spread <= 0:
+            spread = prices.std()
+        return float(0.9 * spread * len(prices) ** (-1 / 5))
+
+    def binned_density(self, prices: np.ndarray, grid: np.ndarray, kernel: str, bandwidth: float) -> np.ndarray:
+        delta = grid[1] - grid[0]
+        positions = (prices - grid[0]) / delta
+        lower = np.clip(np.floor(positions).astype(int), 0, len(grid) - 2)
+        upper_weights = positions - lower
+        counts = np.bincount(lower, weights=1 - upper_weights, minlength=len(grid)) + \
+                 np.bincount(lower + 1, weights=upper_weights, minlength=len(grid))
+
+        offsets = np.arange(-(len(grid) - 1), len(grid)) * delta
+        if kernel == 'exponential':
+            kernel_values = np.exp(-np.abs(offsets) / bandwidth) / (2 * bandwidth)
+        else:
+            kernel_values = np.exp(-0.5 * (offsets / bandwidth) ** 2) / (bandwidth * np.sqrt(2 * np.pi))
+
+        pdf = fftconvolve(counts, kernel_values, mode='same') / len(prices)
+        return np.maximum(pdf, 0)
@@ -1,20 +1,40 @@
 import logging
-from typing import List
+from typing import List, Dict
 
+import ckwrap
 import numpy as np
 from kneed import KneeLocator
-from sklearn.cluster import KMeans
 
 from hawkbot.core.data_classes import Candle
-from hawkbot.core.model import PositionSide, SymbolInformation
+from hawkbot.core.model import PositionSide, SymbolInformation, Timeframe
 from hawkbot.plugins.clustering_sr.algos.algo import Algo
-from hawkbot.plugins.clustering_sr.data_classes import SupportResistance
+from hawkbot.plugins.clustering_sr.data_classes import SupportResistance, KMeansCache
 from hawkbot.utils import readable
 
 logger = logging.getLogger(__name__)
 
 
 class KMeansAlgo(Algo):
+    """
+    Calculates levels by clustering the close prices of the candles. Because close prices are one-dimensional, the
+    clustering is done using the optimal sorted-array dynamic programming k-means (ckmeans) instead of the iterative
+    Lloyd's algorithm. The elbow (knee) of the inertia curve is cached per symbol & timeframe, and is only searched
+    again once a significant part of the candle window has been replaced, or when the window does not continue the
+    cached window (it starts earlier than, or after the end of, the cached window). When the candle window did not change at all,
+    the previously calculated levels are returned directly.
+
+    Attributes:
+        knee_refit_ratio (float = 0.1): the fraction of the candle window that needs to consist of new candles before
+                                        the knee is searched again over k=1..nr_clusters
+    """
+    price_independent = True
+
+    def __init__(self, algo_config: Dict = None):
+        super().__init__(algo_config=algo_config)
+        algo_config = algo_config or {}
+        self.knee_refit_ratio: float = algo_config.get('knee_refit_ratio', 0.1)
+        self.cache: Dict[str, Dict[Timeframe, KMeansCache]] = {}
+
     def calculate_levels(self,
                          symbol: str,
                          position_side: PositionSide,
@@ -36,33 +56,53 @@ class KMeansAlgo(Algo):
 
         candles.sort(key=lambda x: x.close_date)
 
-        supports = []
-        resistances = []
-
         try:
-            sum_of_sq_distances = []
-            X = np.array([candle.close for candle in candles])
-            K = range(1, nr_clusters + 1)
-            for k in K:
-                km = KMeans(n_clusters=k)
-                km = km.fit(X.reshape(-1, 1))
-                sum_of_sq_distances.append(km.inertia_)
-            kn = KneeLocator(K, sum_of_sq_distances, S=1.0, curve="concave", direction="decreasing")
-            kmeans = KMeans(n_clusters=kn.knee).fit(X.reshape(-1, 1))
-            c = kmeans.predict(X.reshape(-1, 1))
-            min_and_max = []
-            for i in range(kn.knee):
-                min_and_max.append([-np.inf, np.inf])
-            for i in range(len(X)):
-                cluster = c[i]
-                if X[i] > min_and_max[cluster][0]:
-                    min_and_max[cluster][0] = X[i]
-                if X[i] < min_and_max[cluster][1]:
-                    min_and_max[cluster][1] = X[i]
-
-            for resistance, support in min_and_max:
-                supports.append(support)
-                resistances.append(resistance)
+            X = np.array([candle.close for candle in candles], dtype=float)
+            timeframe = candles[0].timeframe
+            first_start_date = candles[0].start_date
+            last_close_date = candles[-1].close_date
+            close_sum = float(X.sum())
+
+            cached = self.cache.get(symbol, {}).get(timeframe)
+            if cached is not None and cached.matches(first_start_date=first_start_date,
+                                                     last_close_date=last_close_date,
+                                                     nr_candles=len(X),
+                                                     close_sum=close_sum,
+                                                     nr_clusters=nr_clusters):
+                logger.debug(f'{symbol} {position_side.name}: Candle window unchanged, returning cached kmeans levels')
+                return SupportResistance(supports=list(cached.support_resistance.supports),
+                                         resistances=list(cached.support_resistance.resistances))
+
+            if cached is not None and \
+                    cached.nr_clusters == nr_clusters and \
+                    cached.first_start_date <= first_start_date <= cached.last_close_date and \
+                    last_close_date >= cached.last_close_date:
+                # the window slid forward over the cached window; count both the candles that were added at the end
+                # and the candles that dropped off at the start as replaced
+                new_candles = sum(1 for candle in candles if candle.close_date > cached.last_close_date)
+                dropped_candles = max(0, cached.nr_candles - (len(X) - new_candles))
+                candles_since_knee = cached.candles_since_knee + new_candles + dropped_candles
+            else:
+                # a window that starts earlier or does not overlap the cached window is different data
+                candles_since_knee = None
+
+            if candles_since_knee is not None and candles_since_knee <= len(X) * self.knee_refit_ratio:
+                knee = cached.knee
+            else:
+                knee = self.find_knee(X=X, nr_clusters=nr_clusters)
+                candles_since_knee = 0
+
+            support_resistance = self.cluster_levels(X=X, k=knee)
+            self.cache.setdefault(symbol, {})[timeframe] = KMeansCache(first_start_date=first_start_date,
+                                                                        last_close_date=last_close_date,
+                                                                        nr_candles=len(X),
+                                                                        close_sum=close_sum,
+                                                                        nr_clusters=nr_clusters,
+                                                                        knee=knee,
+                                                                        candles_since_knee=candles_since_knee,
+                                                                        support_resistance=support_resistance)
+            return SupportResistance(supports=list(support_resistance.supports),
+                                     resistances=list(support_resistance.resistances))
         except:
             logger.exception(
                 f"{symbol} {position_side.name}: An unexpected error occurred while processing the "
@@ -73,4 +113,23 @@ class KMeansAlgo(Algo):
                 f"the lowest close price = {min([candle.close for candle in candles])}, "
                 f"the highest close price = {max([candle.close for candle in candles])}.")
 
+        return SupportResistance()
+
+    def find_knee(self, X: np.ndarray, nr_clusters: int) -> int:
+        K = range(1, nr_clusters + 1)
+        sum_of_sq_distances = [float(np.sum(ckwrap.ckmeans(X, k).withinss)) for k in K]
+        kn = KneeLocator(K, sum_of_sq_distances, S=1.0, curve="concave", direction="decreasing")
+        return kn.knee
+
+    def cluster_levels(self, X: np.ndarray, k: int) -> SupportResistance:
+        labels = ckwrap.ckmeans(X, k).labels
+        supports = []
+        resistances = []
+        for cluster in range(k):
+            cluster_prices = X[labels == cluster]
+            if len(cluster_prices) == 0:
+                continue
+            supports.append(float(cluster_prices.min()))
+            resistances.append(float(cluster_prices.max()))
+
         return SupportResistance(supports, resistances)
@@ -28,7 +28,7 @@ class LinLinearPeaksTroughsHighLowAlgo(Algo):
         self.cache_diff_average: Dict[str, Dict[Timeframe, float]] = {}
         self.lin_algo = LinAlgo()
         self.linear_algo = LinearAlgo()
-        self.pt = PeaksTroughsHighLowAlgo()
+        self.pt = PeaksTroughsHighLowAlgo(algo_config)
         self.nr_clusters_from_linspace: int = 2
 
     def get_candles_start_date(self, symbol: str, timeframe: Timeframe, start_date: int, outer_grid_price: float):
@@ -26,7 +26,7 @@ class LinPeaksTroughsHighLowAlgo(Algo):
         self.cache_last_close_date: Dict[str, Dict[Timeframe, int]] = {}
         self.cache_diff_average: Dict[str, Dict[Timeframe, float]] = {}
         self.lin_algo = LinAlgo()
-        self.pt = PeaksTroughsHighLowAlgo()
+        self.pt = PeaksTroughsHighLowAlgo(algo_config)
 
     def get_candles_start_date(self, symbol: str, timeframe: Timeframe, start_date: int, outer_grid_price: float):
         return self.pt.get_candles_start_date(symbol, timeframe, start_date, outer_grid_price)
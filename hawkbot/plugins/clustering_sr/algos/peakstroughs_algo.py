@@ -8,11 +8,14 @@ from hawkbot.core.model import PositionSide, SymbolInformation
 from hawkbot.logging import user_log
 from hawkbot.plugins.clustering_sr.algos.algo import Algo
 from hawkbot.plugins.clustering_sr.data_classes import SupportResistance
+from hawkbot.plugins.clustering_sr.pivots import trough_mask, peak_mask, candidate_indices, LevelIndex
 
 logger = logging.getLogger(__name__)
 
 
 class PeaksTroughsAlgo(Algo):
+    price_independent = True
+
     def __init__(self, algo_config: Dict = None):
         super().__init__(algo_config=algo_config)
         self.outer_price_warning_logged: bool = False
@@ -32,48 +35,28 @@ class PeaksTroughsAlgo(Algo):
                              f'price, but this has no effect when combining this with the '
                              f'{self.__class__.__name__} algo. ', __name__)
 
-        levels = []
         support: List[float] = []
         resistance: List[float] = []
 
         last_price = candles[len(candles) - 1].close
-        diffs = [c.hc_average - c.lc_average for c in candles]
-        average = np.mean(diffs)
-
-        for i in range(2, len(candles) - 2):
-            if self.is_support(candles, i):
-                level = candles[i].lc_average
-                if self.is_far_from_level(level, levels, average):
-                    levels.append((i, level))
-                    if last_price > level:
-                        support.append(level)
-                    else:
-                        resistance.append(level)
-
-            elif self.is_resistance(candles, i):
-                level = candles[i].hc_average
-                if self.is_far_from_level(level, levels, average):
-                    levels.append((i, level))
-                    if last_price > level:
-                        support.append(level)
-                    else:
-                        resistance.append(level)
+        lc_averages = np.array([c.lc_average for c in candles], dtype=float)
+        hc_averages = np.array([c.hc_average for c in candles], dtype=float)
+        average = np.mean(hc_averages - lc_averages)
+
+        supports_mask = trough_mask(lc_averages)
+        resistances_mask = peak_mask(hc_averages)
+        levels = LevelIndex()
+
+        for i in candidate_indices(supports_mask, resistances_mask):
+            if supports_mask[i]:
+                level = float(lc_averages[i])
+            else:
+                level = float(hc_averages[i])
+            if levels.is_far_from_level(level, average):
+                levels.add(level)
+                if last_price > level:
+                    support.append(level)
+                else:
+                    resistance.append(level)
 
         return SupportResistance(supports=support, resistances=resistance)
-
-    def is_support(self, candles: List[Candle], i) -> bool:
-        cond1 = candles[i].lc_average < candles[i - 1].lc_average
-        cond2 = candles[i].lc_average < candles[i + 1].lc_average
-        cond3 = candles[i + 1].lc_average < candles[i + 2].lc_average
-        cond4 = candles[i - 1].lc_average < candles[i - 2].lc_average
-        return cond1 and cond2 and cond3 and cond4
-
-    def is_resistance(self, candles: List[Candle], i) -> bool:
-        cond1 = candles[i].hc_average > candles[i - 1].hc_average
-        cond2 = candles[i].hc_average > candles[i + 1].hc_average
-        cond3 = candles[i + 1].hc_average > candles[i + 2].hc_average
-        cond4 = candles[i - 1].hc_average > candles[i - 2].hc_average
-        return cond1 and cond2 and cond3 and cond4
-
-    def is_far_from_level(self, value, levels, average) -> bool:
-        return np.sum([abs(value - level) < average for _, level in levels]) == 0
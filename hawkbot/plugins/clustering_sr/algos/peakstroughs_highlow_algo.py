@@ -1,5 +1,5 @@
 import logging
-from typing import List, Dict, Set
+from typing import List, Dict
 
 import numpy as np
 
@@ -7,28 +7,65 @@ from hawkbot.core.data_classes import Candle
 from hawkbot.core.model import PositionSide, SymbolInformation, Timeframe
 from hawkbot.logging import user_log
 from hawkbot.plugins.clustering_sr.algos.algo import Algo
-from hawkbot.plugins.clustering_sr.data_classes import SupportResistance
+from hawkbot.plugins.clustering_sr.data_classes import SupportResistance, Pivot, PivotType, PivotState
+from hawkbot.plugins.clustering_sr.memory_pivot_repository import MemoryPivotRepository
+from hawkbot.plugins.clustering_sr.pivot_repository import get_pivot_repository
+from hawkbot.plugins.clustering_sr.pivots import trough_mask, peak_mask, candidate_indices, LevelIndex
 from hawkbot.utils import readable
 
 logger = logging.getLogger(__name__)
 
 
 class PeaksTroughsHighLowAlgo(Algo):
+    """
+    Calculates levels from the troughs of the candle lows and the peaks of the candle highs. The pivots found are kept
+    in a PivotRepository, so each call only needs to scan the candles that closed since the previous call. The average
+    candle range used to decide whether a pivot is far enough from the known levels is calculated once from the first
+    candles scanned for a symbol & timeframe, and is stored together with the pivots, so it is not recalculated from
+    the much shorter incremental candle range after a restart.
+
+    By default the pivots are kept in a private in-memory store, like the previous in-process caches. When a
+    `database_path` is configured the pivots are written through to that SQLite database, so they survive a restart
+    and are picked up by every process starting with that database. All algos of a process using the same database
+    share one cache in front of it. The ClusteringSupportResistancePlugin and the WigglePlugin pass their
+    `pivot_database_path` as `database_path`. A backtest should not be pointed at the database of a live bot, as a
+    shared store is only ever updated with candles that are newer than the stored pivots: older candles are evaluated
+    without reading or updating the stored pivots, and the stored pivots are only removed through an explicit call to
+    `reset_pivots`.
+
+    Attributes:
+        database_path (str = None): the path of the SQLite database the pivots are stored in, or None to keep the
+            pivots in memory
+    """
+    price_independent = True
+
     def __init__(self, algo_config: Dict = None):
         super().__init__(algo_config=algo_config)
-        self.troughs_cache: Dict[str, Dict[Timeframe, Set[Candle]]] = {}
-        self.peaks_cache: Dict[str, Dict[Timeframe, Set[Candle]]] = {}
-        self.cache_last_close_date: Dict[str, Dict[Timeframe, int]] = {}
-        self.cache_diff_average: Dict[str, Dict[Timeframe, float]] = {}
+        algo_config = algo_config or {}
+        self.database_path: str = algo_config.get('database_path', None)
+        if self.database_path is None:
+            self.pivot_repository = MemoryPivotRepository()
+        else:
+            self.pivot_repository = get_pivot_repository(database_path=self.database_path)
         self.outer_price_warning_logged: bool = False
         self.sort_prices: bool = True
 
     def get_candles_start_date(self, symbol: str, timeframe: Timeframe, start_date: int, outer_grid_price: float):
-        if symbol in self.cache_last_close_date and timeframe in self.cache_last_close_date[symbol]:
-            start_date = self.cache_last_close_date[symbol][timeframe] - 10 * timeframe.milliseconds
+        state = self.pivot_repository.get_state(symbol=symbol, timeframe=timeframe)
+        if state.last_close_date is not None:
+            resume_date = state.last_close_date - 10 * timeframe.milliseconds
+            start_date = resume_date if start_date is None else max(start_date, resume_date)
         logger.debug(f'{symbol}: Returning start_date {readable(start_date)}')
         return start_date
 
+    def reset_pivots(self, symbol: str, timeframe: Timeframe):
+        """
+        Removes the stored pivots & state of the symbol and timeframe, after which the next call rebuilds them from the
+        candles passed
+        """
+        logger.info(f'{symbol}: Resetting the stored pivots for timeframe {timeframe.name}')
+        self.pivot_repository.reset(symbol=symbol, timeframe=timeframe)
+
     def calculate_levels(self,
                          symbol: str,
                          position_side: PositionSide,
@@ -44,109 +81,95 @@ class PeaksTroughsHighLowAlgo(Algo):
                              f'price, but this has no effect when combining this with the '
                              f'{self.__class__.__name__} algo. ', __name__)
 
+        if len(candles) == 0:
+            return SupportResistance()
+
         timeframe = candles[0].timeframe
-        self.prepare_cache(symbol=symbol, timeframe=timeframe)
+        last_close_date = max([candle.close_date for candle in candles])
+
+        state = self.pivot_repository.get_state(symbol=symbol, timeframe=timeframe)
+        read_only = state.last_close_date is not None and state.last_close_date > last_close_date
+        if read_only:
+            # the stored pivots are newer than the candles passed, so they can't be used for these candles, and the
+            # candles must not be used to update the stored pivots either
+            logger.info(f'{symbol} {position_side.name}: Stored pivots are newer than the last candle close date '
+                        f'{readable(last_close_date)}, calculating the levels without the stored pivots')
+            state = PivotState()
+            troughs_stored = []
+            peaks_stored = []
+        else:
+            troughs_stored = self.pivot_repository.get_pivots(symbol=symbol, timeframe=timeframe,
+                                                              pivot_type=PivotType.TROUGH)
+            peaks_stored = self.pivot_repository.get_pivots(symbol=symbol, timeframe=timeframe,
+                                                            pivot_type=PivotType.PEAK)
+        peak_start_dates = {pivot.start_date for pivot in peaks_stored}
 
-        levels = []
-        levels.extend(candle.low for candle in self.troughs_cache[symbol][timeframe])
-        levels.extend(candle.high for candle in self.peaks_cache[symbol][timeframe])
+        levels = LevelIndex(pivot.price for pivot in troughs_stored)
+        for pivot in peaks_stored:
+            levels.add(pivot.price)
 
-        if timeframe not in self.cache_diff_average[symbol]:
-            diffs = [c.high - c.low for c in candles]
-            self.cache_diff_average[symbol][timeframe] = np.mean(diffs)
+        lows = np.array([c.low for c in candles], dtype=float)
+        highs = np.array([c.high for c in candles], dtype=float)
 
-        average = self.cache_diff_average[symbol][timeframe]
+        if state.diff_average is None:
+            state.diff_average = float(np.mean(highs - lows))
 
-        for i in range(2, len(candles) - 2):
-            candle = candles[i]
-            if self.is_trough(candles, i) and candle not in self.peaks_cache[symbol][timeframe]:
-                if self.is_far_from_level(candle.low, levels, average):
-                    levels.append(candle.low)
-                    self.troughs_cache[symbol][timeframe].add(candle)
-            elif self.is_peak(candles, i) and candle.high not in self.peaks_cache[symbol][timeframe]:
-                if self.is_far_from_level(candle.high, levels, average):
-                    levels.append(candle.high)
-                    self.peaks_cache[symbol][timeframe].add(candle)
+        average = state.diff_average
 
+        new_troughs = []
+        new_peaks = []
+        troughs = trough_mask(lows)
+        peaks = peak_mask(highs)
+        for i in candidate_indices(troughs, peaks):
+            candle = candles[i]
+            if troughs[i] and candle.start_date not in peak_start_dates:
+                if levels.is_far_from_level(candle.low, average):
+                    levels.add(candle.low)
+                    new_troughs.append(Pivot(start_date=candle.start_date,
+                                             close_date=candle.close_date,
+                                             price=candle.low))
+            elif peaks[i]:
+                if levels.is_far_from_level(candle.high, average):
+                    levels.add(candle.high)
+                    new_peaks.append(Pivot(start_date=candle.start_date,
+                                           close_date=candle.close_date,
+                                           price=candle.high))
+
+        if not read_only:
+            self.pivot_repository.add_pivots(symbol=symbol, timeframe=timeframe, pivot_type=PivotType.TROUGH,
+                                             pivots=new_troughs)
+            self.pivot_repository.add_pivots(symbol=symbol, timeframe=timeframe, pivot_type=PivotType.PEAK,
+                                             pivots=new_peaks)
+        troughs_stored.extend(new_troughs)
+        peaks_stored.extend(new_peaks)
+
+        # like before the pivots were stored, pivots that expire in this call are still part of its result
         selected_supports = []
         selected_resistances = []
-        # logger.info(f'{symbol} {position_side.name}: Currently cached peaks: {self.peaks_cache[symbol][timeframe]}')
-        # logger.info(f'{symbol} {position_side.name}: Currently cached troughs: {self.troughs_cache[symbol][timeframe]}')
         if position_side == PositionSide.LONG:
-            selected_supports.extend(
-                [candle.low for candle in self.troughs_cache[symbol][timeframe] if candle.low < current_price])
+            selected_supports.extend([pivot.price for pivot in troughs_stored
+                                      if current_price is None or pivot.price < current_price])
             logger.info(f'{symbol} {position_side.name}: All supports are {selected_supports}')
             if self.sort_prices:
                 selected_supports = sorted(selected_supports, reverse=True)
         else:
-            selected_resistances.extend(
-                [candle.high for candle in self.peaks_cache[symbol][timeframe] if candle.high > current_price])
+            selected_resistances.extend([pivot.price for pivot in peaks_stored
+                                         if current_price is None or pivot.price > current_price])
             logger.info(f'{symbol} {position_side.name}: All resistances are {selected_resistances}')
             if self.sort_prices:
                 selected_resistances = sorted(selected_resistances)
 
-        logger.debug(f'{symbol} {position_side.name}: Purging expired peaks candles')
-        self.peaks_cache[symbol][timeframe] = self.purged_candles(symbol=symbol,
-                                                                  position_side=position_side,
-                                                                  candles=self.peaks_cache[symbol][timeframe],
-                                                                  purge_start_before=original_start_date)
+        if read_only:
+            return SupportResistance(supports=selected_supports, resistances=selected_resistances)
 
-        logger.debug(f'{symbol} {position_side.name}: Purging expired troughs candles')
-        self.troughs_cache[symbol][timeframe] = self.purged_candles(symbol=symbol,
-                                                                    position_side=position_side,
-                                                                    candles=self.troughs_cache[symbol][timeframe],
-                                                                    purge_start_before=original_start_date)
+        nr_purged = self.pivot_repository.purge_pivots(symbol=symbol,
+                                                       timeframe=timeframe,
+                                                       start_before=original_start_date)
+        if nr_purged > 0:
+            logger.info(f'{symbol} {position_side.name}: Purged {nr_purged} pivots because their start_date is older '
+                        f'than the period\'s start date {readable(original_start_date)}')
 
-        self.cache_last_close_date[symbol][timeframe] = max([candle.close_date for candle in candles])
+        state.last_close_date = last_close_date
+        self.pivot_repository.set_state(symbol=symbol, timeframe=timeframe, state=state)
 
         return SupportResistance(supports=selected_supports, resistances=selected_resistances)
-
-    def purged_candles(self,
-                       symbol: str,
-                       position_side: PositionSide,
-                       candles: Set[Candle],
-                       purge_start_before: int) -> Set[Candle]:
-        updated_peaks = set()
-        for candle in candles:
-            if candle.start_date > purge_start_before:
-                updated_peaks.add(candle)
-            else:
-                logger.info(f'{symbol} {position_side.name}: Purging candle {candle} because start_date '
-                            f'{readable(candle.start_date)} is older than the period\'s start date '
-                            f'{readable(purge_start_before)}')
-        return updated_peaks
-
-    def prepare_cache(self, symbol: str, timeframe: Timeframe):
-        if symbol not in self.peaks_cache:
-            self.peaks_cache[symbol] = {}
-        if timeframe not in self.peaks_cache[symbol]:
-            self.peaks_cache[symbol][timeframe] = set()
-
-        if symbol not in self.troughs_cache:
-            self.troughs_cache[symbol] = {}
-        if timeframe not in self.troughs_cache[symbol]:
-            self.troughs_cache[symbol][timeframe] = set()
-
-        if symbol not in self.cache_last_close_date:
-            self.cache_last_close_date[symbol] = {}
-
-        if symbol not in self.cache_diff_average:
-            self.cache_diff_average[symbol] = {}
-
-    def is_trough(self, candles: List[Candle], i) -> bool:
-        cond1 = candles[i].low < candles[i - 1].low
-        cond2 = candles[i].low < candles[i + 1].low
-        cond3 = candles[i + 1].low < candles[i + 2].low
-        cond4 = candles[i - 1].low < candles[i - 2].low
-        return cond1 and cond2 and cond3 and cond4
-
-    def is_peak(self, candles: List[Candle], i) -> bool:
-        cond1 = candles[i].high > candles[i - 1].high
-        cond2 = candles[i].high > candles[i + 1].high
-        cond3 = candles[i + 1].high > candles[i + 2].high
-        cond4 = candles[i - 1].high > candles[i - 2].high
-        return cond1 and cond2 and cond3 and cond4
-
-    def is_far_from_level(self, value: float, levels: List[float], average) -> bool:
-        distances = [abs(value - level) for level in levels]
-        return not any([distance < average for distance in distances])
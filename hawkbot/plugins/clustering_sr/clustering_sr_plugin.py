@@ -1,16 +1,20 @@
 import logging
-from typing import Dict
+import threading
+from bisect import bisect_left, bisect_right
+from collections import OrderedDict
+from typing import Dict, List, Set, Tuple
 
 from hawkbot.core.candlestore.candlestore import Candlestore
 from hawkbot.core.candlestore.candlestore_listener import CandlestoreListener
-from hawkbot.core.data_classes import ExchangeState
+from hawkbot.core.data_classes import ExchangeState, Candle
 from hawkbot.core.model import PositionSide, Timeframe
 from hawkbot.core.time_provider import TimeProvider
 from hawkbot.exceptions import NoLevelFoundException
 from hawkbot.exchange.exchange import Exchange
 from hawkbot.plugins.clustering_sr.algo_type import AlgoType
 from hawkbot.plugins.clustering_sr.algos.algo import Algo
-from hawkbot.plugins.clustering_sr.data_classes import SupportResistance
+from hawkbot.plugins.clustering_sr.data_classes import SupportResistance, SupportResistanceCache, \
+    SupportResistanceCacheStatistics, SupportResistanceRequest
 from hawkbot.core.plugins.plugin import Plugin
 from hawkbot.utils import round_, period_as_ms, readable
 
@@ -29,6 +33,104 @@ class ClusteringSupportResistancePlugin(Plugin, CandlestoreListener):
         self.exchange_state: ExchangeState = None  # Injected by framework
         self.exchange: Exchange = None  # Injected by plugin loader
         self.algos: Dict[str, Dict[PositionSide, Dict[AlgoType, Algo]]] = {}
+        self.sr_cache_size: int = 2048
+        if 'sr_cache_size' in plugin_config:
+            self.sr_cache_size = plugin_config['sr_cache_size']
+        self.sr_cache: OrderedDict[Tuple, SupportResistanceCache] = OrderedDict()
+        self.sr_cache_keys: Dict[Tuple[str, Timeframe], Set[Tuple]] = {}
+        self.sr_cache_hits: int = 0
+        self.sr_cache_misses: int = 0
+        self.sr_cache_lock: threading.RLock = threading.RLock()
+        # the database the PeaksTroughsHighLowAlgo pivots are stored in, or None to keep them in memory
+        self.pivot_database_path: str = None
+        if 'pivot_database_path' in plugin_config:
+            self.pivot_database_path = plugin_config['pivot_database_path']
+
+    def start(self):
+        super().start()
+        self.candlestore.add_listener(listener=self)
+
+    def on_new_candle(self, candle: Candle):
+        self.invalidate_sr_cache(symbol=candle.symbol, timeframe=candle.timeframe)
+
+    def invalidate_sr_cache(self, symbol: str, timeframe: Timeframe):
+        with self.sr_cache_lock:
+            for cache_key in self.sr_cache_keys.pop((symbol, timeframe), set()):
+                self.sr_cache.pop(cache_key, None)
+
+    def sr_cache_statistics(self) -> SupportResistanceCacheStatistics:
+        return SupportResistanceCacheStatistics(hits=self.sr_cache_hits,
+                                                misses=self.sr_cache_misses,
+                                                size=len(self.sr_cache),
+                                                max_size=self.sr_cache_size)
+
+    def get_from_sr_cache(self, cache_key: Tuple) -> SupportResistanceCache:
+        with self.sr_cache_lock:
+            cache_entry = self.sr_cache.get(cache_key)
+            if cache_entry is None:
+                self.sr_cache_misses += 1
+                return None
+            self.sr_cache_hits += 1
+            self.sr_cache.move_to_end(cache_key)
+        return cache_entry
+
+    def _store_in_sr_cache(self,
+                           cache_key: Tuple,
+                           symbol: str,
+                           position_side: PositionSide,
+                           timeframe: Timeframe,
+                           last_candle_close_date: int,
+                           support_resistance: SupportResistance,
+                           close_prices: List[float]) -> SupportResistanceCache:
+        cache_entry = SupportResistanceCache(symbol=symbol,
+                                             position_side=position_side,
+                                             last_candle_close_date=last_candle_close_date,
+                                             support_resistance=SupportResistance(supports=list(support_resistance.supports),
+                                                                                  resistances=list(support_resistance.resistances)),
+                                             close_prices=sorted(close_prices))
+        if self.sr_cache_size <= 0:
+            return cache_entry
+        with self.sr_cache_lock:
+            self.sr_cache[cache_key] = cache_entry
+            self.sr_cache.move_to_end(cache_key)
+            self.sr_cache_keys.setdefault((symbol, timeframe), set()).add(cache_key)
+            while len(self.sr_cache) > self.sr_cache_size:
+                evicted_key, evicted_entry = self.sr_cache.popitem(last=False)
+                self.sr_cache_keys.get((evicted_entry.symbol, evicted_key[2]), set()).discard(evicted_key)
+        return cache_entry
+
+    def levels_within_price_range(self,
+                                  cache_entry: SupportResistanceCache,
+                                  position_side: PositionSide,
+                                  outer_grid_price: float,
+                                  current_price: float) -> SupportResistance:
+        """
+        Returns the cached levels that lie between the current price and the outer grid price. Like when the candles
+        are selected by their close price, no levels are returned when none of the candles closed in that range.
+        """
+        supports = cache_entry.support_resistance.supports
+        resistances = cache_entry.support_resistance.resistances
+        if outer_grid_price is None:
+            return SupportResistance(supports=list(supports), resistances=list(resistances))
+
+        if position_side == PositionSide.LONG:
+            lower_price, upper_price = outer_grid_price, current_price
+        else:
+            lower_price, upper_price = current_price, outer_grid_price
+        close_prices = cache_entry.close_prices
+        if bisect_right(close_prices, upper_price) - bisect_left(close_prices, lower_price) == 0:
+            logger.warning(f'{cache_entry.symbol} {position_side.name}: the required outer_price of {outer_grid_price} '
+                           f'is not reached in the specified period. This leads to a grid that does not meet the '
+                           f'specified minimum distance. Not returning results to force denial of grid.')
+            return SupportResistance()
+
+        return SupportResistance(supports=[support for support in supports if lower_price <= support <= upper_price],
+                                 resistances=[resistance for resistance in resistances if lower_price <= resistance <= upper_price])
+
+    def create_algo(self, algo_type: AlgoType, algo_config: Dict = None) -> Algo:
+        if self.pivot_database_path is not None:
+            algo_config = {'database_path': self.pivot_database_path, **(algo_config or {})}
+        return algo_type.value[1](algo_config)
 
     def get_support_resistance_levels(self,
                                       symbol: str,
@@ -38,16 +140,17 @@ class ClusteringSupportResistancePlugin(Plugin, CandlestoreListener):
                                       dca_config) -> SupportResistance:
         self.algos.setdefault(symbol, {}).setdefault(position_side, {})
         if dca_config.algo not in self.algos[symbol][position_side]:
-            self.algos[symbol][position_side][dca_config.algo] = dca_config.algo.value[1](dca_config.algo_config)
+            self.algos[symbol][position_side][dca_config.algo] = self.create_algo(algo_type=dca_config.algo,
+                                                                                  algo_config=dca_config.algo_config)
         if dca_config.outer_price_algo is not None:
             if dca_config.outer_price_algo not in self.algos[symbol][position_side]:
-                self.algos[symbol][position_side][dca_config.outer_price_algo] = dca_config.outer_price_algo.value[1]()
+                self.algos[symbol][position_side][dca_config.outer_price_algo] = self.create_algo(algo_type=dca_config.outer_price_algo)
             outer_price_algo = self.algos[symbol][position_side][dca_config.outer_price_algo]
         else:
             outer_price_algo = None
         if dca_config.first_level_algo is not None:
             if dca_config.first_level_algo not in self.algos[symbol][position_side]:
-                self.algos[symbol][position_side][dca_config.first_level_algo] = dca_config.first_level_algo.value[1]()
+                self.algos[symbol][position_side][dca_config.first_level_algo] = self.create_algo(algo_type=dca_config.first_level_algo)
             first_level_algo = self.algos[symbol][position_side][dca_config.first_level_algo]
         else:
             first_level_algo = None
@@ -160,6 +263,9 @@ class ClusteringSupportResistancePlugin(Plugin, CandlestoreListener):
                 first_level_resistances.extend(higher_inner_resistances)
                 support_resistance.resistances = first_level_resistances
 
+        return self.levels_around_price(support_resistance=support_resistance, even_price=even_price, price_step=price_step)
+
+    def levels_around_price(self, support_resistance: SupportResistance, even_price: float, price_step: float) -> SupportResistance:
         rounded_support_prices = [round_(price, price_step) for price in support_resistance.supports if price < even_price]
         rounded_resistance_prices = [round_(price, price_step) for price in support_resistance.resistances if price > even_price]
 
@@ -304,17 +410,106 @@ class ClusteringSupportResistancePlugin(Plugin, CandlestoreListener):
                period_timeframe: Timeframe,
                current_price: float,
                algo: Algo) -> SupportResistance:
+        original_start_date = self.register_period(symbol=symbol,
+                                                   period=period,
+                                                   period_start_date=period_start_date,
+                                                   period_timeframe=period_timeframe)
+
+        if not algo.price_independent:
+            # the levels of these algos are derived from the current and outer price, which change every tick, so
+            # they are not cached
+            sr_request = self.create_sr_request(symbol=symbol,
+                                                position_side=position_side,
+                                                original_start_date=original_start_date,
+                                                nr_clusters=nr_clusters,
+                                                outer_grid_price=outer_grid_price,
+                                                period_timeframe=period_timeframe,
+                                                current_price=current_price,
+                                                algo=algo)
+            if sr_request is None:
+                return SupportResistance()
+            return calculate_support_resistance(algo=algo, sr_request=sr_request)
+
+        cache_key = self.sr_cache_key(symbol=symbol,
+                                      position_side=position_side,
+                                      period=period,
+                                      period_start_date=period_start_date,
+                                      nr_clusters=nr_clusters,
+                                      period_timeframe=period_timeframe,
+                                      algo=algo)
+        cache_entry = self.get_from_sr_cache(cache_key)
+        if cache_entry is not None:
+            logger.debug(f'{symbol} {position_side.name}: Returning cached supports/resistances for '
+                         f'{period_timeframe.name} using algo {algo.__class__.__name__}: {cache_entry.support_resistance}')
+        else:
+            # the levels are calculated over all candles of the period, and limited to the current & outer price after
+            # the lookup
+            sr_request = self.create_sr_request(symbol=symbol,
+                                                position_side=position_side,
+                                                original_start_date=original_start_date,
+                                                nr_clusters=nr_clusters,
+                                                outer_grid_price=None,
+                                                period_timeframe=period_timeframe,
+                                                current_price=None,
+                                                algo=algo)
+
+            start = self.time_provider.get_utc_now_timestamp()
+            support_resistance = calculate_support_resistance(algo=algo, sr_request=sr_request)
+            end = self.time_provider.get_utc_now_timestamp()
+            logger.debug(f'{symbol} {position_side.name}: {algo.__class__.__name__} calculation took {end - start}ms')
+
+            cache_entry = self.store_in_sr_cache(cache_key=cache_key,
+                                                 support_resistance=support_resistance,
+                                                 candles=sr_request.candles)
+
+        return self.levels_within_price_range(cache_entry=cache_entry,
+                                              position_side=position_side,
+                                              outer_grid_price=outer_grid_price,
+                                              current_price=current_price)
+
+    def sr_cache_key(self,
+                     symbol: str,
+                     position_side: PositionSide,
+                     period: str,
+                     period_start_date: int,
+                     nr_clusters: int,
+                     period_timeframe: Timeframe,
+                     algo: Algo) -> Tuple:
+        now = self.time_provider.get_utc_now_timestamp()
+        last_candle_close_date = now - now % period_timeframe.milliseconds
+        return symbol, position_side, period_timeframe, period, period_start_date, nr_clusters, algo, last_candle_close_date
+
+    def store_in_sr_cache(self, cache_key: Tuple, support_resistance: SupportResistance, candles: List[Candle]) -> SupportResistanceCache:
+        symbol, position_side, period_timeframe = cache_key[0:3]
+        return self._store_in_sr_cache(cache_key=cache_key,
+                                       symbol=symbol,
+                                       position_side=position_side,
+                                       timeframe=period_timeframe,
+                                       last_candle_close_date=cache_key[-1],
+                                       support_resistance=support_resistance,
+                                       close_prices=[candle.close for candle in candles])
+
+    def register_period(self, symbol: str, period: str, period_start_date: int, period_timeframe: Timeframe) -> int:
         if period_start_date is not None:
-            original_start_date = period_start_date
             self.candlestore.add_symbol_start_date(symbol=symbol,
                                                    timeframe=period_timeframe,
-                                                   start_date=original_start_date)
+                                                   start_date=period_start_date)
+            return period_start_date
         elif period is not None:
             self.candlestore.add_symbol_timeframe_period(symbol=symbol, timeframe=period_timeframe, period=period)
-            original_start_date = self.time_provider.get_utc_now_timestamp() - period_as_ms(period)
+            return self.time_provider.get_utc_now_timestamp() - period_as_ms(period)
         else:
-            original_start_date = None
+            return None
 
+    def create_sr_request(self,
+                          symbol: str,
+                          position_side: PositionSide,
+                          original_start_date: int,
+                          nr_clusters: int,
+                          outer_grid_price: float,
+                          period_timeframe: Timeframe,
+                          current_price: float,
+                          algo: Algo) -> SupportResistanceRequest:
         if position_side == PositionSide.LONG:
             upper_price = current_price if outer_grid_price is not None else None
             lower_price = outer_grid_price
@@ -356,7 +551,7 @@ class ClusteringSupportResistancePlugin(Plugin, CandlestoreListener):
                                f'is not reached in the specified period of {period_timeframe}. This leads to a '
                                f'grid that does not meet the specified minimum distance. Not returning results '
                                f'to force denial of grid. Number of candles used: {len(candles)}')
-                return SupportResistance()
+                return None
 
             logger.info(f"{symbol} {position_side.name}: Calculating the support and resistances based on {len(candles)} "
                         f"candles and {nr_clusters} clusters on timeframe {period_timeframe}."
@@ -367,35 +562,48 @@ class ClusteringSupportResistancePlugin(Plugin, CandlestoreListener):
                         f"The lower price = {lower_price}, the upper price = {upper_price}"
                         )
 
-        start = self.time_provider.get_utc_now_timestamp()
-        support_resistance = algo.calculate_levels(symbol=symbol,
-                                                   position_side=position_side,
-                                                   candles=candles,
-                                                   nr_clusters=nr_clusters,
-                                                   current_price=current_price,
-                                                   outer_price=outer_grid_price,
-                                                   original_start_date=original_start_date,
-                                                   symbol_information=self.exchange_state.get_symbol_information(symbol))
-        end = self.time_provider.get_utc_now_timestamp()
-        logger.debug(f'{symbol} {position_side.name}: {algo.__class__.__name__} calculation took {end - start}ms')
-
-        price_step = self.exchange_state.get_symbol_information(symbol).price_step
-        support_resistance.supports = [round_(support, price_step) for support in support_resistance.supports]
-        support_resistance.resistances = [round_(resistance, price_step) for resistance in
-                                          support_resistance.resistances]
-
-        if len(candles) > 0:
-            logger.debug(f'{symbol} {period_timeframe.name}: '
-                         f'Calculated supports for {period_timeframe.name} = {support_resistance.supports}, '
-                         f'calculated resistances for {period_timeframe.name} = {support_resistance.resistances}, '
-                         f'# used candles: {len(candles)}, '
-                         f'lowest candle close price = {min([candle.close for candle in candles])}, '
-                         f'highest candle close price {max([candle.close for candle in candles])}')
-
-        support_resistance.supports.sort(reverse=True)
-        support_resistance.resistances.sort()
-
-        logger.info(f'{symbol} {position_side.name}: Supports/resistances calculated with current price '
-                    f'{current_price}, outer price {outer_grid_price} are {support_resistance}')
-
-        return support_resistance
+        return SupportResistanceRequest(symbol=symbol,
+                                        position_side=position_side,
+                                        period_timeframe=period_timeframe,
+                                        candles=candles,
+                                        nr_clusters=nr_clusters,
+                                        current_price=current_price,
+                                        outer_grid_price=outer_grid_price,
+                                        original_start_date=original_start_date,
+                                        symbol_information=self.exchange_state.get_symbol_information(symbol))
+
+
+def calculate_support_resistance(algo: Algo, sr_request: SupportResistanceRequest) -> SupportResistance:
+    symbol = sr_request.symbol
+    position_side = sr_request.position_side
+    period_timeframe = sr_request.period_timeframe
+    candles = sr_request.candles
+    support_resistance = algo.calculate_levels(symbol=symbol,
+                                               position_side=position_side,
+                                               candles=candles,
+                                               nr_clusters=sr_request.nr_clusters,
+                                               current_price=sr_request.current_price,
+                                               outer_price=sr_request.outer_grid_price,
+                                               original_start_date=sr_request.original_start_date,
+                                               symbol_information=sr_request.symbol_information)
+
+    price_step = sr_request.symbol_information.price_step
+    support_resistance.supports = [round_(support, price_step) for support in support_resistance.supports]
+    support_resistance.resistances = [round_(resistance, price_step) for resistance in
+                                      support_resistance.resistances]
+
+    if len(candles) > 0:
+        logger.debug(f'{symbol} {period_timeframe.name}: '
+                     f'Calculated supports for {period_timeframe.name} = {support_resistance.supports}, '
+                     f'calculated resistances for {period_timeframe.name} = {support_resistance.resistances}, '
+                     f'# used candles: {len(candles)}, '
+                     f'lowest candle close price = {min([candle.close for candle in candles])}, '
+                     f'highest candle close price {max([candle.close for candle in candles])}')
+
+    support_resistance.supports.sort(reverse=True)
+    support_resistance.resistances.sort()
+
+    logger.info(f'{symbol} {position_side.name}: Supports/resistances calculated with current price '
+                f'{sr_request.current_price}, outer price {sr_request.outer_grid_price} are {support_resistance}')
+
+    return support_resistance
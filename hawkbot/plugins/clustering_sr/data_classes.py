@@ -1,7 +1,10 @@
 from dataclasses import dataclass, field
 from typing import List
 
-from hawkbot.core.model import PositionSide
+from fastenum import fastenum
+
+from hawkbot.core.data_classes import Candle
+from hawkbot.core.model import PositionSide, SymbolInformation, Timeframe
 
 
 @dataclass
@@ -16,8 +19,73 @@ class SupportResistanceCache:
     position_side: PositionSide
     last_candle_close_date: int = 0
     support_resistance: SupportResistance = field(default_factory=SupportResistance)
+    # the sorted close prices of the candles the levels were calculated from
+    close_prices: List[float] = field(default_factory=list)
 
     @property
     def any_level_found(self):
         return len(list(self.support_resistance.supports)) > 0 or \
                len(list(self.support_resistance.resistances)) > 0
+
+
+@dataclass
+class KMeansCache:
+    first_start_date: int
+    last_close_date: int
+    nr_candles: int
+    close_sum: float
+    nr_clusters: int
+    knee: int
+    candles_since_knee: int = 0
+    support_resistance: SupportResistance = field(default_factory=SupportResistance)
+
+    def matches(self, first_start_date: int, last_close_date: int, nr_candles: int, close_sum: float, nr_clusters: int) -> bool:
+        return self.first_start_date == first_start_date and \
+               self.last_close_date == last_close_date and \
+               self.nr_candles == nr_candles and \
+               self.close_sum == close_sum and \
+               self.nr_clusters == nr_clusters
+
+
+@dataclass
+class SupportResistanceCacheStatistics:
+    hits: int = 0
+    misses: int = 0
+    size: int = 0
+    max_size: int = 0
+
+    @property
+    def hit_ratio(self) -> float:
+        total = self.hits + self.misses
+        return self.hits / total if total > 0 else 0.0
+
+
+@dataclass
+class SupportResistanceRequest:
+    symbol: str
+    position_side: PositionSide
+    period_timeframe: Timeframe
+    candles: List[Candle]
+    nr_clusters: int
+    current_price: float
+    outer_grid_price: float
+    original_start_date: int
+    symbol_information: SymbolInformation
+
+
+class PivotType(fastenum.Enum):
+    PEAK = "PEAK"
+    TROUGH = "TROUGH"
+
+
+@dataclass(frozen=True)
+class Pivot:
+    start_date: int
+    close_date: int
+    price: float
+
+
+@dataclass
+class PivotState:
+    last_close_date: int = None
+    diff_average: float = None
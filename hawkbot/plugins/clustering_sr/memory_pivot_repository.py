@@ -0,0 +1,64 @@
+import logging
+import threading
+from typing import Dict, List, Tuple
+
+from hawkbot.core.model import Timeframe
+from hawkbot.plugins.clustering_sr.data_classes import Pivot, PivotType, PivotState
+
+logger = logging.getLogger(__name__)
+
+
+class MemoryPivotRepository:
+    """
+    In-memory store of the peaks & troughs found by the PeaksTroughsHighLowAlgo, private to the instance. The pivots
+    are kept per symbol, timeframe & type in a dict on start_date, so adding an already known pivot is a no-op.
+    """
+
+    def __init__(self):
+        self.pivots: Dict[Tuple[str, Timeframe, PivotType], Dict[int, Pivot]] = {}
+        self.states: Dict[Tuple[str, Timeframe], PivotState] = {}
+        self.lock: threading.RLock = threading.RLock()
+
+    def get_pivots(self, symbol: str, timeframe: Timeframe, pivot_type: PivotType) -> List[Pivot]:
+        with self.lock:
+            pivots = self.pivots.get((symbol, timeframe, pivot_type), {})
+            return sorted(pivots.values(), key=lambda pivot: pivot.start_date)
+
+    def add_pivots(self, symbol: str, timeframe: Timeframe, pivot_type: PivotType, pivots: List[Pivot]):
+        with self.lock:
+            stored_pivots = self.pivots.setdefault((symbol, timeframe, pivot_type), {})
+            for pivot in pivots:
+                stored_pivots.setdefault(pivot.start_date, pivot)
+
+    def purge_pivots(self, symbol: str, timeframe: Timeframe, start_before: int) -> int:
+        """
+        Removes all pivots of the symbol & timeframe that started at or before `start_before`, and returns the number of
+        removed pivots.
+        """
+        nr_purged = 0
+        with self.lock:
+            for pivot_type in PivotType:
+                stored_pivots = self.pivots.get((symbol, timeframe, pivot_type), {})
+                expired_start_dates = [start_date for start_date in stored_pivots if start_date <= start_before]
+                for start_date in expired_start_dates:
+                    del stored_pivots[start_date]
+                nr_purged += len(expired_start_dates)
+        return nr_purged
+
+    def get_state(self, symbol: str, timeframe: Timeframe) -> PivotState:
+        with self.lock:
+            state = self.states.get((symbol, timeframe))
+            if state is None:
+                return PivotState()
+            return PivotState(last_close_date=state.last_close_date, diff_average=state.diff_average)
+
+    def set_state(self, symbol: str, timeframe: Timeframe, state: PivotState):
+        with self.lock:
+            self.states[(symbol, timeframe)] = PivotState(last_close_date=state.last_close_date,
+                                                          diff_average=state.diff_average)
+
+    def reset(self, symbol: str, timeframe: Timeframe):
+        with self.lock:
+            for pivot_type in PivotType:
+                self.pivots.pop((symbol, timeframe, pivot_type), None)
+            self.states.pop((symbol, timeframe), None)
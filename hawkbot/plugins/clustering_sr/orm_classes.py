@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, Float, Index
+from sqlalchemy.ext.declarative import declarative_base
+
+_PIVOT_DECL_BASE = declarative_base()
+
+
+class PivotRecord(_PIVOT_DECL_BASE):
+    __tablename__ = 'PIVOT'
+    id = Column(Integer, primary_key=True)
+    symbol = Column(String)
+    timeframe = Column(String)
+    type = Column(String)
+    start_date = Column(Integer)
+    close_date = Column(Integer)
+    price = Column(Float)
+    __table_args__ = (Index('idx_pivot_symbol_timeframe_type_start_date', 'symbol', 'timeframe', 'type', 'start_date', unique=True),)
+
+
+class PivotStateRecord(_PIVOT_DECL_BASE):
+    __tablename__ = 'PIVOT_STATE'
+    symbol = Column(String, primary_key=True)
+    timeframe = Column(String, primary_key=True)
+    last_close_date = Column(Integer)
+    diff_average = Column(Float)
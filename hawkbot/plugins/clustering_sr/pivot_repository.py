@@ -0,0 +1,136 @@
+import logging
+import os
+import threading
+from typing import Dict, List, Set, Tuple
+
+from sqlalchemy import create_engine, MetaData, delete
+from sqlalchemy.dialects.sqlite import insert
+
+from hawkbot.core.lockable_session import LockableSession
+from hawkbot.core.model import Timeframe
+from hawkbot.plugins.clustering_sr.data_classes import Pivot, PivotType, PivotState
+from hawkbot.plugins.clustering_sr.memory_pivot_repository import MemoryPivotRepository
+from hawkbot.plugins.clustering_sr.orm_classes import PivotRecord, PivotStateRecord, _PIVOT_DECL_BASE
+
+logger = logging.getLogger(__name__)
+
+_repositories: Dict[str, 'PivotRepository'] = {}
+_repositories_lock: threading.Lock = threading.Lock()
+
+
+def get_pivot_repository(database_path: str) -> 'PivotRepository':
+    """
+    Returns the repository of the database path, so all algos of a process that use the same database share a single
+    cache in front of it
+    """
+    with _repositories_lock:
+        if database_path not in _repositories:
+            _repositories[database_path] = PivotRepository(database_path)
+        return _repositories[database_path]
+
+
+class PivotRepository(MemoryPivotRepository):
+    """
+    SQLite backed store of the peaks & troughs found by the PeaksTroughsHighLowAlgo, with a write-through cache. The
+    pivots & state of a symbol and timeframe are only read from the database the first time they are requested; every
+    add, purge & reset through this repository updates the cache as well, so subsequent reads never hit the database.
+    The pivots survive a restart and are picked up by every process that starts using the same database, but pivots
+    written by another process after this process first read them are not seen. Pivots are indexed on
+    (symbol, timeframe, type, start_date), so expiring pivots is a single range delete.
+    """
+
+    def __init__(self, database_path: str):
+        super().__init__()
+        directory = os.path.dirname(database_path)
+        if directory != '':
+            os.makedirs(directory, exist_ok=True)
+        self.engine = create_engine(url=f'sqlite:///{database_path}',
+                                    echo=False,
+                                    connect_args={"check_same_thread": False})
+        self.metadata = MetaData(bind=self.engine)
+        _PIVOT_DECL_BASE.metadata.create_all(self.engine)
+        self.lockable_session = LockableSession(self.engine)
+        self.loaded: Set[Tuple[str, Timeframe]] = set()
+
+    def load(self, symbol: str, timeframe: Timeframe):
+        with self.lock:
+            if (symbol, timeframe) in self.loaded:
+                return
+            with self.lockable_session as session:
+                pivot_records = session.query(PivotRecord) \
+                    .filter(PivotRecord.symbol == symbol) \
+                    .filter(PivotRecord.timeframe == timeframe.name).all()
+                state_record = session.query(PivotStateRecord) \
+                    .filter(PivotStateRecord.symbol == symbol) \
+                    .filter(PivotStateRecord.timeframe == timeframe.name).one_or_none()
+            for pivot_type in PivotType:
+                pivots = [Pivot(start_date=record.start_date, close_date=record.close_date, price=record.price)
+                          for record in pivot_records if record.type == pivot_type.name]
+                super().add_pivots(symbol=symbol, timeframe=timeframe, pivot_type=pivot_type, pivots=pivots)
+            if state_record is not None:
+                super().set_state(symbol=symbol,
+                                  timeframe=timeframe,
+                                  state=PivotState(last_close_date=state_record.last_close_date,
+                                                   diff_average=state_record.diff_average))
+            self.loaded.add((symbol, timeframe))
+
+    def get_pivots(self, symbol: str, timeframe: Timeframe, pivot_type: PivotType) -> List[Pivot]:
+        self.load(symbol=symbol, timeframe=timeframe)
+        return super().get_pivots(symbol=symbol, timeframe=timeframe, pivot_type=pivot_type)
+
+    def add_pivots(self, symbol: str, timeframe: Timeframe, pivot_type: PivotType, pivots: List[Pivot]):
+        if len(pivots) == 0:
+            return
+        data = [{
+            "symbol": symbol,
+            "timeframe": timeframe.name,
+            "type": pivot_type.name,
+            "start_date": pivot.start_date,
+            "close_date": pivot.close_date,
+            "price": pivot.price
+        } for pivot in pivots]
+        with self.lock:
+            self.load(symbol=symbol, timeframe=timeframe)
+            with self.lockable_session as session:
+                session.execute(insert(PivotRecord).on_conflict_do_nothing(), data)
+                session.commit()
+            super().add_pivots(symbol=symbol, timeframe=timeframe, pivot_type=pivot_type, pivots=pivots)
+
+    def purge_pivots(self, symbol: str, timeframe: Timeframe, start_before: int) -> int:
+        with self.lock:
+            self.load(symbol=symbol, timeframe=timeframe)
+            with self.lockable_session as session:
+                session.execute(delete(PivotRecord)
+                                .where(PivotRecord.symbol == symbol)
+                                .where(PivotRecord.timeframe == timeframe.name)
+                                .where(PivotRecord.start_date <= start_before))
+                session.commit()
+            return super().purge_pivots(symbol=symbol, timeframe=timeframe, start_before=start_before)
+
+    def get_state(self, symbol: str, timeframe: Timeframe) -> PivotState:
+        self.load(symbol=symbol, timeframe=timeframe)
+        return super().get_state(symbol=symbol, timeframe=timeframe)
+
+    def set_state(self, symbol: str, timeframe: Timeframe, state: PivotState):
+        with self.lock:
+            self.load(symbol=symbol, timeframe=timeframe)
+            with self.lockable_session as session:
+                session.merge(PivotStateRecord(symbol=symbol,
+                                               timeframe=timeframe.name,
+                                               last_close_date=state.last_close_date,
+                                               diff_average=state.diff_average))
+                session.commit()
+            super().set_state(symbol=symbol, timeframe=timeframe, state=state)
+
+    def reset(self, symbol: str, timeframe: Timeframe):
+        with self.lock:
+            with self.lockable_session as session:
+                session.query(PivotRecord) \
+                    .filter(PivotRecord.symbol == symbol) \
+                    .filter(PivotRecord.timeframe == timeframe.name).delete()
+                session.query(PivotStateRecord) \
+                    .filter(PivotStateRecord.symbol == symbol) \
+                    .filter(PivotStateRecord.timeframe == timeframe.name).delete()
+                session.commit()
+            super().reset(symbol=symbol, timeframe=timeframe)
+            self.loaded.add((symbol, timeframe))
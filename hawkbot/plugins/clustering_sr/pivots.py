@@ -0,0 +1,74 @@
+from bisect import bisect_left, insort
+from typing import Iterable, List
+
+import numpy as np
+
+
+def trough_mask(values: np.ndarray) -> np.ndarray:
+    """
+    Returns a boolean mask marking every index i (2 <= i < len - 2) where values[i] is lower than both neighbours, and
+    the neighbours themselves are lower than their own outer neighbours.
+    """
+    mask = np.zeros(len(values), dtype=bool)
+    if len(values) < 5:
+        return mask
+    center = values[2:-2]
+    mask[2:-2] = (center < values[1:-3]) & \
+                 (center < values[3:-1]) & \
+                 (values[3:-1] < values[4:]) & \
+                 (values[1:-3] < values[:-4])
+    return mask
+
+
+def peak_mask(values: np.ndarray) -> np.ndarray:
+    """
+    Returns a boolean mask marking every index i (2 <= i < len - 2) where values[i] is higher than both neighbours, and
+    the neighbours themselves are higher than their own outer neighbours.
+    """
+    mask = np.zeros(len(values), dtype=bool)
+    if len(values) < 5:
+        return mask
+    center = values[2:-2]
+    mask[2:-2] = (center > values[1:-3]) & \
+                 (center > values[3:-1]) & \
+                 (values[3:-1] > values[4:]) & \
+                 (values[1:-3] > values[:-4])
+    return mask
+
+
+def candidate_indices(*masks: np.ndarray) -> np.ndarray:
+    """
+    Returns the ascending indices that are marked in at least one of the masks
+    """
+    combined = np.zeros(len(masks[0]), dtype=bool)
+    for mask in masks:
+        combined |= mask
+    return np.flatnonzero(combined)
+
+
+class LevelIndex:
+    """
+    Sorted collection of accepted levels, answering whether a new value is at least a given distance away from every
+    accepted level in O(log n) by only inspecting the nearest level on either side.
+    """
+
+    def __init__(self, levels: Iterable[float] = ()):
+        self.levels: List[float] = sorted(levels)
+
+    def add(self, level: float):
+        insort(self.levels, level)
+
+    def is_far_from_level(self, value: float, distance: float) -> bool:
+        position = bisect_left(self.levels, value)
+        if position < len(self.levels) and abs(value - self.levels[position]) < distance:
+            return False
+        if position > 0 and abs(value - self.levels[position - 1]) < distance:
+            return False
+        return True
+
+    def has_level_between(self, lower: float, upper: float) -> bool:
+        """
+        Returns whether any accepted level lies within [lower, upper]
+        """
+        position = bisect_left(self.levels, lower)
+        return position < len(self.levels) and self.levels[position] <= upper
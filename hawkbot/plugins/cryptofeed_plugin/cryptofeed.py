@@ -3,6 +3,7 @@ import logging
 import threading
 import time
 from multiprocessing import Queue
+from typing import Dict, List
 
 from cryptofeed import FeedHandler
 from cryptofeed.defines import TRADES, PERPETUAL
@@ -24,6 +25,7 @@ from hawkbot.utils import period_as_ms, init_logging, readable, period_as_s
 class Cryptofeed:
     LISTENTO_SYMBOL = 'cryptofeed_listento_'
     TRADEPRICE_SYMBOL = 'trade_price_'
+    TRADEPRICE_KEYS = 'cryptofeed_trade_price_keys'
 
     def __init__(self, redis_host: str, redis_port: int, command_queue: Queue, logging_queue: Queue, plugin_config):
         global logger
@@ -41,12 +43,25 @@ class Cryptofeed:
         self.clean_retention_period = period_as_ms(self.plugin_config['clean_retention_period'])
         self.clean_check_interval = period_as_ms('30s')
         self.clean_sleep = period_as_s('5s')
+        self.clean_chunk_size = 25
         self.exchange_feed = None
         self.type = None
         self.loop = None
         self.feed_handler = FeedHandler(config={'log': {'filename': 'logs/feedhandler.log', 'level': 'WARNING'}, 'backend_multiprocessing': True})
         self.registered_symbols = []
 
+        # trades received but not written to redis yet, by key name and member
+        self.pending_trades: Dict[str, Dict[str, int]] = {}
+        self.nr_pending_trades: int = 0
+        self.trades_available: asyncio.Event = None
+        self.statistics_interval = period_as_s('1m')
+        self.nr_trades_received: int = 0
+        self.nr_trades_written: int = 0
+        self.nr_batches_written: int = 0
+        self.max_backlog: int = 0
+        # trade price keys that are known to be present in the TRADEPRICE_KEYS registry
+        self.registered_trade_keys = set()
+
         self.init_config()
 
     def init_config(self):
@@ -54,6 +69,13 @@ class Cryptofeed:
             self.clean_check_interval = period_as_ms(self.plugin_config['clean_check_interval'])
         if 'clean_sleep' in self.plugin_config:
             self.clean_sleep = period_as_s(self.plugin_config['clean_sleep'])
+        if 'clean_chunk_size' in self.plugin_config:
+            self.clean_chunk_size = self.plugin_config['clean_chunk_size']
+            if self.clean_chunk_size < 1:
+                raise InvalidArgumentException(f'The parameter \'clean_chunk_size\' needs to be at least 1, '
+                                               f'{self.clean_chunk_size} was specified')
+        if 'statistics_interval' in self.plugin_config:
+            self.statistics_interval = period_as_s(self.plugin_config['statistics_interval'])
 
         if self.config.exchange == 'binance':
             self.exchange_feed = BinanceFutures
@@ -65,8 +87,22 @@ class Cryptofeed:
             raise InvalidArgumentException(f'Exchange {self.config.exchange} is not implemented yet in the CryptofeedPlugin, please contact Hawkeye')
 
     async def aio_task(self):
+        last_report = time.monotonic()
         while True:
             await asyncio.sleep(1)
+            elapsed = time.monotonic() - last_report
+            if elapsed >= self.statistics_interval:
+                self._report_statistics(elapsed)
+                last_report = time.monotonic()
+
+    def _report_statistics(self, elapsed: float):
+        logger.info(f'Received {self.nr_trades_received / elapsed:.1f} trades/s, wrote {self.nr_trades_written} trades '
+                    f'in {self.nr_batches_written} batches, current backlog = {self.nr_pending_trades} trades, '
+                    f'max backlog = {self.max_backlog} trades')
+        self.nr_trades_received = 0
+        self.nr_trades_written = 0
+        self.nr_batches_written = 0
+        self.max_backlog = self.nr_pending_trades
 
     def run(self):
         self.pubsub.psubscribe(**{Cryptofeed.LISTENTO_SYMBOL: self._add_symbol})
@@ -81,7 +117,9 @@ class Cryptofeed:
         self.loop = asyncio.get_event_loop()
         self.feed_handler.run(start_loop=False)
         loop = asyncio.get_event_loop()
+        self.trades_available = asyncio.Event()
         loop.create_task(self.aio_task())
+        loop.create_task(self._trade_writer())
         loop.run_forever()
 
     def _add_symbol(self, msg):
@@ -100,22 +138,97 @@ class Cryptofeed:
             logger.exception(f"Failed to process symbol subscription message for message {msg}")
 
     def _periodic_clean(self):
-        last_clean = self.time_provider.get_utc_now_timestamp()
+        """
+        Removes the trades older than the retention period. The trade keys are taken from the TRADEPRICE_KEYS registry
+        instead of scanning the keyspace, and are expired in pipelined chunks of `clean_chunk_size` keys that are
+        spread evenly over the clean check interval, so a clean pass never occupies redis for long.
+        """
+        self._register_existing_trade_keys()
+        clean_check_interval_s = self.clean_check_interval / 1000
         while True:
-            if last_clean + self.clean_check_interval < self.time_provider.get_utc_now_timestamp():
-                key_names = [i for i in self.redis.scan(match=f'{self.TRADEPRICE_SYMBOL}*', count=1000000)[1]]
-                for key_name in key_names:
-                    remove_before_timestamp = self.time_provider.get_utc_now_timestamp() - self.clean_retention_period
-                    nr_elements_removed = self.redis.zremrangebyscore(name=key_name, min=0, max=remove_before_timestamp)
-                    total_records_after_purge = self.redis.zcount(name=key_name, min=0, max=self.time_provider.get_utc_now_timestamp())
-                    logger.debug(f'{key_name}: Removed {nr_elements_removed} trades from redis before {readable(remove_before_timestamp)}, '
-                                 f'nr of remaining records = {total_records_after_purge}')
-                last_clean = self.time_provider.get_utc_now_timestamp()
-
-            time.sleep(self.clean_sleep)
+            pass_start = time.monotonic()
+            key_names = sorted(self.redis.smembers(Cryptofeed.TRADEPRICE_KEYS))
+            chunks = [key_names[i:i + self.clean_chunk_size] for i in range(0, len(key_names), self.clean_chunk_size)]
+            pause = clean_check_interval_s / max(len(chunks), 1)
+            for chunk in chunks:
+                chunk_start = time.monotonic()
+                try:
+                    self._clean_keys(chunk)
+                except Exception:
+                    logger.exception(f'Failed to remove expired trades for keys {chunk}')
+                time.sleep(max(0.0, pause - (time.monotonic() - chunk_start)))
+
+            remaining = clean_check_interval_s - (time.monotonic() - pass_start)
+            time.sleep(max(remaining, self.clean_sleep))
+
+    def _clean_keys(self, key_names: List[str]):
+        remove_before_timestamp = self.time_provider.get_utc_now_timestamp() - self.clean_retention_period
+        pipeline = self.redis.pipeline(transaction=False)
+        for key_name in key_names:
+            pipeline.zremrangebyscore(name=key_name, min=0, max=remove_before_timestamp)
+            pipeline.zcard(name=key_name)
+        results = pipeline.execute()
+        for key_name, nr_elements_removed, total_records_after_purge in zip(key_names, results[::2], results[1::2]):
+            logger.debug(f'{key_name}: Removed {nr_elements_removed} trades from redis before {readable(remove_before_timestamp)}, '
+                         f'nr of remaining records = {total_records_after_purge}')
+
+    def _register_existing_trade_keys(self):
+        """
+        Adds the trade keys written before the registry was introduced to the registry. This is a one-time incremental
+        scan at startup; after that every key is registered when its first trade is written.
+        """
+        key_names = list(self.redis.scan_iter(match=f'{Cryptofeed.TRADEPRICE_SYMBOL}*', count=1000))
+        if len(key_names) > 0:
+            self.redis.sadd(Cryptofeed.TRADEPRICE_KEYS, *key_names)
+            logger.info(f'Registered {len(key_names)} existing trade keys')
 
     async def _handle_trade(self, trade: Trade, receipt_timestamp: float):
-        self.redis.zadd(name=Cryptofeed.TRADEPRICE_SYMBOL + trade.raw['s'], mapping={trade.raw['p']: trade.raw['T']})
+        # the member contains the trade id, price and size so trades at the same price don't overwrite each other
+        member = f'{trade.id}|{trade.price}|{trade.amount}'
+        self.pending_trades.setdefault(Cryptofeed.TRADEPRICE_SYMBOL + trade.raw['s'], {})[member] = trade.raw['T']
+        self.nr_pending_trades += 1
+        self.nr_trades_received += 1
+        self.max_backlog = max(self.max_backlog, self.nr_pending_trades)
+        if self.trades_available is not None:
+            self.trades_available.set()
+
+    async def _trade_writer(self):
+        """
+        Writes the trades received since the previous write in a single pipeline. The write itself is executed in a
+        worker thread, so the event loop keeps processing incoming trades while waiting for redis; those trades are
+        collected in the next batch.
+        """
+        loop = asyncio.get_event_loop()
+        while True:
+            await self.trades_available.wait()
+            self.trades_available.clear()
+            batch, nr_trades = self.pending_trades, self.nr_pending_trades
+            self.pending_trades, self.nr_pending_trades = {}, 0
+            if nr_trades == 0:
+                continue
+            try:
+                await loop.run_in_executor(None, self._write_trades, batch)
+                self.nr_trades_written += nr_trades
+                self.nr_batches_written += 1
+            except Exception:
+                logger.exception(f'Failed to write {nr_trades} trades to redis, retrying with the next batch')
+                for key_name, members in batch.items():
+                    pending = self.pending_trades.setdefault(key_name, {})
+                    for member, timestamp in members.items():
+                        pending.setdefault(member, timestamp)
+                self.nr_pending_trades += nr_trades
+                self.trades_available.set()
+                await asyncio.sleep(1)
+
+    def _write_trades(self, batch: Dict[str, Dict[str, int]]):
+        new_key_names = [key_name for key_name in batch if key_name not in self.registered_trade_keys]
+        pipeline = self.redis.pipeline(transaction=False)
+        for key_name, members in batch.items():
+            pipeline.zadd(name=key_name, mapping=members)
+        if len(new_key_names) > 0:
+            pipeline.sadd(Cryptofeed.TRADEPRICE_KEYS, *new_key_names)
+        pipeline.execute()
+        self.registered_trade_keys.update(new_key_names)
 
     @staticmethod
     def start_process(redis_host: str,
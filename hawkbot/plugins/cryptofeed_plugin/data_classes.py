@@ -0,0 +1,8 @@
+from dataclasses import dataclass
+
+
+@dataclass
+class TickCount:
+    symbol: str
+    count: int
+    earliest_timestamp: int
@@ -0,0 +1,42 @@
+import logging
+from typing import List, Dict
+
+from redis import Redis
+
+from hawkbot.core.time_provider import now_timestamp
+from hawkbot.plugins.cryptofeed_plugin.cryptofeed import Cryptofeed
+from hawkbot.plugins.cryptofeed_plugin.data_classes import TickCount
+
+logger = logging.getLogger(__name__)
+
+
+class TickCounter:
+    """
+    Counts the trades stored by the CryptofeedPlugin. The counts for any number of symbols are retrieved in a single
+    pipelined round trip to redis.
+    """
+
+    def __init__(self, redis: Redis):
+        self.redis = redis
+
+    def count_ticks(self, symbols: List[str], lookback_period_ms: int, now: int = None) -> Dict[str, TickCount]:
+        """
+        Returns the number of ticks in the last `lookback_period_ms` milliseconds and the timestamp of the earliest
+        stored tick per symbol. Symbols for which no ticks are stored at all are not included in the result.
+        """
+        if now is None:
+            now = now_timestamp()
+        symbols = list(symbols)
+        pipeline = self.redis.pipeline(transaction=False)
+        for symbol in symbols:
+            key_name = Cryptofeed.TRADEPRICE_SYMBOL + symbol
+            pipeline.zrange(name=key_name, start=0, end=0, withscores=True)
+            pipeline.zcount(name=key_name, min=now - lookback_period_ms, max=now)
+        results = pipeline.execute()
+
+        tick_counts = {}
+        for symbol, earliest, count in zip(symbols, results[::2], results[1::2]):
+            if len(earliest) == 0:
+                continue
+            tick_counts[symbol] = TickCount(symbol=symbol, count=count, earliest_timestamp=int(earliest[0][1]))
+        return tick_counts
@@ -6,17 +6,20 @@ from typing import Dict, List
 
 import logging
 
+import pyarrow
+
 from hawkbot.core.config.active_config_manager import ActiveConfigManager
 from hawkbot.core.data_classes import Tick, Candle
 from hawkbot.core.model import PositionSide, Timeframe
 from hawkbot.core.tick_listener import TickListener
 from hawkbot.core.tickstore.tickstore import Tickstore
 from hawkbot.core.time_provider import TimeProvider
-from hawkbot.exceptions import BanPreventionException
+from hawkbot.exceptions import BanPreventionException, InvalidConfigurationException
 from hawkbot.plugins.orderbook_sr.data_classes import SupportResistance
 from hawkbot.plugins.orderbook_sr.orderbook_sr import OrderbookSrPlugin
 from hawkbot.core.plugins.plugin import Plugin
-from hawkbot.utils import period_as_ms
+from hawkbot.plugins.data_capture_plugin.parquet_capture_writer import ParquetCaptureWriter
+from hawkbot.utils import period_as_ms, period_as_s
 
 logger = logging.getLogger(__name__)
 
@@ -41,21 +44,68 @@ class DataCapturePlugin(Plugin, TickListener):
         self.nr_of_trades_in_current_candle: Dict[str, int] = {}
         self.candle_tick_size: int = 300
         self.last_write_current_candle: Dict[str, int] = {}
+        self.capture_format: str = 'csv'
+        self.capture_path: str = 'data/capture'
+        self.flush_interval: str = '5s'
+        self.rotate_interval: str = '1h'
+        self.rotate_size_mb: int = 128
+        self.tick_writer: ParquetCaptureWriter = None
+        self.candle_writer: ParquetCaptureWriter = None
+        self.tps_writer: ParquetCaptureWriter = None
+
+        if 'capture_format' in plugin_config:
+            self.capture_format = plugin_config['capture_format']
+            if self.capture_format not in ['csv', 'parquet']:
+                raise InvalidConfigurationException('The parameter \'capture_format\' must be either \'csv\' or '
+                                                    '\'parquet\'')
+        if 'capture_path' in plugin_config:
+            self.capture_path = plugin_config['capture_path']
+        if 'flush_interval' in plugin_config:
+            self.flush_interval = plugin_config['flush_interval']
+        if 'rotate_interval' in plugin_config:
+            self.rotate_interval = plugin_config['rotate_interval']
+        if 'rotate_size_mb' in plugin_config:
+            self.rotate_size_mb = plugin_config['rotate_size_mb']
 
     def start(self):
         if self.config.tickstore_used is False:
             return
 
+        if self.capture_format == 'parquet':
+            self.tick_writer = self._create_parquet_writer(name='ticks', schema=pyarrow.schema([
+                ('symbol', pyarrow.string()),
+                ('timestamp', pyarrow.int64()),
+                ('price', pyarrow.float64()),
+                ('qty', pyarrow.float64()),
+                ('first_trade_id', pyarrow.int64()),
+                ('last_trade_id', pyarrow.int64())]))
+            self.candle_writer = self._create_parquet_writer(name='candles', schema=pyarrow.schema([
+                ('symbol', pyarrow.string()),
+                ('timeframe', pyarrow.string()),
+                ('start_date', pyarrow.int64()),
+                ('close_date', pyarrow.int64()),
+                ('open', pyarrow.float64()),
+                ('high', pyarrow.float64()),
+                ('low', pyarrow.float64()),
+                ('close', pyarrow.float64()),
+                ('volume', pyarrow.float64()),
+                ('quote_volume', pyarrow.float64())]))
+            self.tps_writer = self._create_parquet_writer(name='tps', schema=pyarrow.schema([
+                ('symbol', pyarrow.string()),
+                ('timestamp', pyarrow.int64()),
+                ('tps', pyarrow.int64())]))
+
         # self.tick_processor.register_tick_listener(self)
         self.orderbook_sr_plugin = self.plugin_loader.get_plugin(OrderbookSrPlugin.plugin_name())
 
         init_tick_history_period = '3H'
         for symbol in self.config.symbols:
-            filename = f'{symbol}_candles.csv'
-            if os.path.exists(filename):
-                os.remove(filename)
-            with open(filename, 'w') as csv_file:
-                csv_file.write('timestamp,open,high,low,close,symbol\n')
+            if self.capture_format == 'csv':
+                filename = f'{symbol}_candles.csv'
+                if os.path.exists(filename):
+                    os.remove(filename)
+                with open(filename, 'w') as csv_file:
+                    csv_file.write('timestamp,open,high,low,close,symbol\n')
 
             now = self.time_provider.get_utc_now_timestamp()
             self.tick_store.purge_ticks_older_than(symbol=symbol, period=init_tick_history_period)
@@ -70,6 +120,19 @@ class DataCapturePlugin(Plugin, TickListener):
                 except BanPreventionException:
                     time.sleep(60)
 
+    def stop(self):
+        for writer in [self.tick_writer, self.candle_writer, self.tps_writer]:
+            if writer is not None:
+                writer.close()
+
+    def _create_parquet_writer(self, name: str, schema: pyarrow.Schema) -> ParquetCaptureWriter:
+        return ParquetCaptureWriter(directory=self.capture_path,
+                                    name=name,
+                                    schema=schema,
+                                    flush_interval_s=period_as_s(self.flush_interval),
+                                    rotate_interval_ms=period_as_ms(self.rotate_interval),
+                                    rotate_size_bytes=self.rotate_size_mb * 1024 * 1024)
+
     def capture_initial_entry_orderbook(self, symbol: str, position_side: PositionSide,
                                         support_resistance: SupportResistance):
         filename = f'{symbol}_{position_side.name}_inital_entry_orderbook_strength.csv'
@@ -103,8 +166,16 @@ class DataCapturePlugin(Plugin, TickListener):
                 csv_file.write('timestamp,open,high,low,close,symbol\n')
             self.initialized_tick_symbols.append(symbol)
 
+        if self.tick_writer is not None:
+            self.tick_writer.append(symbol=symbol,
+                                    timestamp=tick.timestamp,
+                                    price=tick.price,
+                                    qty=tick.qty,
+                                    first_trade_id=tick.first_trade_id,
+                                    last_trade_id=tick.last_trade_id)
+
         filename = f'{tick.symbol}_tps.csv'
-        if symbol not in self.initialized_tps_file_symbols:
+        if self.tps_writer is None and symbol not in self.initialized_tps_file_symbols:
             if os.path.exists(filename):
                 os.remove(filename)
             with open(filename, 'a') as csv_file:
@@ -124,9 +195,12 @@ class DataCapturePlugin(Plugin, TickListener):
             self.current_tps_count[symbol] += nr_trades
         else:
             if self.current_tps_count[symbol] > 0:
-                with open(filename, 'a') as csv_file:
-                    tps = self.current_tps_count[symbol]
-                    csv_file.write(f'{self.current_tps_timestamp[symbol]},{tps}\n')
+                tps = self.current_tps_count[symbol]
+                if self.tps_writer is not None:
+                    self.tps_writer.append(symbol=symbol, timestamp=self.current_tps_timestamp[symbol], tps=tps)
+                else:
+                    with open(filename, 'a') as csv_file:
+                        csv_file.write(f'{self.current_tps_timestamp[symbol]},{tps}\n')
 
             self.current_tps_timestamp[symbol] = timestamp_s
             self.current_tps_count[symbol] = 0
@@ -134,49 +208,35 @@ class DataCapturePlugin(Plugin, TickListener):
     def _process_tick_in_candle(self, tick: Tick):
         symbol = tick.symbol
         tick_trade_processed = False
+        # all trades of a tick have the same price, so instead of processing the trades one by one, the trades are
+        # added to the current candle in chunks of at most the number of trades left in the candle
+        nr_trades_left = (tick.last_trade_id - tick.first_trade_id) + 1
 
-        for i, trade_id in enumerate(range(tick.first_trade_id, tick.last_trade_id + 1)):
-            if symbol not in self.current_candle:
-                self.current_candle[symbol] = Candle(symbol=tick.symbol,
-                                                     timeframe=Timeframe.THREE_HUNDRED_TICKS,
-                                                     open=tick.price,
-                                                     high=tick.price,
-                                                     low=tick.price,
-                                                     close=tick.price,
-                                                     volume=tick.qty * tick.price,
-                                                     quote_volume=tick.qty,
-                                                     start_date=tick.timestamp,
-                                                     close_date=tick.timestamp)
-            else:
-                if self.nr_of_trades_in_current_candle[symbol] == self.candle_tick_size:
-                    candle = self.current_candle[symbol]
-                    with open(f'{symbol}_candles.csv', 'a') as csv_file:
-                        csv_file.write(
-                            f'{candle.start_date},{candle.open},{candle.high},{candle.low},{candle.close},{candle.symbol}\n')
-
-                    self.current_candle[symbol] = Candle(symbol=tick.symbol,
-                                                         timeframe=Timeframe.THREE_HUNDRED_TICKS,
-                                                         open=tick.price,
-                                                         high=tick.price,
-                                                         low=tick.price,
-                                                         close=tick.price,
-                                                         volume=tick.qty * tick.price,
-                                                         quote_volume=tick.qty,
-                                                         start_date=tick.timestamp,
-                                                         close_date=tick.timestamp)
-                    self.nr_of_trades_in_current_candle[symbol] = 0
-                else:
-                    candle = self.current_candle[symbol]
-                    candle.high = max(candle.high, tick.price)
-                    candle.low = min(candle.low, tick.price)
-                    candle.close = tick.price
-                    candle.close_date = tick.timestamp
-                    if tick_trade_processed is False:
-                        candle.volume += tick.qty * tick.price
-                        candle.quote_volume += tick.qty
-                        tick_trade_processed = True
-
+        if nr_trades_left > 0 and symbol not in self.current_candle:
+            self.current_candle[symbol] = self._new_tick_candle(tick)
             self.nr_of_trades_in_current_candle[symbol] += 1
+            nr_trades_left -= 1
+
+        while nr_trades_left > 0:
+            if self.nr_of_trades_in_current_candle[symbol] == self.candle_tick_size:
+                self._write_candle(self.current_candle[symbol])
+                self.current_candle[symbol] = self._new_tick_candle(tick)
+                self.nr_of_trades_in_current_candle[symbol] = 1
+                nr_trades_left -= 1
+            else:
+                nr_trades_in_chunk = min(nr_trades_left,
+                                         self.candle_tick_size - self.nr_of_trades_in_current_candle[symbol])
+                candle = self.current_candle[symbol]
+                candle.high = max(candle.high, tick.price)
+                candle.low = min(candle.low, tick.price)
+                candle.close = tick.price
+                candle.close_date = tick.timestamp
+                if tick_trade_processed is False:
+                    candle.volume += tick.qty * tick.price
+                    candle.quote_volume += tick.qty
+                    tick_trade_processed = True
+                self.nr_of_trades_in_current_candle[symbol] += nr_trades_in_chunk
+                nr_trades_left -= nr_trades_in_chunk
 
         # dashboard stuff
         if self.last_write_current_candle[symbol] + 1000 < self.time_provider.get_utc_now_timestamp():
@@ -186,3 +246,32 @@ class DataCapturePlugin(Plugin, TickListener):
                 csv_file.write(
                     f'{candle.start_date},{candle.open},{candle.high},{candle.low},{candle.close},{candle.symbol}')
             self.last_write_current_candle[symbol] = self.time_provider.get_utc_now_timestamp()
+
+    def _new_tick_candle(self, tick: Tick) -> Candle:
+        return Candle(symbol=tick.symbol,
+                      timeframe=Timeframe.THREE_HUNDRED_TICKS,
+                      open=tick.price,
+                      high=tick.price,
+                      low=tick.price,
+                      close=tick.price,
+                      volume=tick.qty * tick.price,
+                      quote_volume=tick.qty,
+                      start_date=tick.timestamp,
+                      close_date=tick.timestamp)
+
+    def _write_candle(self, candle: Candle):
+        if self.candle_writer is not None:
+            self.candle_writer.append(symbol=candle.symbol,
+                                      timeframe=candle.timeframe.name,
+                                      start_date=candle.start_date,
+                                      close_date=candle.close_date,
+                                      open=candle.open,
+                                      high=candle.high,
+                                      low=candle.low,
+                                      close=candle.close,
+                                      volume=candle.volume,
+                                      quote_volume=candle.quote_volume)
+        else:
+            with open(f'{candle.symbol}_candles.csv', 'a') as csv_file:
+                csv_file.write(
+                    f'{candle.start_date},{candle.open},{candle.high},{candle.low},{candle.close},{candle.symbol}\n')
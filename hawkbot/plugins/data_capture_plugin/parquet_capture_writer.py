@@ -0,0 +1,99 @@
+import logging
+import os
+import threading
+from typing import List, Dict
+
+import pyarrow
+from pyarrow import parquet
+
+from hawkbot.core.time_provider import now_timestamp
+
+logger = logging.getLogger(__name__)
+
+
+class ParquetCaptureWriter:
+    """
+    Buffers captured rows in memory and writes them as Parquet row groups from a background thread. Every flush is
+    followed by an fsync. A new file is started when the current file is older than `rotate_interval_ms` or larger
+    than `rotate_size_bytes`; a file can be read as soon as it has been rotated or the writer has been closed.
+
+    Files are written to `<directory>/<name>/<name>_<first timestamp>.parquet`.
+    """
+
+    def __init__(self,
+                 directory: str,
+                 name: str,
+                 schema: pyarrow.Schema,
+                 flush_interval_s: float,
+                 rotate_interval_ms: int,
+                 rotate_size_bytes: int):
+        self.directory = os.path.join(directory, name)
+        self.name = name
+        self.schema = schema
+        self.flush_interval_s = flush_interval_s
+        self.rotate_interval_ms = rotate_interval_ms
+        self.rotate_size_bytes = rotate_size_bytes
+        self.columns: Dict[str, List] = {field.name: [] for field in schema}
+        self.buffer_lock = threading.Lock()
+        self.write_lock = threading.Lock()
+        self.file = None
+        self.writer: parquet.ParquetWriter = None
+        self.file_opened_at: int = None
+        self.stopped = threading.Event()
+        os.makedirs(self.directory, exist_ok=True)
+        self.flush_thread = threading.Thread(name=f'capture_writer_{name}', target=self._run, daemon=True)
+        self.flush_thread.start()
+
+    def append(self, **row):
+        with self.buffer_lock:
+            for column_name, values in self.columns.items():
+                values.append(row[column_name])
+
+    def _run(self):
+        while not self.stopped.wait(self.flush_interval_s):
+            try:
+                self.flush()
+            except Exception:
+                logger.exception(f'{self.name}: Failed to write captured data')
+
+    def flush(self):
+        with self.buffer_lock:
+            columns = self.columns
+            self.columns = {field.name: [] for field in self.schema}
+        nr_rows = len(next(iter(columns.values())))
+
+        with self.write_lock:
+            if nr_rows > 0:
+                if self.writer is None:
+                    self._open_file()
+                self.writer.write_table(pyarrow.Table.from_pydict(columns, schema=self.schema))
+                self.file.flush()
+                os.fsync(self.file.fileno())
+
+            if self.writer is not None and (now_timestamp() - self.file_opened_at >= self.rotate_interval_ms or
+                                            self.file.tell() >= self.rotate_size_bytes):
+                self._close_file()
+
+    def close(self):
+        self.stopped.set()
+        self.flush_thread.join()
+        self.flush()
+        with self.write_lock:
+            self._close_file()
+
+    def _open_file(self):
+        self.file_opened_at = now_timestamp()
+        filename = os.path.join(self.directory, f'{self.name}_{self.file_opened_at}.parquet')
+        self.file = open(filename, 'wb')
+        self.writer = parquet.ParquetWriter(self.file, self.schema)
+        logger.info(f'{self.name}: Started capture file {filename}')
+
+    def _close_file(self):
+        if self.writer is None:
+            return
+        self.writer.close()
+        self.file.flush()
+        os.fsync(self.file.fileno())
+        self.file.close()
+        self.writer = None
+        self.file = None
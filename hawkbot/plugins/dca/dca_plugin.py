@@ -10,6 +10,7 @@ from hawkbot.exceptions import InvalidConfigurationException, NoInitialEntryOrde
 from hawkbot.logging import user_log
 from hawkbot.plugins.clustering_sr.algo_type import AlgoType
 from hawkbot.plugins.clustering_sr.clustering_sr_plugin import ClusteringSupportResistancePlugin
+from hawkbot.plugins.clustering_sr.pivots import LevelIndex
 from hawkbot.plugins.gridstorage.data_classes import QuantityRecord, PriceRecord
 from hawkbot.plugins.gridstorage.gridstorage_plugin import GridStoragePlugin
 from hawkbot.utils import round_dn, round_, cost_to_quantity, calc_min_qty, fill_optional_parameters, calculate_new_order_size
@@ -463,16 +464,15 @@ class DcaPlugin(Plugin):
                                                                           price_step=price_step,
                                                                           dca_config=dca_config)
         final_support_list = support_resistance.supports
+        final_support_levels = LevelIndex(final_support_list)
         for resistance in support_resistance.resistances:
             min_resistance_overlap_price = resistance * (1 - dca_config.overlap)
             max_resistance_overlap_price = resistance * (1 + dca_config.overlap)
-            resistance_overlaps = False
-            for support in final_support_list:
-                if min_resistance_overlap_price <= support <= max_resistance_overlap_price:
-                    resistance_overlaps = True
-                    break
+            resistance_overlaps = final_support_levels.has_level_between(min_resistance_overlap_price,
+                                                                         max_resistance_overlap_price)
             if not resistance_overlaps and resistance < maximum_price:
                 final_support_list.append(resistance)
+                final_support_levels.add(resistance)
 
         support_prices = [PriceRecord(position_side=position_side, price=price)
                           for price in final_support_list if price >= minimum_symbol_price]
@@ -734,7 +734,8 @@ class DcaPlugin(Plugin):
         1+5**0.5 is a standard 1.618 progression with a very small initial order
         """
         ratio = (1 + 5 ** ratio_power) / 2
-        dca_quantities = [(max_size * (1 - ratio) / (1 - ratio ** steps)) * ratio ** i for i in range(steps)]
+        first_quantity = max_size * (1 - ratio) / (1 - ratio ** steps)
+        dca_quantities = [first_quantity * ratio ** i for i in range(steps)]
         logger.debug(f'{symbol} {position_side.name}: DCA quantities based on maximum_position_coin_size of '
                      f'{max_size} and {steps} steps are:')
         [logger.debug(f"{i}: {q}") for i, q in enumerate(dca_quantities)]
@@ -1097,16 +1098,15 @@ class DcaPlugin(Plugin):
                                                                           price_step=price_step,
                                                                           dca_config=dca_config)
         final_resistance_list = support_resistance.resistances
+        final_resistance_levels = LevelIndex(final_resistance_list)
         for support in support_resistance.supports:
             min_support_overlap_price = support * (1 - dca_config.overlap)
             max_support_overlap_price = support * (1 + dca_config.overlap)
-            resistance_overlaps = False
-            for resistance in final_resistance_list:
-                if min_support_overlap_price <= resistance <= max_support_overlap_price:
-                    resistance_overlaps = True
-                    break
+            resistance_overlaps = final_resistance_levels.has_level_between(min_support_overlap_price,
+                                                                            max_support_overlap_price)
             if not resistance_overlaps and support > minimum_price:
                 final_resistance_list.append(support)
+                final_resistance_levels.add(support)
 
         resistance_prices = [PriceRecord(position_side=position_side, price=price)
                              for price in final_resistance_list if price <= maximum_symbol_price]
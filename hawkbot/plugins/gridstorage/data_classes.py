@@ -1,4 +1,7 @@
 from dataclasses import dataclass
+from typing import List
+
+import numpy as np
 
 from hawkbot.core.data_classes import PositionSide
 from hawkbot.core.model import Timeframe
@@ -20,3 +23,24 @@ class QuantityRecord:
 class PriceRecord:
     position_side: PositionSide
     price: float
+
+
+@dataclass
+class QuantityColumns:
+    quantity: np.ndarray
+    accumulated_quantity: np.ndarray
+    raw_quantity: np.ndarray
+
+    @classmethod
+    def empty(cls) -> 'QuantityColumns':
+        return cls(quantity=np.empty(0), accumulated_quantity=np.empty(0), raw_quantity=np.empty(0))
+
+    def merged(self, quantities: List[QuantityRecord]) -> 'QuantityColumns':
+        quantity = np.concatenate((self.quantity, [record.quantity for record in quantities]))
+        accumulated_quantity = np.concatenate((self.accumulated_quantity,
+                                               [record.accumulated_quantity for record in quantities]))
+        raw_quantity = np.concatenate((self.raw_quantity, [record.raw_quantity for record in quantities]))
+        order = np.argsort(quantity, kind='stable')
+        return QuantityColumns(quantity=quantity[order],
+                               accumulated_quantity=accumulated_quantity[order],
+                               raw_quantity=raw_quantity[order])
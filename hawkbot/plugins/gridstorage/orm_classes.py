@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, Float
+from sqlalchemy import Column, Integer, String, Float, Index
 from sqlalchemy.ext.declarative import declarative_base
 
 _GRID_DECL_BASE = declarative_base()
@@ -6,6 +6,7 @@ _GRID_DECL_BASE = declarative_base()
 
 class QuantityGrid(_GRID_DECL_BASE):
     __tablename__ = 'QUANTITY_GRID'
+    __table_args__ = (Index('idx_quantity_grid_symbol_position_side', 'symbol', 'position_side'),)
     id = Column(Integer, primary_key=True)
     symbol = Column(String)
     position_side = Column(String)
@@ -16,6 +17,7 @@ class QuantityGrid(_GRID_DECL_BASE):
 
 class PriceGrid(_GRID_DECL_BASE):
     __tablename__ = 'PRICE_GRID'
+    __table_args__ = (Index('idx_price_grid_symbol_position_side', 'symbol', 'position_side'),)
     id = Column(Integer, primary_key=True)
     symbol = Column(String)
     position_side = Column(String)
@@ -24,6 +26,7 @@ class PriceGrid(_GRID_DECL_BASE):
 
 class RootPrice(_GRID_DECL_BASE):
     __tablename__ = 'ROOT_PRICE'
+    __table_args__ = (Index('idx_root_price_symbol_position_side', 'symbol', 'position_side'),)
     id = Column(Integer, primary_key=True)
     symbol = Column(String)
     position_side = Column(String)
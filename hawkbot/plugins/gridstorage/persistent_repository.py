@@ -1,19 +1,26 @@
 import logging
 import os
-from typing import List
+from typing import List, Dict
 
-from sqlalchemy import create_engine, MetaData
-from sqlalchemy.exc import NoResultFound
+import numpy as np
+from sqlalchemy import create_engine, MetaData, select, insert, delete
 
 from hawkbot.core.lockable_session import LockableSession
 from hawkbot.core.model import PositionSide
-from hawkbot.plugins.gridstorage.data_classes import QuantityRecord, PriceRecord
+from hawkbot.plugins.gridstorage.data_classes import QuantityRecord, PriceRecord, QuantityColumns
 from hawkbot.plugins.gridstorage.orm_classes import QuantityGrid, PriceGrid, RootPrice, _GRID_DECL_BASE
 
 logger = logging.getLogger(__name__)
 
 
 class PersistentRepository:
+    """
+    SQLite backed grid storage with a write-through cache. The price & quantity grids are kept in memory per symbol &
+    position side as arrays sorted on price & quantity respectively. A grid is only read from
+    the database the first time it is requested; every store & reset through this repository updates the cached grid
+    as well, so subsequent reads never hit the database.
+    """
+
     def __init__(self, database_path: str):
         os.makedirs(os.path.dirname(database_path), exist_ok=True)
         self.engine = create_engine(url=f'sqlite:///{database_path}',
@@ -23,76 +30,118 @@ class PersistentRepository:
         self.lockable_session = LockableSession(self.engine)
         with self.lockable_session:
             _GRID_DECL_BASE.metadata.create_all(self.engine, checkfirst=True)
+            # create_all does not add indexes to tables that already existed before the indexes were introduced
+            for table in _GRID_DECL_BASE.metadata.sorted_tables:
+                for index in table.indexes:
+                    index.create(bind=self.engine, checkfirst=True)
+
+        self.quantities_cache: Dict[str, Dict[PositionSide, QuantityColumns]] = {}
+        self.prices_cache: Dict[str, Dict[PositionSide, np.ndarray]] = {}
+        self.root_price_cache: Dict[str, Dict[PositionSide, float]] = {}
 
     def store_quantities(self, symbol: str, quantities: List[QuantityRecord]):
         logger.debug(f'Adding quantities list for symbol {symbol}')
         with self.lockable_session as session:
-            for record in quantities:
-                quantity_record = QuantityGrid(symbol=symbol,
-                                               position_side=record.position_side.name,
-                                               quantity=record.quantity,
-                                               accumulated_quantity=record.accumulated_quantity,
-                                               raw_quantity=record.raw_quantity)
-                session.add(quantity_record)
+            session.execute(insert(QuantityGrid), [{"symbol": symbol,
+                                                    "position_side": record.position_side.name,
+                                                    "quantity": record.quantity,
+                                                    "accumulated_quantity": record.accumulated_quantity,
+                                                    "raw_quantity": record.raw_quantity} for record in quantities])
             session.commit()
+            for position_side in set([record.position_side for record in quantities]):
+                if position_side in self.quantities_cache.get(symbol, {}):
+                    side_quantities = [record for record in quantities if record.position_side == position_side]
+                    self.quantities_cache[symbol][position_side] = \
+                        self.quantities_cache[symbol][position_side].merged(side_quantities)
         logger.debug(f'Stored quantity grid {symbol}')
 
     def get_quantities(self, symbol: str, position_side: PositionSide) -> List[QuantityRecord]:
-        quantities_grid: List[QuantityRecord] = []
+        try:
+            columns = self.quantities_cache[symbol][position_side]
+        except KeyError:
+            columns = self._load_quantities(symbol=symbol, position_side=position_side)
+        return [QuantityRecord(position_side=position_side,
+                               quantity=quantity,
+                               accumulated_quantity=accumulated_quantity,
+                               raw_quantity=raw_quantity)
+                for quantity, accumulated_quantity, raw_quantity in zip(columns.quantity.tolist(),
+                                                                        columns.accumulated_quantity.tolist(),
+                                                                        columns.raw_quantity.tolist())]
+
+    def _load_quantities(self, symbol: str, position_side: PositionSide) -> QuantityColumns:
         with self.lockable_session as session:
-            for record in session.query(QuantityGrid) \
-                    .filter(QuantityGrid.symbol == symbol) \
-                    .filter(QuantityGrid.position_side == position_side.name) \
-                    .order_by(QuantityGrid.quantity):
-                quantities_grid.append(QuantityRecord(position_side=PositionSide[record.position_side],
-                                                      quantity=record.quantity,
-                                                      accumulated_quantity=record.accumulated_quantity,
-                                                      raw_quantity=record.raw_quantity))
-        quantities_grid.sort(key=lambda x: x.quantity)
-        return quantities_grid
+            rows = session.execute(select(QuantityGrid.quantity,
+                                          QuantityGrid.accumulated_quantity,
+                                          QuantityGrid.raw_quantity)
+                                   .where(QuantityGrid.symbol == symbol)
+                                   .where(QuantityGrid.position_side == position_side.name)
+                                   .order_by(QuantityGrid.quantity)).all()
+            if len(rows) == 0:
+                columns = QuantityColumns.empty()
+            else:
+                quantity, accumulated_quantity, raw_quantity = np.array(rows, dtype=float).T
+                columns = QuantityColumns(quantity=quantity,
+                                          accumulated_quantity=accumulated_quantity,
+                                          raw_quantity=raw_quantity)
+            self.quantities_cache.setdefault(symbol, {})[position_side] = columns
+            return columns
 
     def store_prices(self, symbol: str, prices_records: List[PriceRecord]):
         logger.debug(f'Adding prices list for symbol {symbol}')
         with self.lockable_session as session:
-            for record in prices_records:
-                price_record = PriceGrid(symbol=symbol,
-                                         position_side=record.position_side.name,
-                                         price=record.price)
-                session.add(price_record)
+            session.execute(insert(PriceGrid), [{"symbol": symbol,
+                                                 "position_side": record.position_side.name,
+                                                 "price": record.price} for record in prices_records])
             session.commit()
+            for position_side in set([record.position_side for record in prices_records]):
+                if position_side in self.prices_cache.get(symbol, {}):
+                    side_prices = [record.price for record in prices_records if record.position_side == position_side]
+                    self.prices_cache[symbol][position_side] = \
+                        np.sort(np.concatenate((self.prices_cache[symbol][position_side], side_prices)))
         logger.debug(f'Stored price grid {symbol}')
 
     def get_prices(self, symbol: str, position_side: PositionSide) -> List[float]:
-        prices_grid = []
+        try:
+            prices = self.prices_cache[symbol][position_side]
+        except KeyError:
+            prices = self._load_prices(symbol=symbol, position_side=position_side)
+        return prices.tolist()
+
+    def _load_prices(self, symbol: str, position_side: PositionSide) -> np.ndarray:
         with self.lockable_session as session:
-            for entry in session \
-                    .query(PriceGrid) \
-                    .filter(PriceGrid.symbol == symbol) \
-                    .filter(PriceGrid.position_side == position_side.name) \
-                    .order_by(PriceGrid.price):
-                prices_grid.append(entry.price)
-        return prices_grid
+            rows = session.execute(select(PriceGrid.price)
+                                   .where(PriceGrid.symbol == symbol)
+                                   .where(PriceGrid.position_side == position_side.name)
+                                   .order_by(PriceGrid.price)).scalars().all()
+            prices = np.array(rows, dtype=float)
+            self.prices_cache.setdefault(symbol, {})[position_side] = prices
+            return prices
 
     def get_root_price(self, symbol: str, position_side: PositionSide) -> float:
+        try:
+            return self.root_price_cache[symbol][position_side]
+        except KeyError:
+            pass
+
         with self.lockable_session as session:
-            try:
-                root_price = session \
-                    .query(RootPrice) \
-                    .filter(RootPrice.symbol == symbol) \
-                    .filter(RootPrice.position_side == position_side.name) \
-                    .one()
-                return root_price.price
-            except NoResultFound:
-                return None
+            root_price = session.execute(select(RootPrice.price)
+                                         .where(RootPrice.symbol == symbol)
+                                         .where(RootPrice.position_side == position_side.name)
+                                         .order_by(RootPrice.id.desc())).scalars().first()
+            self.root_price_cache.setdefault(symbol, {})[position_side] = root_price
+            return root_price
 
     def store_root_price(self, symbol: str, position_side: PositionSide, price: float):
         logger.debug(f'Adding root price for symbol {symbol} {position_side.name}: {price}')
         with self.lockable_session as session:
-            root_price = RootPrice(symbol=symbol,
-                                   position_side=position_side.name,
-                                   price=price)
-            session.add(root_price)
+            session.execute(delete(RootPrice)
+                            .where(RootPrice.symbol == symbol)
+                            .where(RootPrice.position_side == position_side.name))
+            session.execute(insert(RootPrice).values(symbol=symbol,
+                                                     position_side=position_side.name,
+                                                     price=price))
             session.commit()
+            self.root_price_cache.setdefault(symbol, {})[position_side] = price
         logger.debug(f'Stored root price {symbol} {position_side.name}: {price}')
 
     def reset(self, symbol: str, position_side: PositionSide):
@@ -104,29 +153,29 @@ class PersistentRepository:
     def reset_root_price(self, symbol: str, position_side: PositionSide):
         logger.debug(f'Resetting root price for symbol {symbol} for {position_side.name}')
         with self.lockable_session as session:
-            root_price_query = session.query(RootPrice) \
-                .filter(RootPrice.symbol == symbol) \
-                .filter(RootPrice.position_side == position_side.name)
-            root_price_query.delete(synchronize_session=False)
+            session.execute(delete(RootPrice)
+                            .where(RootPrice.symbol == symbol)
+                            .where(RootPrice.position_side == position_side.name))
             session.commit()
+            self.root_price_cache.setdefault(symbol, {})[position_side] = None
         logger.debug(f'Reset root price for {symbol} for {position_side.name}')
 
     def reset_prices(self, symbol: str, position_side: PositionSide):
         logger.debug(f'Resetting prices for symbol {symbol} for {position_side.name}')
         with self.lockable_session as session:
-            count = session.query(PriceGrid) \
-                .filter(PriceGrid.symbol == symbol) \
-                .filter(PriceGrid.position_side == position_side.name) \
-                .delete(synchronize_session=False)
+            count = session.execute(delete(PriceGrid)
+                                    .where(PriceGrid.symbol == symbol)
+                                    .where(PriceGrid.position_side == position_side.name)).rowcount
             session.commit()
+            self.prices_cache.setdefault(symbol, {})[position_side] = np.empty(0)
             logger.debug(f'Reset price grid for {symbol} for {position_side.name}: {count} records deleted')
 
     def reset_quantities(self, symbol: str, position_side: PositionSide):
         logger.debug(f'Resetting quantities for symbol {symbol} for {position_side.name}')
         with self.lockable_session as session:
-            quantity_query = session.query(QuantityGrid) \
-                .filter(QuantityGrid.symbol == symbol) \
-                .filter(QuantityGrid.position_side == position_side.name)
-            quantity_query.delete(synchronize_session=False)
+            session.execute(delete(QuantityGrid)
+                            .where(QuantityGrid.symbol == symbol)
+                            .where(QuantityGrid.position_side == position_side.name))
             session.commit()
+            self.quantities_cache.setdefault(symbol, {})[position_side] = QuantityColumns.empty()
         logger.debug(f'Reset quantity grid for {symbol} for {position_side.name}')
@@ -6,9 +6,10 @@ from hawkbot.core.data_classes import ExchangeState
 from hawkbot.core.model import Position, SymbolInformation, Order, LimitOrder, OrderTypeIdentifier, Side, PositionSide, \
     OrderStatus, TimeInForce
 from hawkbot.core.orderbook.orderbook import OrderBook
+from hawkbot.core.orderbook.orderbook_histogram import OrderbookHistograms, get_orderbook_histograms
 from hawkbot.exceptions import UnsupportedParameterException
 from hawkbot.core.plugins.plugin import Plugin
-from hawkbot.utils import round_, round_dn, calc_min_qty, round_up, parse_histogram
+from hawkbot.utils import round_, round_dn, calc_min_qty, round_up
 
 logger = logging.getLogger(__name__)
 
@@ -32,6 +33,7 @@ class ObTpPlugin(Plugin):
         super().__init__(name=name, plugin_loader=plugin_loader, plugin_config=plugin_config, redis_host=redis_host, redis_port=redis_port)
         self.orderbook: OrderBook = None  # Injected by framework
         self.exchange_state: ExchangeState = None  # Injected by framework
+        self.histograms: OrderbookHistograms = get_orderbook_histograms()
 
     def parse_config(self, obtp_dict: Dict) -> ObTpConfig:
         obtp_config = ObTpConfig()
@@ -139,21 +141,13 @@ class ObTpPlugin(Plugin):
                    bottom_price: float,
                    symbol_information: SymbolInformation) -> List[float]:
         if position_side == PositionSide.LONG:
-            bids = self.orderbook.get_bids(symbol)[:obtp_config.depth]
-            levels = parse_histogram(bids, nr_bins=obtp_config.nr_bins)
-            levels.sort(key=lambda x: x[1], reverse=True)
-            tp_prices = [entry[0] for entry in levels]
-            tp_prices = [price for price in tp_prices if price >= bottom_price]
-            if len(tp_prices) > obtp_config.number_tp_orders:
-                tp_prices = tp_prices[0:obtp_config.number_tp_orders]
+            bid_side = self.histograms.bid_side(symbol=symbol, bids=self.orderbook.get_bids(symbol))
+            level_prices = bid_side.histogram(depth=obtp_config.depth, nr_bins=obtp_config.nr_bins).prices
+            tp_prices = level_prices[level_prices >= bottom_price][:obtp_config.number_tp_orders].tolist()
         elif position_side == PositionSide.SHORT:
-            asks = self.orderbook.get_asks(symbol)[:obtp_config.depth]
-            levels = parse_histogram(asks, nr_bins=obtp_config.nr_bins)
-            levels.sort(key=lambda x: x[1], reverse=True)
-            tp_prices = [entry[0] for entry in levels]
-            tp_prices = [price for price in tp_prices if price <= bottom_price]
-            if len(tp_prices) > obtp_config.number_tp_orders:
-                tp_prices = tp_prices[0:obtp_config.number_tp_orders]
+            ask_side = self.histograms.ask_side(symbol=symbol, asks=self.orderbook.get_asks(symbol))
+            level_prices = ask_side.histogram(depth=obtp_config.depth, nr_bins=obtp_config.nr_bins).prices
+            tp_prices = level_prices[level_prices <= bottom_price][:obtp_config.number_tp_orders].tolist()
         else:
             raise UnsupportedParameterException(f'{symbol}: Received unsupported position side {position_side}')
 
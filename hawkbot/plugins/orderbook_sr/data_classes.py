@@ -22,37 +22,22 @@ class Bids:
         self.levels.append(Level(price=price, quantity=quantity))
 
     def closest_level(self) -> Level:
-        max_price = max([level.price for level in self.levels])
-        for level in self.levels:
-            if level.price == max_price:
-                return level
-        return None
+        return max(self.levels, key=lambda level: level.price, default=None)
 
     @property
     def closest_price(self) -> float:
         return self.closest_level().price
 
+    def strongest_level(self) -> Level:
+        return max(self.levels, key=lambda level: level.quantity, default=None)
+
     @property
     def strongest_price(self) -> float:
-        max_level: Level = None
-        for level in self.levels:
-            if max_level is None:
-                max_level = level
-            elif level.quantity > max_level.quantity:
-                max_level = level
-
-        return max_level.price
+        return self.strongest_level().price
 
     @property
     def strongest_quantity(self) -> float:
-        max_level: Level = None
-        for level in self.levels:
-            if max_level is None:
-                max_level = level
-            elif level.quantity > max_level.quantity:
-                max_level = level
-
-        return max_level.quantity
+        return self.strongest_level().quantity
 
     @property
     def strongest_prices(self) -> List[float]:
@@ -75,37 +60,22 @@ class Asks:
         self.levels.append(Level(price=price, quantity=quantity))
 
     def closest_level(self) -> Level:
-        min_price = min([level.price for level in self.levels])
-        for level in self.levels:
-            if level.price == min_price:
-                return level
-        return None
+        return min(self.levels, key=lambda level: level.price, default=None)
 
     @property
     def closest_price(self) -> float:
         return self.closest_level().price
 
+    def strongest_level(self) -> Level:
+        return max(self.levels, key=lambda level: level.quantity, default=None)
+
     @property
     def strongest_price(self) -> float:
-        max_level: Level = None
-        for level in self.levels:
-            if max_level is None:
-                max_level = level
-            elif level.quantity > max_level.quantity:
-                max_level = level
-
-        return max_level.price
+        return self.strongest_level().price
 
     @property
     def strongest_quantity(self) -> float:
-        max_level: Level = None
-        for level in self.levels:
-            if max_level is None:
-                max_level = level
-            elif level.quantity > max_level.quantity:
-                max_level = level
-
-        return max_level.quantity
+        return self.strongest_level().quantity
 
     @property
     def strongest_prices(self) -> List[float]:
@@ -1,10 +1,11 @@
 import logging
+from typing import Tuple
 
 from hawkbot.core.model import PositionSide
 from hawkbot.core.orderbook.orderbook import OrderBook
+from hawkbot.core.orderbook.orderbook_histogram import OrderbookHistograms, get_orderbook_histograms
 from hawkbot.plugins.orderbook_sr.data_classes import SupportResistance, Bids, Asks
 from hawkbot.core.plugins.plugin import Plugin
-from hawkbot.utils import parse_histogram
 
 logger = logging.getLogger(__name__)
 
@@ -17,31 +18,26 @@ class OrderbookSrPlugin(Plugin):
     def __init__(self, name: str, plugin_loader, plugin_config, redis_host: str, redis_port: int) -> None:
         super().__init__(name=name, plugin_loader=plugin_loader, plugin_config=plugin_config, redis_host=redis_host, redis_port=redis_port)
         self.orderbook: OrderBook = None  # Injected by framework
+        self.histograms: OrderbookHistograms = get_orderbook_histograms()
 
     def calculate_support_resistances(self,
                                       symbol: str,
                                       position_side: PositionSide,
                                       depth: int,
                                       nr_bins: int) -> SupportResistance:
-        all_bids = self.orderbook.get_bids(symbol)
-        bids = all_bids[:depth]
-        all_asks = self.orderbook.get_asks(symbol)
-        asks = all_asks[:depth]
+        bid_side = self.histograms.bid_side(symbol=symbol, bids=self.orderbook.get_bids(symbol))
+        ask_side = self.histograms.ask_side(symbol=symbol, asks=self.orderbook.get_asks(symbol))
         binned_asks = Asks()
         binned_bids = Bids()
 
-        if len(bids) == 0 and len(asks) == 0:
+        if min(depth, len(bid_side)) == 0 and min(depth, len(ask_side)) == 0:
             logger.warning(f'{symbol} {position_side.name}: There are 0 bids and 0 asks within depth {depth}, '
-                           f'the total nr of bids is {len(all_bids)} and the total nr of asks is {len(all_asks)}')
+                           f'the total nr of bids is {len(bid_side)} and the total nr of asks is {len(ask_side)}')
         else:
-            original_supports = parse_histogram(bids, nr_bins=nr_bins)
-            original_supports.sort(key=lambda x: x[1], reverse=True)
-            for price, quantity in original_supports:
+            for price, quantity in bid_side.histogram(depth=depth, nr_bins=nr_bins).levels():
                 binned_bids.append(price=price, quantity=quantity)
 
-            original_resistances = parse_histogram(asks, nr_bins=nr_bins)
-            original_resistances.sort(key=lambda x: x[1], reverse=True)
-            for price, quantity in original_resistances:
+            for price, quantity in ask_side.histogram(depth=depth, nr_bins=nr_bins).levels():
                 binned_asks.append(price=price, quantity=quantity)
 
         support_resistance = SupportResistance(supports=binned_bids, resistances=binned_asks)
@@ -54,3 +50,11 @@ class OrderbookSrPlugin(Plugin):
         #             f'All bids:\n {all_bids}\n\n'
         #             f'All asks:\n {all_asks}')
         return support_resistance
+
+    def depth_within(self, symbol: str, distance: float) -> Tuple[float, float]:
+        """
+        Returns the total bid & ask quantity within `distance` (as a fraction) of the best bid & best ask respectively
+        """
+        bid_side = self.histograms.bid_side(symbol=symbol, bids=self.orderbook.get_bids(symbol))
+        ask_side = self.histograms.ask_side(symbol=symbol, asks=self.orderbook.get_asks(symbol))
+        return bid_side.cumulative_quantity(distance), ask_side.cumulative_quantity(distance)
@@ -1,27 +1,30 @@
 from sqlalchemy import MetaData, Table, Column, Integer, DateTime, func, String, Float, Index
 
+SCORES_TABLE = 'scores'
 
-def create_score_table(symbol: str, metadata: MetaData):
-    identifier = get_score_table_identifier(symbol)
-    return Table(identifier,
+
+def create_scores_table(metadata: MetaData):
+    return Table(SCORES_TABLE,
                  metadata,
-                 Column('id', Integer, primary_key=True),
+                 Column('exchange', String, primary_key=True),
+                 Column('symbol', String, primary_key=True),
+                 Column('timestamp', Integer, primary_key=True),
                  Column('registration_datetime', DateTime, default=func.now()),
-                 Column('exchange', String, index=True),
-                 Column('symbol', String, index=True),
-                 Column('timestamp', Integer, index=True),
                  Column('price', Float),
                  Column('score', Float),
                  Column('power', Float),
                  Column('nr_bins', Integer),
                  Column('depth', Integer),
                  Column('threshold', Float),
-                 Index(f'idx_{identifier}_1', 'exchange', 'symbol'),
-                 Index(f'idx_{identifier}_2', 'exchange', 'symbol', 'timestamp', unique=True),
-                 Index(f'idx_{identifier}_3', 'exchange', 'timestamp'),
+                 # covering index for the score queries, which filter on nr_bins & depth and order by timestamp
+                 Index(f'idx_{SCORES_TABLE}_lookup', 'exchange', 'symbol', 'nr_bins', 'depth', 'timestamp', 'price',
+                       'score', 'power'),
                  extend_existing=True
                  )
 
 
-def get_score_table_identifier(symbol: str) -> str:
-    return f'score_{symbol.replace("/", "")}'
+def is_legacy_score_table(name: str) -> bool:
+    """
+    Scores used to be stored in a separate table per symbol, named `score_<symbol>`
+    """
+    return name.startswith('score_')
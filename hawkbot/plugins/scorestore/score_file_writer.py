@@ -0,0 +1,109 @@
+import logging
+import os
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import numpy as np
+import pyarrow
+from pyarrow import parquet
+
+logger = logging.getLogger(__name__)
+
+
+class ScoreColumnBuffer:
+    """
+    Preallocated column buffers holding the scores of a single symbol & day until they are written to file.
+    """
+    schema = pyarrow.schema([('exchange', pyarrow.string()),
+                             ('symbol', pyarrow.string()),
+                             ('price', pyarrow.float64()),
+                             ('timestamp', pyarrow.int64()),
+                             ('score', pyarrow.float64()),
+                             ('power', pyarrow.float64()),
+                             ('nr_bins', pyarrow.int64()),
+                             ('depth', pyarrow.int64())])
+
+    def __init__(self, symbol: str, day: str, capacity: int):
+        self.symbol = symbol
+        self.day = day
+        self.size = 0
+        self.exchange: List[str] = []
+        self.price = np.empty(capacity, dtype=np.float64)
+        self.timestamp = np.empty(capacity, dtype=np.int64)
+        self.score = np.empty(capacity, dtype=np.float64)
+        self.power = np.empty(capacity, dtype=np.float64)
+        self.nr_bins = np.empty(capacity, dtype=np.int64)
+        self.depth = np.empty(capacity, dtype=np.int64)
+
+    @property
+    def full(self) -> bool:
+        return self.size == len(self.timestamp)
+
+    def append(self, event: Dict):
+        i = self.size
+        self.exchange.append(event['exchange'])
+        self.price[i] = event['price']
+        self.timestamp[i] = event['timestamp']
+        self.score[i] = event['score']
+        self.power[i] = event['power']
+        self.nr_bins[i] = event['nr_bins']
+        self.depth[i] = event['depth']
+        self.size += 1
+
+    def to_record_batch(self) -> pyarrow.RecordBatch:
+        n = self.size
+        return pyarrow.RecordBatch.from_arrays([pyarrow.array(self.exchange, type=pyarrow.string()),
+                                                pyarrow.array([self.symbol] * n, type=pyarrow.string()),
+                                                pyarrow.array(self.price[:n]),
+                                                pyarrow.array(self.timestamp[:n]),
+                                                pyarrow.array(self.score[:n]),
+                                                pyarrow.array(self.power[:n]),
+                                                pyarrow.array(self.nr_bins[:n]),
+                                                pyarrow.array(self.depth[:n])],
+                                               schema=self.schema)
+
+
+class ScoreFileWriter:
+    """
+    Writes the scores to an append-only parquet dataset, partitioned by symbol and (UTC) day:
+    `<persist_file_path>/<symbol>/swingpower/day=<yyyy-mm-dd>/<first timestamp>.parquet`. Scores are buffered per symbol
+    and written once `rows_per_file` scores have been collected for the symbol, when the day changes, or on flush.
+    """
+
+    def __init__(self, persist_file_path: str, rows_per_file: int):
+        self.persist_file_path = persist_file_path
+        self.rows_per_file = rows_per_file
+        self.buffers: Dict[str, ScoreColumnBuffer] = {}
+
+    def append(self, event: Dict):
+        symbol = event['symbol']
+        day = datetime.fromtimestamp(event['timestamp'] / 1000, tz=timezone.utc).strftime('%Y-%m-%d')
+        buffer = self.buffers.get(symbol)
+        if buffer is not None and buffer.day != day:
+            self.flush(symbol)
+            buffer = None
+        if buffer is None:
+            buffer = ScoreColumnBuffer(symbol=symbol, day=day, capacity=self.rows_per_file)
+            self.buffers[symbol] = buffer
+
+        buffer.append(event)
+        if buffer.full:
+            self.flush(symbol)
+
+    def flush(self, symbol: str):
+        buffer = self.buffers.pop(symbol, None)
+        if buffer is None or buffer.size == 0:
+            return
+
+        target_folder = os.path.join(self.persist_file_path, symbol, 'swingpower', f'day={buffer.day}')
+        os.makedirs(target_folder, exist_ok=True)
+        filename = os.path.join(target_folder, f'{int(buffer.timestamp[0])}.parquet')
+        parquet.write_table(pyarrow.Table.from_batches([buffer.to_record_batch()]), filename)
+        logger.info(f'Saved {buffer.size} swingpower entries to {filename}')
+
+    def flush_all(self):
+        for symbol in list(self.buffers.keys()):
+            try:
+                self.flush(symbol)
+            except Exception:
+                logger.exception(f'{symbol}: Failed to store swingpower entries')
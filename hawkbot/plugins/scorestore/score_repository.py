@@ -1,15 +1,15 @@
 import logging
 import os
-from typing import List, Dict
+from typing import List, Dict, Iterable
 
-from sqlalchemy import create_engine, MetaData, Table, and_
+from sqlalchemy import create_engine, MetaData, event, select, delete, func, text
 from sqlalchemy.dialects.sqlite import insert
 
 from hawkbot.core.lockable_session import LockableSession
 from hawkbot.core.time_provider import now
 from hawkbot.utils import readable
 from .data_classes import ScorePower
-from .orm_classes import get_score_table_identifier, create_score_table
+from .orm_classes import create_scores_table, is_legacy_score_table, SCORES_TABLE
 
 logger = logging.getLogger(__name__)
 
@@ -21,46 +21,56 @@ class ScoreRepository:
         self.engine = create_engine(url=f'sqlite:///{database_path}',
                                     echo=False,
                                     connect_args={"check_same_thread": False})
+        event.listen(self.engine, 'connect', self._configure_connection)
         self.metadata = MetaData(bind=self.engine)
         self.metadata.reflect(bind=self.engine)
-
-        self.score_tables = {}
-        for name in self.metadata.tables:
-            if name.startswith('score_'):
-                self.score_tables[name] = self.metadata.tables[name]
         self.lockable_session = LockableSession(self.engine)
 
-    def get_score_table(self, symbol: str) -> Table:
-        identifier = get_score_table_identifier(symbol=symbol)
-        try:
-            return self.score_tables[identifier]
-        except KeyError:
-            with self.lockable_session:
-                table = create_score_table(symbol=symbol,
-                                           metadata=self.metadata)
-                self.metadata.create_all(tables=[table])
-                self.score_tables[identifier] = table
-                return table
+        legacy_table_names = [name for name in self.metadata.tables if is_legacy_score_table(name)]
+        self.scores_table = create_scores_table(metadata=self.metadata)
+        self.metadata.create_all(tables=[self.scores_table])
+        if len(legacy_table_names) > 0:
+            self._migrate_legacy_tables(legacy_table_names)
 
-    def store_scores(self, events: List[Dict]):
-        symbols = set([e['symbol'] for e in events])
-        tables = {symbol: self.get_score_table(symbol=symbol) for symbol in symbols}
+    @staticmethod
+    def _configure_connection(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        cursor.execute('PRAGMA journal_mode=WAL')
+        cursor.execute('PRAGMA synchronous=NORMAL')
+        cursor.close()
+
+    def _migrate_legacy_tables(self, table_names: List[str]):
+        columns = 'exchange, symbol, timestamp, registration_datetime, price, score, power, nr_bins, depth, threshold'
         with self.lockable_session:
-            for symbol in symbols:
-                data = [{
-                    "registration_datetime": now(),
-                    "exchange": e['exchange'],
-                    "symbol": symbol,
-                    "timestamp": e['timestamp'],
-                    "price": e['price'],
-                    "score": e['score'],
-                    "power": e['power'],
-                    "nr_bins": e['nr_bins'],
-                    "depth": e['depth']
-                } for e in events if e['symbol'] == symbol]
+            for table_name in table_names:
+                try:
+                    with self.engine.begin() as con:
+                        result = con.execute(text(f'insert or ignore into {SCORES_TABLE} ({columns}) '
+                                                  f'select {columns} from "{table_name}"'))
+                        con.execute(text(f'drop table "{table_name}"'))
+                except Exception:
+                    logger.exception(f'Failed to migrate the scores from table {table_name}, leaving the table as is')
+                    continue
+                self.metadata.remove(self.metadata.tables[table_name])
+                logger.info(f'Migrated {result.rowcount} scores from table {table_name} to table {SCORES_TABLE}')
 
-                statement = insert(tables[symbol]).on_conflict_do_nothing()
-                self.engine.execute(statement, data)
+    def store_scores(self, events: List[Dict]):
+        if len(events) == 0:
+            return
+        data = [{
+            "registration_datetime": now(),
+            "exchange": e['exchange'],
+            "symbol": e['symbol'],
+            "timestamp": e['timestamp'],
+            "price": e['price'],
+            "score": e['score'],
+            "power": e['power'],
+            "nr_bins": e['nr_bins'],
+            "depth": e['depth']
+        } for e in events]
+        with self.lockable_session:
+            with self.engine.begin() as con:
+                con.execute(insert(self.scores_table).on_conflict_do_nothing(), data)
 
     def get_scores(self,
                    exchange: str,
@@ -69,35 +79,18 @@ class ScoreRepository:
                    end_timestamp: int,
                    nr_bins: int,
                    depth: int) -> List[ScorePower]:
-        table_name = self.get_score_table(symbol=symbol).name
-        scores = []
+        table = self.scores_table
+        query = select(table.c.timestamp, table.c.price, table.c.score, table.c.power, table.c.nr_bins,
+                       table.c.depth) \
+            .where(table.c.exchange == exchange) \
+            .where(table.c.symbol == symbol) \
+            .where(table.c.nr_bins == nr_bins) \
+            .where(table.c.depth == depth) \
+            .where(table.c.timestamp >= from_timestamp) \
+            .where(table.c.timestamp <= end_timestamp) \
+            .order_by(table.c.timestamp)
         with self.engine.connect() as con:
-            query = f"""
-             select timestamp,
-                    price,
-                    score,
-                    power,
-                    nr_bins,
-                    depth
-               from {table_name}
-              where exchange='{exchange}'
-                and timestamp >= {from_timestamp}
-                and timestamp <= {end_timestamp}
-                and nr_bins = {nr_bins}
-                and depth = {depth}
-                order by timestamp
-            """
-
-            rs = con.execute(query)
-            rows = rs.fetchall()
-            for row in rows:
-                scores.append(ScorePower(timestamp=row.timestamp,
-                                         price=row.price,
-                                         score=row.score,
-                                         power=row.power,
-                                         nr_bins=row.nr_bins,
-                                         depth=row.depth))
-        return scores
+            return [self._to_score_power(row) for row in con.execute(query).fetchall()]
 
     def get_last_scores(self,
                         exchange: str,
@@ -105,48 +98,59 @@ class ScoreRepository:
                         count: int,
                         nr_bins: int,
                         depth: int) -> List[ScorePower]:
-        table_name = self.get_score_table(symbol=symbol).name
-        scores = []
-        with self.engine.connect() as con:
-            query = f"""
-             select timestamp,
-                    price,
-                    score,
-                    power,
-                    nr_bins,
-                    depth
-               from {table_name}
-              where exchange='{exchange}'
-                and nr_bins = {nr_bins}
-                and depth = {depth}
-                order by timestamp
-                limit {count}
-            """
+        return self.get_last_scores_for_symbols(exchange=exchange,
+                                                symbols=[symbol],
+                                                count=count,
+                                                nr_bins=nr_bins,
+                                                depth=depth)[symbol]
+
+    def get_last_scores_for_symbols(self,
+                                    exchange: str,
+                                    symbols: Iterable[str],
+                                    count: int,
+                                    nr_bins: int,
+                                    depth: int) -> Dict[str, List[ScorePower]]:
+        """
+        Returns the latest `count` scores for each of the symbols in a single query, ordered by timestamp ascending
+        """
+        symbols = list(symbols)
+        table = self.scores_table
+        row_number = func.row_number().over(partition_by=table.c.symbol, order_by=table.c.timestamp.desc())
+        ranked = select(table.c.symbol, table.c.timestamp, table.c.price, table.c.score, table.c.power,
+                        table.c.nr_bins, table.c.depth, row_number.label('row_number')) \
+            .where(table.c.exchange == exchange) \
+            .where(table.c.symbol.in_(symbols)) \
+            .where(table.c.nr_bins == nr_bins) \
+            .where(table.c.depth == depth) \
+            .subquery()
+        query = select(ranked) \
+            .where(ranked.c.row_number <= count) \
+            .order_by(ranked.c.symbol, ranked.c.timestamp)
 
-            rs = con.execute(query)
-            rows = rs.fetchall()
-            for row in rows:
-                scores.append(ScorePower(timestamp=row.timestamp,
-                                         price=row.price,
-                                         score=row.score,
-                                         power=row.power,
-                                         nr_bins=row.nr_bins,
-                                         depth=row.depth))
+        scores = {symbol: [] for symbol in symbols}
+        with self.engine.connect() as con:
+            for row in con.execute(query).fetchall():
+                scores[row.symbol].append(self._to_score_power(row))
         return scores
 
+    @staticmethod
+    def _to_score_power(row) -> ScorePower:
+        return ScorePower(timestamp=row.timestamp,
+                          price=row.price,
+                          score=row.score,
+                          power=row.power,
+                          nr_bins=row.nr_bins,
+                          depth=row.depth)
+
     def delete_scores(self, exchange: str, symbol: str, to_timestamp: int):
         logger.debug(f'{symbol}: Removing all scores with a timestamp at or before {readable(to_timestamp)}')
-        table = self.get_score_table(symbol=symbol)
-        with self.lockable_session as session:
-            query = session.query(table).filter(
-                and_(
-                    table.columns.exchange == exchange,
-                    table.columns.symbol == symbol,
-                    table.columns.timestamp <= to_timestamp
-                )
-            )
-            count = query.delete(synchronize_session=False)
-            session.commit()
+        table = self.scores_table
+        with self.lockable_session:
+            with self.engine.begin() as con:
+                count = con.execute(delete(table)
+                                    .where(table.c.exchange == exchange)
+                                    .where(table.c.symbol == symbol)
+                                    .where(table.c.timestamp <= to_timestamp)).rowcount
             if count > 0:
                 logger.debug(f'{symbol}: Removed {count} scores with a timestamp at or before '
                              f'{readable(to_timestamp)}')
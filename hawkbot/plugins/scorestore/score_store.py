@@ -1,18 +1,16 @@
 import logging
 import os
 import threading
+from collections import deque
+from itertools import islice
 from queue import Empty, Queue
-from typing import List, Dict
-
-import pandas as pd
-import pyarrow
-from pandas import DataFrame, concat
-from pyarrow import parquet
+from typing import List, Dict, Deque
 
 from hawkbot.core.model import BotStatus
 from hawkbot.core.time_provider import TimeProvider
 from hawkbot.core.plugins.plugin import Plugin
 from hawkbot.plugins.scorestore.data_classes import ScorePower
+from hawkbot.plugins.scorestore.score_file_writer import ScoreFileWriter
 from hawkbot.plugins.scorestore.score_repository import ScoreRepository
 from hawkbot.utils import readable
 
@@ -35,7 +33,16 @@ class ScoreStorePlugin(Plugin):
         self.persist_queue: Queue = Queue()
         self.status: BotStatus = BotStatus.NEW
 
-        self.cache: Dict[str, List[ScorePower]] = {}
+        self.persist_batch_size: int = 1000
+        if 'persist_batch_size' in plugin_config:
+            self.persist_batch_size = plugin_config['persist_batch_size']
+
+        # the maximum number of seconds stop() waits for the queued scores to be persisted
+        self.persist_stop_timeout_s: float = 30
+        if 'persist_stop_timeout_s' in plugin_config:
+            self.persist_stop_timeout_s = plugin_config['persist_stop_timeout_s']
+
+        self.cache: Dict[str, Deque[ScorePower]] = {}
         self.cache_period: Dict[str, int] = {}
         self.cache_update_lock: threading.RLock = threading.RLock()
         self.cache_initialized: Dict[str, bool] = {}
@@ -48,7 +55,8 @@ class ScoreStorePlugin(Plugin):
             self.persist_to_file = plugin_config['persist_to_file']
             logger.info(f'Enabled persisting scorepower to {self.persist_file_path}')
         self.scorepower_length_threshold = 10_000
-        self.scorepower_df: Dict[str, DataFrame] = {}
+        self.score_file_writer = ScoreFileWriter(persist_file_path=self.persist_file_path,
+                                                 rows_per_file=self.scorepower_length_threshold)
 
     def start(self):
         if self.started is False:
@@ -58,61 +66,48 @@ class ScoreStorePlugin(Plugin):
 
     def stop(self):
         super().stop()
-
-        for symbol, df in self.scorepower_df.items():
-            try:
-                self.save_swingpower_dataframe(symbol=symbol, df=df)
-            except:
-                logger.info(f'{symbol}: Failed to store scorepower dataframe on shutdown')
-
         self.persist_queue.put(BotStatus.STOPPING)
+        if self.persist_thread.is_alive():
+            self.persist_thread.join(timeout=self.persist_stop_timeout_s)
+            if self.persist_thread.is_alive():
+                logger.warning(f'The score persisting thread did not finish within {self.persist_stop_timeout_s}s, '
+                               f'{self.persist_queue.qsize()} queued scores are not persisted')
 
     def persist_scores(self):
         self.status = BotStatus.RUNNING
-        while self.status == BotStatus.RUNNING:
+        stopping = False
+        while self.status == BotStatus.RUNNING and stopping is False:
+            events = []
             event = self.persist_queue.get(block=True)
-            if event == BotStatus.STOPPING:
-                break
-            events = [event]
+            while True:
+                if event == BotStatus.STOPPING:
+                    stopping = True
+                    break
+                events.append(event)
+                if len(events) >= self.persist_batch_size:
+                    break
+                try:
+                    event = self.persist_queue.get_nowait()
+                except Empty:
+                    break
+
+            if len(events) == 0:
+                continue
+
             try:
-                events.append(self.persist_queue.get_nowait())
-            except Empty:
-                pass
+                self.repository.store_scores(events)
+            except Exception:
+                logger.exception(f'Failed to store {len(events)} scores in the database')
 
-            self.repository.store_scores(events)
             if self.persist_to_file is True:
                 for e in events:
-                    self.scorepower_df.setdefault(e['symbol'], DataFrame(columns=['exchange',
-                                                                                  'symbol',
-                                                                                  'price',
-                                                                                  'score',
-                                                                                  'power',
-                                                                                  'nr_bins', 'depth']))
-                    new_row = pd.DataFrame(data=e,
-                                           index=[e['timestamp']])
-                    new_df = concat([self.scorepower_df[e['symbol']], new_row])
-                    if len(new_df.index) >= self.scorepower_length_threshold:
-                        self.scorepower_df[e['symbol']] = DataFrame(columns=['exchange',
-                                                                             'symbol',
-                                                                             'price',
-                                                                             'score',
-                                                                             'power',
-                                                                             'nr_bins',
-                                                                             'depth'])
-                        self.save_swingpower_dataframe(symbol=e['symbol'], df=new_df)
-                    else:
-                        self.scorepower_df[e['symbol']] = new_df
+                    self.score_file_writer.append(e)
 
+        if self.persist_to_file is True:
+            self.score_file_writer.flush_all()
         logger.info(f'Stopped score persisting thread')
         self.status = BotStatus.STOPPED
 
-    def save_swingpower_dataframe(self, symbol: str, df: DataFrame):
-        table = pyarrow.Table.from_pandas(df)
-        target_folder = os.path.join(self.persist_file_path, symbol, 'swingpower')
-        parquet.write_to_dataset(table, target_folder)
-        logger.info(f'Saved swingpower dataframe after {len(df.index)} entries to dataset'
-                    f' {target_folder}')
-
     def store_score(self,
                     exchange: str,
                     symbol: str,
@@ -132,23 +127,21 @@ class ScoreStorePlugin(Plugin):
                                 'depth': depth})
 
         with self.cache_update_lock:
-            self.cache.setdefault(symbol, [])
+            cache = self.cache.setdefault(symbol, deque())
             if self.cache_initialized.setdefault(symbol, False) is False:
                 return
 
-            self.cache[symbol].append(ScorePower(timestamp=timestamp,
-                                                 price=price,
-                                                 score=score,
-                                                 power=power,
-                                                 nr_bins=nr_bins,
-                                                 depth=depth))
+            cache.append(ScorePower(timestamp=timestamp,
+                                    price=price,
+                                    score=score,
+                                    power=power,
+                                    nr_bins=nr_bins,
+                                    depth=depth))
 
             try:
                 remove_cache_before = self.time_provider.get_utc_now_timestamp() - self.cache_period[symbol]
-                for i, score in enumerate(self.cache[symbol]):
-                    if score.timestamp >= remove_cache_before:
-                        break
-                self.cache[symbol] = self.cache[symbol][i:]
+                while len(cache) > 0 and cache[0].timestamp < remove_cache_before:
+                    cache.popleft()
             except KeyError:
                 logger.warning(f'{symbol}: No cache period detected (yet), so the cache is not purged of old entries. '
                                f'This can happen during startup, and is expected to correct automatically. If this '
@@ -165,7 +158,7 @@ class ScoreStorePlugin(Plugin):
         self.cache_period.setdefault(symbol, 0)
         self.cache_period[symbol] = max(self.cache_period[symbol], now - from_timestamp)
 
-        self.cache.setdefault(symbol, [])
+        self.cache.setdefault(symbol, deque())
         self.cache_initialized.setdefault(symbol, False)
 
         if self.cache_initialized[symbol] is False:
@@ -176,20 +169,17 @@ class ScoreStorePlugin(Plugin):
                                                     end_timestamp=now,
                                                     nr_bins=nr_bins,
                                                     depth=depth)
-                self.cache[symbol] = scores
+                self.cache[symbol] = deque(scores)
                 logger.info(f'{symbol}: Initialized scores cache')
                 self.cache_initialized[symbol] = True
-        if count is None:
-            return self.cache[symbol]
-        else:
-            return self.cache[symbol][-count:]
+        return self._cached_scores(symbol=symbol, count=count)
 
     def get_last_score_powers(self, exchange, symbol, count, nr_bins, depth) -> List[ScorePower]:
         now = self.time_provider.get_utc_now_timestamp()
         self.cache_period.setdefault(symbol, 0)
         self.cache_period[symbol] = max(self.cache_period[symbol], now - (count * 2000))
 
-        self.cache.setdefault(symbol, [])
+        self.cache.setdefault(symbol, deque())
         self.cache_initialized.setdefault(symbol, False)
 
         if self.cache_initialized[symbol] is False:
@@ -199,7 +189,14 @@ class ScoreStorePlugin(Plugin):
                                                          count=count,
                                                          nr_bins=nr_bins,
                                                          depth=depth)
-                self.cache[symbol] = scores
+                self.cache[symbol] = deque(scores)
                 logger.info(f'{symbol}: Initialized scores cache with {len(scores)} entries')
                 self.cache_initialized[symbol] = True
-        return self.cache[symbol][-count:]
+        return self._cached_scores(symbol=symbol, count=count)
+
+    def _cached_scores(self, symbol: str, count: int = None) -> List[ScorePower]:
+        with self.cache_update_lock:
+            cache = self.cache[symbol]
+            if count is None:
+                return list(cache)
+            return list(islice(cache, max(len(cache) - count, 0), None))
@@ -1,6 +1,7 @@
 from dataclasses import dataclass, field
 from typing import Dict
 
+import numpy as np
 from fastenum import fastenum
 
 from hawkbot.core.data_classes import Timeframe
@@ -17,14 +18,62 @@ class SupportResistance:
     resistances: Dict[float, LevelType] = field(default_factory=dict)
 
 
+def _empty_array(dtype) -> np.ndarray:
+    return np.empty(0, dtype=dtype)
+
+
 @dataclass
-class TimeframeCache:
-    symbol: str
-    timeframe: Timeframe
+class TimeframeLevels:
+    """
+    The support & resistance levels of a symbol on a timeframe, calculated on the candles up to and including the
+    candle closing at `last_candle_close_date`. Prices are sorted ascending, the level types are aligned with the prices.
+    """
     last_candle_close_date: int = 0
-    support_resistance: SupportResistance = field(default_factory=SupportResistance)
+    support_prices: np.ndarray = field(default_factory=lambda: _empty_array(float))
+    support_types: np.ndarray = field(default_factory=lambda: _empty_array(object))
+    resistance_prices: np.ndarray = field(default_factory=lambda: _empty_array(float))
+    resistance_types: np.ndarray = field(default_factory=lambda: _empty_array(object))
+
+    def valid_until(self, timeframe: Timeframe) -> int:
+        # a new close date is only going to be available when the next candle's close date has passed
+        return self.last_candle_close_date + timeframe.milliseconds
+
+    @property
+    def any_level_found(self) -> bool:
+        return len(self.support_prices) > 0 or len(self.resistance_prices) > 0
+
+    def to_support_resistance(self) -> SupportResistance:
+        return SupportResistance(supports=dict(zip(self.support_prices.tolist(), self.support_types)),
+                                 resistances=dict(zip(self.resistance_prices.tolist(), self.resistance_types)))
+
+    @staticmethod
+    def from_support_resistance(last_candle_close_date: int, support_resistance: SupportResistance):
+        supports = sorted(support_resistance.supports.items())
+        resistances = sorted(support_resistance.resistances.items())
+        return TimeframeLevels(last_candle_close_date=last_candle_close_date,
+                               support_prices=np.array([price for price, _ in supports], dtype=float),
+                               support_types=np.array([level_type for _, level_type in supports], dtype=object),
+                               resistance_prices=np.array([price for price, _ in resistances], dtype=float),
+                               resistance_types=np.array([level_type for _, level_type in resistances], dtype=object))
+
+
+@dataclass
+class TimeframeCacheStatistics:
+    hits: int = 0
+    misses: int = 0
+    persistent_reads: int = 0
+    calculations: int = 0
+    total_lookup_time_s: float = 0.0
+    max_lookup_time_s: float = 0.0
+
+    @property
+    def lookups(self) -> int:
+        return self.hits + self.misses
+
+    @property
+    def hit_ratio(self) -> float:
+        return self.hits / self.lookups if self.lookups > 0 else 0.0
 
     @property
-    def any_level_found(self):
-        return len(list(self.support_resistance.supports.keys())) > 0 or \
-               len(list(self.support_resistance.resistances.keys())) > 0
\ No newline at end of file
+    def average_lookup_time_ms(self) -> float:
+        return self.total_lookup_time_s * 1000 / self.lookups if self.lookups > 0 else 0.0
@@ -1,35 +1,19 @@
-from sqlalchemy import Column, Integer, String, ForeignKey, Float
+from sqlalchemy import Column, Integer, String, LargeBinary
 from sqlalchemy.ext.declarative import declarative_base
-from sqlalchemy.orm import relationship
 
 _LEVEL_DECL_BASE = declarative_base()
 
 
-class Cache(_LEVEL_DECL_BASE):
-    __tablename__ = 'CACHE'
-    id = Column(Integer, primary_key=True)
-    symbol = Column(String)
-    timeframe = Column(String)
+class Levels(_LEVEL_DECL_BASE):
+    """
+    One row per symbol & timeframe; the prices are stored as raw float64 arrays, the level types as a comma separated
+    list aligned with the prices.
+    """
+    __tablename__ = 'LEVELS'
+    symbol = Column(String, primary_key=True)
+    timeframe = Column(String, primary_key=True)
     last_candle_close = Column(Integer)
-    supports = relationship("Support")
-    resistances = relationship("Resistance")
-
-
-class Support(_LEVEL_DECL_BASE):
-    __tablename__ = 'SUPPORT'
-    id = Column(Integer, primary_key=True)
-    cache_id = Column(Integer, ForeignKey('CACHE.id'))
-    symbol = Column(String)
-    timeframe = Column(String)
-    price = Column(Float)
-    type = Column(String)
-
-
-class Resistance(_LEVEL_DECL_BASE):
-    __tablename__ = 'RESISTANCE'
-    id = Column(Integer, primary_key=True)
-    cache_id = Column(Integer, ForeignKey('CACHE.id'))
-    symbol = Column(String)
-    timeframe = Column(String)
-    price = Column(Float)
-    type = Column(String)
\ No newline at end of file
+    support_prices = Column(LargeBinary)
+    support_types = Column(String)
+    resistance_prices = Column(LargeBinary)
+    resistance_types = Column(String)
@@ -1,5 +1,8 @@
 import logging
-from typing import List, Dict
+import threading
+import time
+from dataclasses import replace
+from typing import List, Dict, Tuple, Set, Optional
 
 import numpy as np
 
@@ -8,7 +11,9 @@ from hawkbot.core.candlestore.candlestore_listener import CandlestoreListener
 from hawkbot.core.data_classes import Timeframe, Candle
 from hawkbot.core.time_provider import TimeProvider
 from hawkbot.core.plugins.plugin import Plugin
-from hawkbot.plugins.timeframe_sr.data_classes import SupportResistance, LevelType
+from hawkbot.plugins.clustering_sr.pivots import trough_mask, peak_mask, candidate_indices, LevelIndex
+from hawkbot.plugins.timeframe_sr.data_classes import SupportResistance, LevelType, TimeframeLevels, \
+    TimeframeCacheStatistics
 from hawkbot.plugins.timeframe_sr.timeframe_sr_repository import TimeframeSupportResistanceRepository
 from hawkbot.utils import round_
 
@@ -25,136 +30,197 @@ class TimeframeSupportResistancePlugin(Plugin, CandlestoreListener):
         self.candlestore: Candlestore = None
         self.repository: TimeframeSupportResistanceRepository = TimeframeSupportResistanceRepository(plugin_config)
         self.time_provider: TimeProvider = None
+        # in-memory tier of the cache; the repository is only read on the first lookup of a symbol & timeframe, and
+        # only written to on stop
+        self.levels: Dict[Tuple[str, Timeframe], TimeframeLevels] = {}
+        self.dirty_levels: Set[Tuple[str, Timeframe]] = set()
+        # guards the dictionaries & statistics above, and is never held while reading or calculating levels
+        self.levels_lock: threading.RLock = threading.RLock()
+        # makes sure the levels of a symbol & timeframe are only read or calculated by a single thread at a time
+        self.calculation_locks: Dict[Tuple[str, Timeframe], threading.RLock] = {}
+        self.statistics: TimeframeCacheStatistics = TimeframeCacheStatistics()
 
     def start(self):
         super().start()
         self.candlestore.add_listener(listener=self)
 
+    def stop(self):
+        self.persist_levels()
+        statistics = self.cache_statistics()
+        logger.info(f'Support/resistance cache: {statistics.hits} hits, {statistics.misses} misses '
+                    f'(hit ratio {statistics.hit_ratio:.2%}), {statistics.persistent_reads} persistent reads, '
+                    f'{statistics.calculations} calculations, average lookup {statistics.average_lookup_time_ms:.3f}ms, '
+                    f'max lookup {statistics.max_lookup_time_s * 1000:.3f}ms')
+
     def on_new_candle(self, candle: Candle):
-        cache_valid_until = self.repository.cache_valid_until(symbol=candle.symbol,
-                                                              timeframe=candle.timeframe)
-        if candle.close_date > cache_valid_until:
-            self.get_or_update_sr_from_cache(symbol=candle.symbol,
-                                             timeframes=[candle.timeframe])
-        else:
-            logger.warning(f'Received candle whose close date ({candle.close_date}) was at or before the cache valid '
-                           f'date of {cache_valid_until}')
+        with self._calculation_lock(symbol=candle.symbol, timeframe=candle.timeframe):
+            levels = self._get_cached_levels(symbol=candle.symbol, timeframe=candle.timeframe)
+            if levels is not None and candle.close_date <= levels.last_candle_close_date:
+                logger.warning(f'Received candle whose close date ({candle.close_date}) was at or before the cache '
+                               f'valid date of {levels.last_candle_close_date}')
+                return
+        self.get_or_update_sr_from_cache(symbol=candle.symbol, timeframes=[candle.timeframe])
+
+    def cache_statistics(self) -> TimeframeCacheStatistics:
+        with self.levels_lock:
+            return replace(self.statistics)
+
+    def persist_levels(self):
+        """
+        Writes all levels that were calculated since the last call to the persistent cache
+        """
+        with self.levels_lock:
+            dirty_levels = {key: self.levels[key] for key in self.dirty_levels}
+            self.dirty_levels.clear()
+        try:
+            self.repository.store_levels(dirty_levels)
+        except Exception:
+            logger.exception(f'Failed to persist support/resistance levels for {list(dirty_levels.keys())}')
+            with self.levels_lock:
+                self.dirty_levels.update(dirty_levels.keys())
 
     def get_or_update_sr_from_cache(self,
                                     symbol: str,
                                     timeframes: List[Timeframe]) -> Dict[Timeframe, SupportResistance]:
-        support_resistances = {}
-        timeframes.sort(key=lambda x: x.milliseconds)
-        cache_changed = False
-        for timeframe in set(timeframes):
-            if self.should_refresh_cache(symbol=symbol, timeframe=timeframe):
-                latest_candle = self.candlestore.get_last_candles(symbol=symbol, timeframe=timeframe, amount=1)
-                last_closing_date = latest_candle[0].close_date
-                if last_closing_date > self.repository.cache_valid_until(symbol=symbol, timeframe=timeframe):
-                    cache_changed = True
-                    candles = self.candlestore.get_candles(symbol=symbol, timeframe=timeframe)
-
-                    support_resistance = self._get_levels_for_timeframe(candles=candles)
-                    logger.debug(f'{symbol}: '
-                                 f'Calculated supports for {timeframe.name} = {support_resistance.supports}, '
-                                 f'calculated resistances for {timeframe.name} = {support_resistance.resistances}')
-
-                    self.repository.set_in_cache(symbol=symbol,
-                                                 timeframe=timeframe,
-                                                 last_candle_close=last_closing_date,
-                                                 support_resistance=support_resistance)
-            sr_from_cache = self.repository.get_from_cache(symbol=symbol, timeframe=timeframe)
-            support_resistances[timeframe] = sr_from_cache.support_resistance
-
-        if cache_changed is True:
-            logger.info(f'{symbol}: Supports/resistances are {support_resistances}')
-
-        return support_resistances
+        return {timeframe: levels.to_support_resistance()
+                for timeframe, levels in self._get_levels(symbol=symbol, timeframes=timeframes).items()}
 
     def get_support_resistance_levels(self,
                                       symbol: str,
                                       timeframes: List[Timeframe],
                                       even_price: float,
                                       price_step: float) -> Dict[Timeframe, SupportResistance]:
-        support_resistances = self.get_or_update_sr_from_cache(symbol=symbol,
-                                                               timeframes=timeframes)
         final_support_levels = {}
-
-        for timeframe in set(timeframes):
-            support_resistance = support_resistances[timeframe]
-            rounded_support_prices = {}
-            rounded_resistance_prices = {}
-
-            for price, level_type in support_resistance.supports.items():
-                if price < even_price:
-                    rounded_support_prices[round_(price, price_step)] = level_type
-
-            for price, level_type in support_resistance.resistances.items():
-                if price > even_price:
-                    rounded_resistance_prices[round_(price, price_step)] = level_type
-
-            # only return supports below the position price
+        for timeframe, levels in self._get_levels(symbol=symbol, timeframes=timeframes).items():
+            # only return supports below & resistances above the even price
+            supports_mask = levels.support_prices < even_price
+            resistances_mask = levels.resistance_prices > even_price
+            rounded_support_prices = {round_(price, price_step): level_type
+                                      for price, level_type in zip(levels.support_prices[supports_mask].tolist(),
+                                                                   levels.support_types[supports_mask])}
+            rounded_resistance_prices = {round_(price, price_step): level_type
+                                         for price, level_type in zip(levels.resistance_prices[resistances_mask].tolist(),
+                                                                      levels.resistance_types[resistances_mask])}
             final_support_levels[timeframe] = SupportResistance(supports=rounded_support_prices,
                                                                 resistances=rounded_resistance_prices)
 
         return final_support_levels
 
-    def should_refresh_cache(self, symbol: str, timeframe: Timeframe) -> bool:
-        now = self.time_provider.get_utc_now_timestamp()
-        latest_candle_close = self.repository.cache_valid_until(symbol=symbol, timeframe=timeframe)
-        # a new close date is only going to be available when the next candle's close date has passed
-        if now > latest_candle_close + timeframe.milliseconds:
-            logger.info(f'Updating support cache for {symbol}, as {now} is past the cache expiration {latest_candle_close}')
-            return True
-        else:
-            logger.debug(f'Not updating support cache for {symbol}, as {now} is not past cache expiration {latest_candle_close}')
-            return False
+    def _get_levels(self, symbol: str, timeframes: List[Timeframe]) -> Dict[Timeframe, TimeframeLevels]:
+        timeframes_levels = {}
+        timeframes.sort(key=lambda x: x.milliseconds)
+        cache_changed = False
+        for timeframe in set(timeframes):
+            lookup_start = time.perf_counter()
+            with self._calculation_lock(symbol=symbol, timeframe=timeframe):
+                levels = self._get_cached_levels(symbol=symbol, timeframe=timeframe)
+                now = self.time_provider.get_utc_now_timestamp()
+                if levels is not None and now <= levels.valid_until(timeframe):
+                    with self.levels_lock:
+                        self.statistics.hits += 1
+                else:
+                    with self.levels_lock:
+                        self.statistics.misses += 1
+                    latest_candle_close = levels.last_candle_close_date if levels is not None else 0
+                    logger.info(f'Updating support cache for {symbol}, as {now} is past the cache expiration '
+                                f'{latest_candle_close}')
+                    refreshed_levels = self._calculate_levels(symbol=symbol,
+                                                              timeframe=timeframe,
+                                                              latest_candle_close=latest_candle_close)
+                    if refreshed_levels is not None:
+                        levels = refreshed_levels
+                        cache_changed = True
+                    elif levels is None:
+                        levels = TimeframeLevels()
+                        with self.levels_lock:
+                            self.levels[(symbol, timeframe)] = levels
+            lookup_time = time.perf_counter() - lookup_start
+            with self.levels_lock:
+                self.statistics.total_lookup_time_s += lookup_time
+                self.statistics.max_lookup_time_s = max(self.statistics.max_lookup_time_s, lookup_time)
+            timeframes_levels[timeframe] = levels
+
+        if cache_changed is True:
+            support_resistances = {timeframe: levels.to_support_resistance()
+                                   for timeframe, levels in timeframes_levels.items()}
+            logger.info(f'{symbol}: Supports/resistances are {support_resistances}')
+
+        return timeframes_levels
+
+    def _calculation_lock(self, symbol: str, timeframe: Timeframe) -> threading.RLock:
+        with self.levels_lock:
+            return self.calculation_locks.setdefault((symbol, timeframe), threading.RLock())
+
+    def _get_cached_levels(self, symbol: str, timeframe: Timeframe) -> Optional[TimeframeLevels]:
+        """
+        Returns the levels from the in-memory cache, falling back to the persistent cache the first time the levels
+        for the symbol & timeframe are requested. Needs to be called while holding the calculation lock of the symbol
+        & timeframe.
+        """
+        key = (symbol, timeframe)
+        with self.levels_lock:
+            if key in self.levels:
+                return self.levels[key]
+            self.statistics.persistent_reads += 1
+        levels = self.repository.get_levels(symbol=symbol, timeframe=timeframe)
+        if levels is not None:
+            with self.levels_lock:
+                self.levels[key] = levels
+        return levels
+
+    def _calculate_levels(self,
+                          symbol: str,
+                          timeframe: Timeframe,
+                          latest_candle_close: int) -> Optional[TimeframeLevels]:
+        """
+        Recalculates the levels when a candle closed after `latest_candle_close` is available, returns None otherwise.
+        Needs to be called while holding the calculation lock of the symbol & timeframe.
+        """
+        latest_candle = self.candlestore.get_last_candles(symbol=symbol, timeframe=timeframe, amount=1)
+        last_closing_date = latest_candle[0].close_date
+        if last_closing_date <= latest_candle_close:
+            return None
+
+        candles = self.candlestore.get_candles(symbol=symbol, timeframe=timeframe)
+        support_resistance = self._get_levels_for_timeframe(candles=candles)
+        logger.debug(f'{symbol}: '
+                     f'Calculated supports for {timeframe.name} = {support_resistance.supports}, '
+                     f'calculated resistances for {timeframe.name} = {support_resistance.resistances}')
+        levels = TimeframeLevels.from_support_resistance(last_candle_close_date=last_closing_date,
+                                                         support_resistance=support_resistance)
+        with self.levels_lock:
+            self.statistics.calculations += 1
+            self.levels[(symbol, timeframe)] = levels
+            self.dirty_levels.add((symbol, timeframe))
+        return levels
 
     def _get_levels_for_timeframe(self, candles: List[Candle]) -> SupportResistance:
-        levels = []
         support: Dict[float, LevelType] = {}
         resistance: Dict[float, LevelType] = {}
 
         last_price = candles[len(candles) - 1].close
-        diffs = [c.hc_average - c.lc_average for c in candles]
-        average = np.mean(diffs)
-
-        for i in range(2, len(candles) - 2):
-            if self.is_support(candles, i):
-                level = candles[i].lc_average
-                if self.is_far_from_level(level, levels, average):
-                    levels.append((i, level))
-                    if last_price > level:
-                        support[level] = LevelType.TROUGH
-                    else:
-                        resistance[level] = LevelType.TROUGH
-
-            elif self.is_resistance(candles, i):
-                level = candles[i].hc_average
-                if self.is_far_from_level(level, levels, average):
-                    levels.append((i, level))
-                    if last_price > level:
-                        support[level] = LevelType.PEAK
-                    else:
-                        resistance[level] = LevelType.PEAK
+        lc_averages = np.array([c.lc_average for c in candles], dtype=float)
+        hc_averages = np.array([c.hc_average for c in candles], dtype=float)
+        average = np.mean(hc_averages - lc_averages)
+
+        supports_mask = trough_mask(lc_averages)
+        resistances_mask = peak_mask(hc_averages)
+        levels = LevelIndex()
+
+        for i in candidate_indices(supports_mask, resistances_mask):
+            if supports_mask[i]:
+                level = float(lc_averages[i])
+                level_type = LevelType.TROUGH
+            else:
+                level = float(hc_averages[i])
+                level_type = LevelType.PEAK
+            if levels.is_far_from_level(level, average):
+                levels.add(level)
+                if last_price > level:
+                    support[level] = level_type
+                else:
+                    resistance[level] = level_type
 
         support = {k: v for k, v in sorted(support.items())}
         resistance = {k: v for k, v in sorted(resistance.items())}
         return SupportResistance(supports=support, resistances=resistance)
-
-    def is_support(self, candles: List[Candle], i) -> bool:
-        cond1 = candles[i].lc_average < candles[i - 1].lc_average
-        cond2 = candles[i].lc_average < candles[i + 1].lc_average
-        cond3 = candles[i + 1].lc_average < candles[i + 2].lc_average
-        cond4 = candles[i - 1].lc_average < candles[i - 2].lc_average
-        return cond1 and cond2 and cond3 and cond4
-
-    def is_resistance(self, candles: List[Candle], i) -> bool:
-        cond1 = candles[i].hc_average > candles[i - 1].hc_average
-        cond2 = candles[i].hc_average > candles[i + 1].hc_average
-        cond3 = candles[i + 1].hc_average > candles[i + 2].hc_average
-        cond4 = candles[i - 1].hc_average > candles[i - 2].hc_average
-        return cond1 and cond2 and cond3 and cond4
-
-    def is_far_from_level(self, value, levels, average) -> bool:
-        return np.sum([abs(value - level) < average for _, level in levels]) == 0
\ No newline at end of file
@@ -1,14 +1,14 @@
 import logging
 import os
-from typing import Dict
+from typing import Dict, Optional
 
-from sqlalchemy import create_engine, MetaData
-from sqlalchemy.exc import NoResultFound
+import numpy as np
+from sqlalchemy import create_engine, MetaData, select
 
 from hawkbot.core.data_classes import Timeframe
 from hawkbot.core.lockable_session import LockableSession
-from hawkbot.plugins.timeframe_sr.data_classes import TimeframeCache, LevelType, SupportResistance
-from hawkbot.plugins.timeframe_sr.orm_classes import Cache, Support, Resistance, _LEVEL_DECL_BASE
+from hawkbot.plugins.timeframe_sr.data_classes import TimeframeLevels, LevelType
+from hawkbot.plugins.timeframe_sr.orm_classes import Levels, _LEVEL_DECL_BASE
 
 logger = logging.getLogger(__name__)
 
@@ -28,101 +28,43 @@ class TimeframeSupportResistanceRepository:
         _LEVEL_DECL_BASE.metadata.create_all(self.engine)
         self.lockable_session = LockableSession(self.engine)
 
-    def get_from_cache(self,
-                       symbol: str,
-                       timeframe: Timeframe) -> TimeframeCache:
+    def get_levels(self, symbol: str, timeframe: Timeframe) -> Optional[TimeframeLevels]:
         with self.lockable_session as session:
-            try:
-                cache = session.query(Cache)\
-                    .filter(Cache.symbol == symbol)\
-                    .filter(Cache.timeframe == timeframe.name).one()
-            except NoResultFound:
-                cache = Cache(symbol=symbol,
-                              timeframe=timeframe,
-                              last_candle_close=0,
-                              supports=[],
-                              resistances=[])
-                session.add(cache)
-                session.commit()
-                logger.warning(f'{symbol} {timeframe.name}: Found multiple caches in database. This indicates a '
-                               f'race condition happened that inserted multiple caches for the same symbol. Removing '
-                               f'the entries so the next iteration can reset the database correctly.')
-                self.remove_from_cache(symbol=symbol, timeframe=timeframe)
-                cache = Cache(symbol=symbol,
-                              timeframe=timeframe.name,
-                              last_candle_close=0,
-                              supports=[],
-                              resistances=[])
-                session.add(cache)
-                session.commit()
+            row = session.execute(select(Levels)
+                                  .where(Levels.symbol == symbol)
+                                  .where(Levels.timeframe == timeframe.name)).scalars().first()
+            if row is None:
+                return None
+            return TimeframeLevels(last_candle_close_date=row.last_candle_close,
+                                   support_prices=np.frombuffer(row.support_prices, dtype=np.float64),
+                                   support_types=self._decode_types(row.support_types),
+                                   resistance_prices=np.frombuffer(row.resistance_prices, dtype=np.float64),
+                                   resistance_types=self._decode_types(row.resistance_types))
 
-            support_resistance = SupportResistance()
-            for support in cache.supports:
-                price = float(support.price)
-                support_resistance.supports[price] = LevelType[support.type]
-            for resistance in cache.resistances:
-                price = float(resistance.price)
-                support_resistance.resistances[price] = LevelType[resistance.type]
-            timeframe_cache = TimeframeCache(symbol=symbol,
-                                             timeframe=timeframe,
-                                             last_candle_close_date=cache.last_candle_close,
-                                             support_resistance=support_resistance)
-            return timeframe_cache
-
-    def cache_valid_until(self, symbol: str, timeframe: Timeframe) -> int:
-        with self.lockable_session as session:
-            try:
-                cache = session \
-                    .query(Cache) \
-                    .filter(Cache.symbol == symbol) \
-                    .filter(Cache.timeframe == timeframe.name) \
-                    .one()
-            except NoResultFound:
-                cache = Cache(symbol=symbol,
-                              timeframe=timeframe.name,
-                              last_candle_close=0,
-                              supports=[],
-                              resistances=[])
-                session.add(cache)
-                session.commit()
-
-            return cache.last_candle_close
-
-    def remove_from_cache(self,
-                          symbol: str,
-                          timeframe: Timeframe):
+    def store_levels(self, levels: Dict[tuple, TimeframeLevels]):
+        """
+        Stores the levels, keyed by (symbol, timeframe), replacing any levels previously stored for the same key
+        """
+        if len(levels) == 0:
+            return
         with self.lockable_session as session:
-            query = session.query(Cache) \
-                .filter(Cache.symbol == symbol) \
-                .filter(Cache.timeframe == timeframe.name)
-            query.delete(synchronize_session=False)
+            for (symbol, timeframe), timeframe_levels in levels.items():
+                session.merge(Levels(symbol=symbol,
+                                     timeframe=timeframe.name,
+                                     last_candle_close=timeframe_levels.last_candle_close_date,
+                                     support_prices=timeframe_levels.support_prices.astype(np.float64).tobytes(),
+                                     support_types=self._encode_types(timeframe_levels.support_types),
+                                     resistance_prices=timeframe_levels.resistance_prices.astype(np.float64).tobytes(),
+                                     resistance_types=self._encode_types(timeframe_levels.resistance_types)))
             session.commit()
+        logger.debug(f'Stored levels for {len(levels)} symbol/timeframe combinations')
 
-    def set_in_cache(self,
-                     symbol: str,
-                     timeframe: Timeframe,
-                     last_candle_close: int,
-                     support_resistance: SupportResistance):
-        self.remove_from_cache(symbol=symbol, timeframe=timeframe)
-        with self.lockable_session as session:
-            orm_supports = []
-            for price, level_type in support_resistance.supports.items():
-                orm_supports.append(Support(symbol=symbol,
-                                            timeframe=timeframe.name,
-                                            price=str(price),
-                                            type=level_type.name))
-
-            orm_resistances = []
-            for price, level_type in support_resistance.resistances.items():
-                orm_resistances.append(Resistance(symbol=symbol,
-                                                  timeframe=timeframe.name,
-                                                  price=str(price),
-                                                  type=level_type.name))
+    @staticmethod
+    def _encode_types(level_types: np.ndarray) -> str:
+        return ','.join([level_type.name for level_type in level_types])
 
-            cache = Cache(symbol=symbol,
-                          timeframe=timeframe.name,
-                          last_candle_close=last_candle_close,
-                          supports=orm_supports,
-                          resistances=orm_resistances)
-            session.add(cache)
-            session.commit()
\ No newline at end of file
+    @staticmethod
+    def _decode_types(encoded: str) -> np.ndarray:
+        if encoded is None or encoded == '':
+            return np.empty(0, dtype=object)
+        return np.array([LevelType[name] for name in encoded.split(',')], dtype=object)
@@ -33,13 +33,14 @@ class WiggleConfig:
     period: str = field(default_factory=lambda: None)
     timeframe: Timeframe = field(default_factory=lambda: None)
     algo: AlgoType = field(default_factory=lambda: AlgoType.PEAKS_TROUGHS_HIGHLOW)
+    algo_config: Dict = field(default_factory=lambda: None)
     algo_instance_cache: Algo = field(default_factory=lambda: None)
     wiggle_execution_delay_ms: int = field(default_factory=lambda: 2500)
 
     @property
     def algo_instance(self):
         if self.algo_instance_cache is None:
-            self.algo_instance_cache = self.algo.value[1]()
+            self.algo_instance_cache = self.algo.value[1](self.algo_config)
         return self.algo_instance_cache
 
 
@@ -54,6 +55,10 @@ class WigglePlugin(Plugin):
         self.sr_plugin: ClusteringSupportResistancePlugin = None
         self.last_execution_timestamp: int = 0
         self.execution_lock: threading.Lock = threading.Lock()
+        # the database the PeaksTroughsHighLowAlgo pivots are stored in, or None to keep them in memory
+        self.pivot_database_path: str = None
+        if 'pivot_database_path' in plugin_config:
+            self.pivot_database_path = plugin_config['pivot_database_path']
 
     def start(self):
         self.started = True
@@ -101,6 +106,8 @@ class WigglePlugin(Plugin):
 
         if 'algo' in wiggle_dict:
             wiggle_config.algo = AlgoType[wiggle_dict['algo']]
+        if self.pivot_database_path is not None:
+            wiggle_config.algo_config = {'database_path': self.pivot_database_path}
 
         if wiggle_config.decrease_size is not None and wiggle_config.decrease_coin_size is not None:
             raise InvalidConfigurationException('Both the parameters \'decrease_size\' and \'decrease_coin_size\' are '
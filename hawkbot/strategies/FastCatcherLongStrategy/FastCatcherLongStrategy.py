@@ -2,6 +2,7 @@ import logging
 
 from hawkbot.core.data_classes import Trigger
 from hawkbot.core.model import Position, SymbolInformation, LimitOrder, OrderStatus, PositionSide, Side, OrderTypeIdentifier, MarketOrder
+from hawkbot.core.tickstore.tick_window import TickWindow
 from hawkbot.core.tickstore.tickstore import Tickstore
 from hawkbot.core.time_provider import now_timestamp
 from hawkbot.exceptions import FunctionNotImplementedException, InvalidConfigurationException
@@ -26,6 +27,7 @@ class FastCatcherLongStrategy(AbstractBaseStrategy):
         self.override_insufficient_grid_funds: bool = False
         self._signal_valid_for_ms: int = None
         self._timestamp_flag_raised: int = None
+        self._tick_window: TickWindow = None
 
     def init_config(self):
         super().init_config()
@@ -42,6 +44,7 @@ class FastCatcherLongStrategy(AbstractBaseStrategy):
             raise InvalidConfigurationException('The parameter \'entry_order_type\' must be either \'MARKET\' or \'LIMIIT\'')
         self._ticks_lookback_period_ms = period_as_ms(self.ticks_lookback_period)
         self._signal_valid_for_ms = period_as_ms(self.signal_valid_for)
+        self._tick_window = TickWindow(window_ms=self._ticks_lookback_period_ms)
 
         fill_optional_parameters(target=self,
                                  config=self.strategy_config,
@@ -55,14 +58,14 @@ class FastCatcherLongStrategy(AbstractBaseStrategy):
                  current_price: float):
         curr_ts = now_timestamp()
         try:
-            ticks = self.tick_store.get_ticks(symbol=self.symbol, start_timestamp=curr_ts - self._ticks_lookback_period_ms, end_timestamp=curr_ts)
+            self._tick_window.update(tick_store=self.tick_store, symbol=self.symbol, now=curr_ts)
         except FunctionNotImplementedException:
             logger.info("bybit fetch ticks isn't available, so at first it can fail which is ok")
             return
 
         if self._timestamp_flag_raised is None:
             if position.no_position():
-                if self.entry_allowed(ticks):
+                if self.entry_allowed(self._tick_window):
                     self._timestamp_flag_raised = now_timestamp()
                     self.place_grid(symbol=symbol,
                                     symbol_information=symbol_information,
@@ -173,26 +176,30 @@ class FastCatcherLongStrategy(AbstractBaseStrategy):
         self._timestamp_flag_raised = None
         self.dca_plugin.erase_grid(symbol=self.symbol, position_side=self.position_side, dca_config=self.dca_config)
 
-    def entry_allowed(self, ticks) -> bool:
-        if len(ticks) > 1:
-            oldest_tick_timestamp = min([t.timestamp for t in ticks])
-            youngest_tick_timestamp = max([t.timestamp for t in ticks])
+    def entry_allowed(self, tick_window: TickWindow) -> bool:
+        nr_ticks = len(tick_window)
+        if nr_ticks > 1:
+            oldest_tick_timestamp = tick_window.oldest_timestamp
+            youngest_tick_timestamp = tick_window.newest_timestamp
             diff = youngest_tick_timestamp - oldest_tick_timestamp
-            oldest_price = [t.price for t in ticks if t.timestamp == oldest_tick_timestamp][0]
-            youngest_price = [t.price for t in ticks if t.timestamp == youngest_tick_timestamp][0]
+            oldest_price = tick_window.oldest_price
+            youngest_price = tick_window.newest_price
             price_diff = youngest_price - oldest_price
             price_diff_pct = price_diff / (oldest_price / 100)
             if diff > 0 and oldest_price != youngest_price:
                 logger.info(f"time diff = {diff}, "
-                            f"# ticks = {len(ticks)}, "
+                            f"# ticks = {nr_ticks}, "
                             f"oldest price = {oldest_price}, "
                             f"youngest price = {youngest_price}, "
-                            f"price diff pct = {price_diff_pct:.6f}")
+                            f"price diff pct = {price_diff_pct:.6f}, "
+                            f"low = {tick_window.low}, "
+                            f"high = {tick_window.high}, "
+                            f"vwap = {tick_window.vwap}")
 
-                if diff >= self.minimum_time_in_period_threshold and len(ticks) > self.minimum_nr_ticks_threshold and self._price_diff_past_threshold(price_diff_pct):
+                if diff >= self.minimum_time_in_period_threshold and nr_ticks > self.minimum_nr_ticks_threshold and self._price_diff_past_threshold(price_diff_pct):
                     logger.info(
                         f"ENTER: time diff = {diff}, "
-                        f"# ticks = {len(ticks)}, "
+                        f"# ticks = {nr_ticks}, "
                         f"oldest price = {oldest_price}, "
                         f"youngest price = {youngest_price}, "
                         f"price diff pct = {price_diff_pct:.6f}")
@@ -0,0 +1,71 @@
+import logging
+from typing import Dict, Tuple, Any
+
+from hawkbot.core.data_classes import ExchangeState
+
+logger = logging.getLogger(__name__)
+
+
+class ExchangeStateSnapshot:
+    """
+    Read-through view on the ExchangeState for the duration of a single trigger. The first call to one of the
+    `snapshot_methods` for a given set of arguments is passed on to the ExchangeState, repeated calls with the same
+    arguments return the value of the first call.
+
+    The frozen reads are the market data & symbol information (`get_symbol_information`,
+    `get_all_symbol_informations_by_symbol`, `last_tick_price`, `get_last_price`), the initialization state
+    (`is_initialized`, `position_initialized`), the positions (`position`, `get_position`, `has_open_position`,
+    `has_no_open_position`, `count_open_positions`) and the balances (`symbol_balance`, `asset_balance`) together
+    with the `calculate_wallet_exposure_ratio` derived from them. Only the reads the strategy makes through the
+    snapshot are frozen.
+
+    The plugins are shared by the strategies of all symbols and read their own injected ExchangeState, so their
+    reads are always live, including reads of the kinds above. Within a single trigger these can differ from the
+    values the strategy read through the snapshot. The live reads of the frozen kinds are:
+    - DcaPlugin: `last_tick_price` in `_calculate_dca_grid_from_first_long/short`, `symbol_balance` in
+      `_calculate_dca_quantities` and `_calculate_dca_quantities_multiplier`, `has_open_position` and `position` in
+      `_calculate_dca_quantities_multiplier`, `position` in `calculate_dca_grid_short` and `get_symbol_information`
+      in `calculate_support_prices` and `calculate_resistance_prices`
+    - StoplossPlugin: `has_open_position` of the opposite side in `calculate_stoploss_orders` and `get_last_price` in
+      `_should_calculate_trailing_price`
+    - WigglePlugin: `symbol_balance` in `force_sell_at_price` and `last_tick_price` in `calculate_increase_order`
+    - ClusteringSupportResistancePlugin: `position` of the opposite side in `determine_outer_price` and
+      `get_symbol_information` in `create_sr_request`
+    """
+    snapshot_methods = {'get_symbol_information',
+                        'get_all_symbol_informations_by_symbol',
+                        'last_tick_price',
+                        'get_last_price',
+                        'is_initialized',
+                        'position_initialized',
+                        'position',
+                        'get_position',
+                        'has_open_position',
+                        'has_no_open_position',
+                        'count_open_positions',
+                        'symbol_balance',
+                        'asset_balance',
+                        'calculate_wallet_exposure_ratio'}
+
+    def __init__(self, exchange_state: ExchangeState):
+        self.exchange_state = exchange_state
+        self.values: Dict[Tuple, Any] = {}
+
+    def __getattr__(self, name: str):
+        attribute = getattr(self.exchange_state, name)
+        if name not in self.snapshot_methods:
+            return attribute
+
+        def snapshot_call(*args, **kwargs):
+            key = (name, args, tuple(sorted(kwargs.items())))
+            try:
+                return self.values[key]
+            except KeyError:
+                value = attribute(*args, **kwargs)
+                self.values[key] = value
+                return value
+            except TypeError:
+                # unhashable arguments, don't snapshot
+                return attribute(*args, **kwargs)
+
+        return snapshot_call
@@ -1,5 +1,6 @@
 import logging
-from typing import List, Dict
+import threading
+from typing import List, Dict, Tuple
 
 from hawkbot.core.candlestore.candlestore import Candlestore
 from hawkbot.core.config.active_config_manager import ActiveConfigManager
@@ -16,14 +17,37 @@ from hawkbot.core.tickstore.tickstore import Tickstore
 from hawkbot.core.time_provider import TimeProvider
 from hawkbot.exceptions import InvalidOrderException, InvalidArgumentException, OrderCancelException, PassedPriceException
 from hawkbot.logging import user_log
+from hawkbot.strategies.exchange_state_snapshot import ExchangeStateSnapshot
 from hawkbot.core.plugins.plugin_loader import PluginLoader
 from hawkbot.utils import calc_min_qty, round_
 
 logger = logging.getLogger(__name__)
 
 
+def order_key(order: Order) -> Tuple:
+    # only side & price, which identify a duplicate order in cancel_duplicate_side_dca_orders as well; whether orders
+    # with a different quantity or type are equal is left to Order.__eq__ within the bucket
+    return order.side, order.price
+
+
+def index_orders(orders: List[Order]) -> Dict[Tuple, List[Order]]:
+    """
+    Groups the orders on (side, price), so checking whether an equal order is present only needs to compare against
+    the orders with the same side & price instead of the entire list. Orders are still compared using Order.__eq__.
+    """
+    index = {}
+    for order in orders:
+        index.setdefault(order_key(order), []).append(order)
+    return index
+
+
+def is_indexed(index: Dict[Tuple, List[Order]], order: Order) -> bool:
+    return any(indexed_order == order for indexed_order in index.get(order_key(order), []))
+
+
 class Strategy(object):
     def __init__(self):
+        self._exchange_state_snapshots: Dict[int, ExchangeStateSnapshot] = {}
         self.redis_host: str = None  # Set after initialization by bot
         self.redis_port: int = None  # Set after initialization by bot
         self.symbol_config: SymbolConfig = None  # Set after initialization by bot
@@ -44,6 +68,31 @@ class Strategy(object):
         self.mode_processor = None  # Set after initialization by bot
         self.config = None  # Filled in init() function
 
+    @property
+    def exchange_state(self) -> ExchangeState:
+        try:
+            return self._exchange_state_snapshots[threading.get_ident()]
+        except KeyError:
+            return self._exchange_state
+
+    @exchange_state.setter
+    def exchange_state(self, exchange_state: ExchangeState):
+        self._exchange_state = exchange_state
+
+    def _start_exchange_state_snapshot(self) -> bool:
+        """
+        Makes the exchange_state return the same position, balance, price & symbol information for the remainder of the
+        trigger processed by the current thread. Returns False when a snapshot was already active for this thread.
+        """
+        thread_id = threading.get_ident()
+        if thread_id in self._exchange_state_snapshots:
+            return False
+        self._exchange_state_snapshots[thread_id] = ExchangeStateSnapshot(self._exchange_state)
+        return True
+
+    def _end_exchange_state_snapshot(self):
+        self._exchange_state_snapshots.pop(threading.get_ident(), None)
+
     # to be implemented by strategy implementation
     def get_initializing_config(self) -> InitializeConfig:
         """
@@ -342,6 +391,14 @@ class Strategy(object):
                       current_price=current_price)
 
     def process_tick(self, tick: Tick):
+        started_snapshot = self._start_exchange_state_snapshot()
+        try:
+            self._process_tick(tick=tick)
+        finally:
+            if started_snapshot:
+                self._end_exchange_state_snapshot()
+
+    def _process_tick(self, tick: Tick):
         if self.mode_processor.get_mode(symbol=tick.symbol, position_side=self.position_side) == Mode.MANUAL:
             return
 
@@ -358,6 +415,14 @@ class Strategy(object):
                      wallet_balance=wallet_balance)
 
     def process_trigger(self, symbol: str, triggers: List[Trigger], new_filled_orders: List[Order]):
+        started_snapshot = self._start_exchange_state_snapshot()
+        try:
+            self._process_trigger(symbol=symbol, triggers=triggers, new_filled_orders=new_filled_orders)
+        finally:
+            if started_snapshot:
+                self._end_exchange_state_snapshot()
+
+    def _process_trigger(self, symbol: str, triggers: List[Trigger], new_filled_orders: List[Order]):
         if self.exchange_state.is_initialized(symbol) is False:
             logger.debug(f"Service not initialized yet for symbol {symbol}")
             return
@@ -697,23 +762,25 @@ class Strategy(object):
         new_orders_to_place = [o for o in new_orders if not isinstance(o, MarketOrder)]
         new_orders_to_place.sort(key=lambda x: x.price, reverse=not lowest_price_first)
         new_orders_to_place.extend(market_orders)
-        orders_to_place = []
-        for new_order in new_orders:
-            if new_order not in exchange_orders:
-                orders_to_place.append(new_order)
-        self.order_executor.create_orders(orders_to_place)
+        exchange_orders_index = index_orders(exchange_orders)
+        orders_to_place = [new_order for new_order in new_orders_to_place
+                           if not is_indexed(exchange_orders_index, new_order)]
+        if len(orders_to_place) > 0:
+            self.order_executor.create_orders(orders_to_place)
 
     def _cancel_orders(self, symbol: str, position_side: PositionSide, exchange_orders: List[Order], new_orders: List[Order]) -> bool:
         # orders on exchange that need to be cancelled
         orders_to_cancel = []
-        encountered_orders = []  # make sure we flush out potential duplicate entries on the exchange
+        new_orders_index = index_orders(new_orders)
+        encountered_orders = {}  # make sure we flush out potential duplicate entries on the exchange
         for exchange_order in exchange_orders:
-            if exchange_order not in new_orders:
+            if not is_indexed(new_orders_index, exchange_order) or is_indexed(encountered_orders, exchange_order):
                 orders_to_cancel.append(exchange_order)
-            if exchange_order not in encountered_orders:
-                encountered_orders.append(exchange_order)
             else:
-                orders_to_cancel.append(exchange_order)
+                encountered_orders.setdefault(order_key(exchange_order), []).append(exchange_order)
+
+        if len(orders_to_cancel) == 0:
+            return True
 
         logger.debug(f'{symbol} {position_side.name}: Cancelling orders: {orders_to_cancel}')
 
@@ -725,6 +792,7 @@ class Strategy(object):
                                f"entry order. This can happen when the websocket data hasn't come in yet/been processed yet at the time the new initial entry order was "
                                f"calculated. Not continuing with placing the new entry order, because this could lead to a duplicate initial entry.")
                 raise OrderCancelException()
+        return all_orders_cancelled_successfully
 
     def place_entry_order(self,
                           order_price: float,
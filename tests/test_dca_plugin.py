@@ -0,0 +1,76 @@
+from types import SimpleNamespace
+from typing import List
+
+from hawkbot.core.model import PositionSide
+from hawkbot.plugins.clustering_sr.data_classes import SupportResistance
+from hawkbot.plugins.dca.dca_plugin import DcaPlugin, DcaConfig
+
+
+class StubSrPlugin:
+    def __init__(self, supports: List[float], resistances: List[float]):
+        self.supports = supports
+        self.resistances = resistances
+
+    def get_support_resistance_levels(self, symbol, position_side, even_price, price_step, dca_config) -> SupportResistance:
+        return SupportResistance(supports=list(self.supports), resistances=list(self.resistances))
+
+
+class StubExchangeState:
+    def get_symbol_information(self, symbol: str):
+        return SimpleNamespace(price_step=0.01, minimum_price=1.0, maximum_price=1000.0)
+
+
+def dca_plugin(supports: List[float], resistances: List[float]) -> DcaPlugin:
+    plugin = DcaPlugin.__new__(DcaPlugin)
+    plugin.exchange_state = StubExchangeState()
+    plugin.sr_plugin = StubSrPlugin(supports=supports, resistances=resistances)
+    return plugin
+
+
+def support_prices(plugin: DcaPlugin, maximum_price: float, dca_config: DcaConfig) -> List[float]:
+    return [record.price for record in plugin.calculate_support_prices(symbol='BTCUSDT',
+                                                                       position_side=PositionSide.LONG,
+                                                                       maximum_price=maximum_price,
+                                                                       dca_config=dca_config)]
+
+
+def resistance_prices(plugin: DcaPlugin, minimum_price: float, dca_config: DcaConfig) -> List[float]:
+    return [record.price for record in plugin.calculate_resistance_prices(symbol='BTCUSDT',
+                                                                          position_side=PositionSide.SHORT,
+                                                                          minimum_price=minimum_price,
+                                                                          dca_config=dca_config)]
+
+
+def test_support_prices_skip_resistances_overlapping_a_support():
+    plugin = dca_plugin(supports=[100.0, 95.0], resistances=[100.05, 98.0])
+    assert support_prices(plugin, maximum_price=110.0, dca_config=DcaConfig(overlap=0.001)) == [100.0, 98.0, 95.0]
+
+
+def test_support_prices_skip_resistances_overlapping_an_added_resistance():
+    plugin = dca_plugin(supports=[100.0, 95.0], resistances=[98.0, 98.05, 97.0])
+    assert support_prices(plugin, maximum_price=110.0, dca_config=DcaConfig(overlap=0.001)) == [100.0, 98.0, 97.0, 95.0]
+
+
+def test_support_prices_skip_resistances_at_or_above_maximum_price():
+    plugin = dca_plugin(supports=[100.0], resistances=[110.0, 120.0, 105.0])
+    assert support_prices(plugin, maximum_price=110.0, dca_config=DcaConfig(overlap=0.001)) == [105.0, 100.0]
+
+
+def test_support_prices_without_overlap_keep_all_distinct_resistances():
+    plugin = dca_plugin(supports=[100.0, 0.5], resistances=[100.0, 99.99])
+    assert support_prices(plugin, maximum_price=110.0, dca_config=DcaConfig(overlap=0.0)) == [100.0, 99.99]
+
+
+def test_resistance_prices_skip_supports_overlapping_a_resistance():
+    plugin = dca_plugin(supports=[99.95, 102.0], resistances=[100.0, 105.0])
+    assert resistance_prices(plugin, minimum_price=90.0, dca_config=DcaConfig(overlap=0.001)) == [100.0, 102.0, 105.0]
+
+
+def test_resistance_prices_skip_supports_overlapping_an_added_support():
+    plugin = dca_plugin(supports=[102.0, 102.05, 103.0], resistances=[100.0, 105.0])
+    assert resistance_prices(plugin, minimum_price=90.0, dca_config=DcaConfig(overlap=0.001)) == [100.0, 102.0, 103.0, 105.0]
+
+
+def test_resistance_prices_skip_supports_at_or_below_minimum_price():
+    plugin = dca_plugin(supports=[90.0, 80.0, 95.0], resistances=[100.0, 2000.0])
+    assert resistance_prices(plugin, minimum_price=90.0, dca_config=DcaConfig(overlap=0.001)) == [95.0, 100.0]
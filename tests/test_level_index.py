@@ -0,0 +1,34 @@
+import random
+from typing import List
+
+import pytest
+
+from hawkbot.plugins.clustering_sr.pivots import LevelIndex
+
+
+def has_level_between_loop(levels: List[float], lower: float, upper: float) -> bool:
+    for level in levels:
+        if lower <= level <= upper:
+            return True
+    return False
+
+
+def random_prices(rng: random.Random, nr_prices: int) -> List[float]:
+    # rounded to a price step, so equal prices and prices on the overlap boundaries occur
+    return [round(rng.uniform(90, 110), 1) for _ in range(nr_prices)]
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_has_level_between_matches_loop(seed):
+    rng = random.Random(seed)
+    levels = random_prices(rng, rng.randint(0, 50))
+    index = LevelIndex(levels)
+    for _ in range(200):
+        lower, upper = random_prices(rng, 2)
+        if rng.random() < 0.1:
+            upper = lower
+        assert index.has_level_between(lower, upper) == has_level_between_loop(levels, lower, upper)
+
+
+def test_has_level_between_empty_index():
+    assert LevelIndex().has_level_between(0.0, 100.0) is False